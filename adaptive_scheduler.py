@@ -0,0 +1,145 @@
+import time
+from collections import deque
+from threading import Lock
+
+
+class AdaptiveScheduler:
+    """Chooses how often vision frames are sampled from screen activity, model latency and budget.
+
+    The interval shrinks while the screen changes heavily, grows exponentially while it
+    is idle or the model is slow or rate limited, and never lets requests exceed the
+    configured requests-per-minute and tokens-per-minute budget.
+    """
+
+    def __init__(self, base_interval=1.0, min_interval=0.25, max_interval=8.0,
+                 requests_per_minute=60, tokens_per_minute=1000000,
+                 busy_threshold=0.25, backoff_factor=1.5, rate_limit_cooldown=10.0):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.busy_threshold = busy_threshold  # Fraction of dirty regions that counts as heavy activity
+        self.backoff_factor = backoff_factor
+        self.rate_limit_cooldown = rate_limit_cooldown
+
+        self.lock = Lock()
+        self.requests = deque()  # Request timestamps in the last minute
+        self.tokens = deque()    # (timestamp, token count) in the last minute
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.activity_interval = self.base_interval
+            self.interval = self.base_interval
+            self.activity = "starting"
+            self.reason = self.activity
+            self.latency = None  # Exponential moving average of model latency
+            self.rate_limited_until = 0.0
+            self.rate_limit_backoff = self.rate_limit_cooldown
+
+    def on_frame(self, changed, score):
+        """Record the change score of a sampled frame and recompute the interval."""
+        with self.lock:
+            if changed and score >= self.busy_threshold:
+                self.activity_interval = max(self.min_interval, self.activity_interval / 2)
+                self.activity = "screen busy"
+            elif changed:
+                self.activity_interval = self.base_interval
+                self.activity = "screen changing"
+            else:
+                self.activity_interval = min(self.max_interval, self.activity_interval * self.backoff_factor)
+                self.activity = "screen idle"
+            self._update()
+
+    def on_response(self, latency, tokens=0):
+        """Record a completed model request."""
+        with self.lock:
+            self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+            if tokens:
+                self.tokens.append((time.time(), tokens))
+            self.rate_limit_backoff = self.rate_limit_cooldown
+            self._update()
+
+    def on_error(self, error):
+        """Back off when the model reports a quota or rate-limit error."""
+        if not is_rate_limit_error(error):
+            return
+        with self.lock:
+            self.rate_limited_until = time.time() + self.rate_limit_backoff
+            self.rate_limit_backoff = min(self.max_interval * 4, self.rate_limit_backoff * 2)
+            self._update()
+
+    def try_acquire(self):
+        """Reserve budget for one request; returns False when the budget is exhausted."""
+        with self.lock:
+            now = time.time()
+            self._expire(now)
+            if now < self.rate_limited_until:
+                return False
+            if self.requests_per_minute and len(self.requests) >= self.requests_per_minute:
+                self.reason = "request budget"
+                return False
+            if self.tokens_per_minute and self._tokens_used() >= self.tokens_per_minute:
+                self.reason = "token budget"
+                return False
+            self.requests.append(now)
+            self._update()
+            return True
+
+    def get_stats(self):
+        with self.lock:
+            self._expire(time.time())
+            return {
+                "interval": round(self.interval, 3),
+                "reason": self.reason,
+                "model_latency": round(self.latency, 3) if self.latency is not None else None,
+                "requests_last_minute": len(self.requests),
+                "tokens_last_minute": self._tokens_used(),
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "rate_limited_for": round(max(0.0, self.rate_limited_until - time.time()), 1),
+            }
+
+    def _update(self):
+        """Combine the activity interval with latency and budget floors. Caller holds the lock."""
+        interval, reason = self.activity_interval, self.activity
+
+        # Sampling faster than the model answers only produces frames that get replaced
+        if self.latency is not None and self.latency > interval:
+            interval, reason = self.latency, "model slow"
+
+        # Bursts are fine, but once half the budget is used pace requests to fit the rest
+        self._expire(time.time())
+        if self.requests_per_minute and len(self.requests) * 2 >= self.requests_per_minute:
+            budget_interval = 60.0 / self.requests_per_minute
+            if budget_interval > interval:
+                interval, reason = budget_interval, "request budget"
+
+        if self.tokens_per_minute and self.tokens and self._tokens_used() * 2 >= self.tokens_per_minute:
+            average_tokens = self._tokens_used() / len(self.tokens)
+            budget_interval = 60.0 * average_tokens / self.tokens_per_minute
+            if budget_interval > interval:
+                interval, reason = budget_interval, "token budget"
+
+        remaining = self.rate_limited_until - time.time()
+        if remaining > interval:
+            interval, reason = remaining, "rate limited"
+
+        self.interval = min(interval, self.max_interval * 4)
+        self.reason = reason
+
+    def _expire(self, now):
+        while self.requests and now - self.requests[0] > 60:
+            self.requests.popleft()
+        while self.tokens and now - self.tokens[0][0] > 60:
+            self.tokens.popleft()
+
+    def _tokens_used(self):
+        return sum(count for _, count in self.tokens)
+
+
+def is_rate_limit_error(error):
+    """Whether an SDK exception means we hit a quota or rate limit."""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ("429", "resourceexhausted", "resource exhausted", "quota", "rate limit"))
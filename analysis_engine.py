@@ -0,0 +1,163 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from threading import Thread, Lock
+
+
+class AnalysisJob:
+    """A single frame waiting to be analysed."""
+
+    def __init__(self, seq, payload, captured_at=None):
+        self.seq = seq
+        self.payload = payload
+        self.captured_at = captured_at or time.time()
+        self.started_at = None
+        self.finished_at = None
+
+
+class AnalysisEngine:
+    """Runs analysis requests on an asyncio loop in a background thread.
+
+    At most ``max_in_flight`` requests run at once. Submitting while all slots are
+    busy replaces the pending job (latest wins), every request is bounded by
+    ``deadline`` seconds, and ``cancel_all`` aborts pending and running work at once.
+    ``handler`` is an ``async def handler(job)`` coroutine function.
+    """
+
+    def __init__(self, handler, max_in_flight=1, deadline=30.0, on_error=None):
+        self.handler = handler
+        self.max_in_flight = max_in_flight
+        self.deadline = deadline
+        self.on_error = on_error  # Optional callback(job, exception) for failures and timeouts
+
+        self.loop = None
+        self.thread = None
+        self.pending = None
+        self.in_flight = {}  # asyncio task -> job
+        self.job_ids = itertools.count(1)
+
+        self.stats_lock = Lock()
+        self.latencies = deque(maxlen=200)  # Seconds from frame capture to answer
+        self.submitted = 0
+        self.replaced = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.timed_out = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the event loop thread if it is not running yet."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, payload, captured_at=None):
+        """Queue a payload for analysis, replacing any job that has not started yet."""
+        job = AnalysisJob(next(self.job_ids), payload, captured_at)
+        with self.stats_lock:
+            self.submitted += 1
+        self.loop.call_soon_threadsafe(self._enqueue, job)
+        return job
+
+    def cancel_all(self):
+        """Drop the pending job and cancel every request in flight."""
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._cancel_all)
+
+    def stop(self):
+        """Cancel all work and shut the event loop down."""
+        if self.loop is None or not self.loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=2.0)
+        except Exception as e:
+            print(f"Analysis engine shutdown error: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2.0)
+
+    def is_idle(self):
+        return self.pending is None and not self.in_flight
+
+    def get_stats(self):
+        with self.stats_lock:
+            latencies = sorted(self.latencies)
+            return {
+                "in_flight": len(self.in_flight),
+                "max_in_flight": self.max_in_flight,
+                "submitted": self.submitted,
+                "replaced": self.replaced,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "timed_out": self.timed_out,
+                "failed": self.failed,
+                "latency_p50": percentile(latencies, 50),
+                "latency_p95": percentile(latencies, 95),
+            }
+
+    def _enqueue(self, job):
+        if self.pending is not None:
+            with self.stats_lock:
+                self.replaced += 1
+        self.pending = job
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.pending is not None and len(self.in_flight) < self.max_in_flight:
+            job, self.pending = self.pending, None
+            task = self.loop.create_task(self._run(job))
+            self.in_flight[task] = job
+
+    def _cancel_all(self):
+        self.pending = None
+        for task in list(self.in_flight):
+            task.cancel()
+
+    async def _shutdown(self):
+        self._cancel_all()
+        await asyncio.gather(*self.in_flight, return_exceptions=True)
+
+    async def _run(self, job):
+        job.started_at = time.time()
+        try:
+            await asyncio.wait_for(self.handler(job), self.deadline)
+            job.finished_at = time.time()
+            with self.stats_lock:
+                self.completed += 1
+                self.latencies.append(job.finished_at - job.captured_at)
+            # Anything older still running can only produce a stale answer
+            for task, other in list(self.in_flight.items()):
+                if other.seq < job.seq:
+                    task.cancel()
+        except asyncio.CancelledError:
+            with self.stats_lock:
+                self.cancelled += 1
+        except asyncio.TimeoutError as e:
+            with self.stats_lock:
+                self.timed_out += 1
+            self._report_error(job, e)
+        except Exception as e:
+            with self.stats_lock:
+                self.failed += 1
+            self._report_error(job, e)
+        finally:
+            self.in_flight.pop(asyncio.current_task(), None)
+            self._dispatch()
+
+    def _report_error(self, job, error):
+        if self.on_error:
+            try:
+                self.on_error(job, error)
+            except Exception as e:
+                print(f"Analysis error handler failed: {e}")
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list, or None when empty."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
@@ -1,8 +1,8 @@
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for,Response
 import os
 import threading
+import itertools
 import json
-import google.generativeai as genai
 import time
 import re
 from dotenv import load_dotenv
@@ -15,7 +15,20 @@ import signal
 from threading import Event
 from flask_socketio import SocketIO
 from screen_analyzer import ScreenAnalyzer
-import pyttsx3
+from file_index import get_file_index
+from file_search import get_file_search
+from file_reader import is_binary, read_range, read_lines, iter_chunks, FIRST_WINDOW_BYTES
+from file_writer import atomic_write, encode_text, check_precondition, WriteConflict
+from context_packer import pack_context
+from json_stream import IncrementalJSONParser
+from response_cache import get_response_cache, cache_key, file_hashes
+from completion_service import get_completion_service
+from model_pool import cancel_response, get_model_pool
+from gemini_gateway import get_gemini_gateway
+from file_patch import apply_change, patch_size, patch_stats, PatchError
+from content_index import get_content_index, update_content_index
+from speech_service import get_speech_service, PRIORITY_NORMAL
+from live_talk import LiveTalk
 from datetime import datetime
 import pygit2
 
@@ -37,96 +50,79 @@ DEFAULT_PROJECT_DIR = os.getenv("DEFAULT_PROJECT_DIR", os.path.join(os.path.expa
 os.makedirs(DEFAULT_PROJECT_DIR, exist_ok=True)
 
 # Global variables
-model = None
 active_processes = {}  # Store running processes
 command_stop_events = {}  # Events to signal stopping a command
 analyzer = None
-chat = None
+vision_socket_id = None  # Socket.IO client that started the screen stream and gets its results
+
+def create_analyzer(api_key):
+    """Create a ScreenAnalyzer that pushes every new analysis to the client that started the stream."""
+    new_analyzer = ScreenAnalyzer(api_key)
+    new_analyzer.on_response = push_vision_response
+    return new_analyzer
+
+def push_vision_response(seq, response):
+    socket_id = vision_socket_id
+    if socket_id:
+        socketio.emit('vision_response', {'seq': seq, 'response': response}, to=socket_id)
+
+# Live voice conversation; replies stream to the speaker and, as 'talk_event', to the client that asked
+live_talk = LiveTalk(lambda: get_model_pool().get("chat"))
 
 def initialize_gemini():
     """Initialize Gemini API with API key from environment variables"""
-    global model,analyzer
+    global analyzer
 
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     if GEMINI_API_KEY:
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            analyzer = ScreenAnalyzer(GEMINI_API_KEY)
-            model = genai.GenerativeModel('gemini-2.5-pro-exp-03-25') #gemini-2.0-flash-lite
+            get_model_pool().set_default_key(GEMINI_API_KEY)
+            analyzer = create_analyzer(GEMINI_API_KEY)
             logger.info("Gemini API configured successfully")
         except Exception as e:
             logger.error(f"Error configuring Gemini API: {e}")
-            model = None
     else:
         logger.warning("No Gemini API key found in environment variables")
-        model = None
-
-# Define routes
-@app.route('/autocomplete', methods=['POST'])
-def autocomplete():
-    global model
-    model = genai.GenerativeModel('gemini-2.0-flash-lite')
-    data = request.get_json()
-    exist_code = data['code']
-
-    prompt = f"""You are an AI code completion assistant. Given a code snippet, your task is to predict the most likely and complete continuation of the code. Aim to provide a substantial code block, such as a function definition or a logical code segment, that seamlessly integrates with the existing code.
-
-    Programming Language: Detect by seeing the existing code
 
-    Existing Code:
-    ```
-    {exist_code}
-    ```
+def current_api_key():
+    """The Gemini API key for this request: the one saved in the session, else the environment's."""
+    return session.get('gemini_api_key') or os.getenv("GEMINI_API_KEY")
 
-    Instructions:
-
-    1.  **Provide Substantial Code Completion:**  Instead of just completing the current line, generate a meaningful block of code that expands upon the existing code. This could be a function, a class, a loop, or a conditional block – whatever logically fits the context.
-    2.  **Understand Context:** Deeply analyze the existing code to understand its purpose, data structures, variables, and intended functionality.
-    3.  **Seamless Integration:** The generated code MUST be syntactically correct, logically consistent, and seamlessly integrated with the existing code.  It should feel like a natural extension written by the same developer.
-    4.  **Completeness:** Ensure all code blocks (functions, loops, conditionals) are properly opened and closed.
-    5.  **Correctness:**  Prioritize correctness. The generated code should compile or run without errors, where applicable.
-    6.  **Adhere to Language Conventions:** Strictly adhere to the syntax and coding style conventions of the specified programming language.
-    7.  **Avoid Repetition:** Do not simply repeat existing code. Focus on *extending* the code in a useful and predictable way.
-    8.  **No Extraneous Text:**  Return only the generated code, without any introductory or explanatory text.
-
-    Output Format:
-
-    *   Return *only* the suggested code completion. Do not include any surrounding text, code block delimiters, or explanations.
-    *   Use "\\n" for newlines. Maintain correct indentation and syntax for the given language.
-    *   Use "\\t" for python formating
-
-    Example:
-
-    Existing Code:
-    ```
-    function calculateArea(width, height) {{
-      return width * height;
-    }}
+# Define routes
+# Bump when the analyze prompt template changes so cached responses to the old one are not reused
+ANALYZE_PROMPT_VERSION = 2
 
-    function calculateCircumference(radius) {{
-      return 2 * Math.PI *
-    ```
+def usage_tokens(response):
+    """Total tokens a Gemini call used, when the response reports it."""
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', 0) or 0
 
-    Output:
-    ```
-    radius;\\n}}
-    ```
+@app.route('/autocomplete', methods=['POST'])
+def autocomplete():
+    """Complete the code at the editor cursor.
 
-    Now, generate the code completion for the given existing code in detected language.
+    Body: {"prefix", "suffix", "language", "editor_id"}; ``code`` is accepted in place
+    of ``prefix``. A request superseded by a newer one from the same editor returns
+    {"completion": null, "cancelled": true}.
     """
+    data = request.get_json()
+    prefix = data.get('prefix', data.get('code', ''))
+    channel = data.get('editor_id') or request.remote_addr
+    try:
+        result = get_completion_service().complete(prefix, data.get('suffix', ''), data.get('language') or '', channel,
+                                                   api_key=current_api_key())
+    except Exception as e:
+        logger.error(f"Error getting completion: {e}")
+        return jsonify({"completion": None, "message": f"Error getting completion: {str(e)}"}), 500
+    return jsonify(result)
 
-    generation_config = {"max_output_tokens": 8000}
-    response = model.generate_content(prompt, generation_config=generation_config)
-    model = genai.GenerativeModel('gemini-2.5-pro-exp-03-25')
-
-    return jsonify({"completion": response.text.strip()})
-    
 
 
 
 # Define routes
 @app.route('/start_stream', methods=['POST'])
 def start_stream():
+    global vision_socket_id
     print("in start stream function")
     data = request.get_json()
     if not data or 'prompt' not in data:
@@ -134,6 +130,8 @@ def start_stream():
     if(not analyzer):
         return jsonify({"message": "No API Key"}), 400
     success, message = analyzer.start_stream(data['prompt'])
+    if success:
+        vision_socket_id = data.get('socket_id')
     status_code = 200 if success else 429 if "wait" in message else 400
     return jsonify({"status": "success" if success else "error", "message": message}), status_code
     
@@ -142,27 +140,111 @@ def stop_stream():
     success, message = analyzer.stop_stream()
     return jsonify({"status": "success" if success else "error", "message": message})
     
+MJPEG_BOUNDARY = 'frame'
+
+def mjpeg_part(jpeg_bytes):
+    """Build the multipart chunks for one MJPEG frame without copying the JPEG bytes."""
+    header = (f"--{MJPEG_BOUNDARY}\r\n"
+              f"Content-Type: image/jpeg\r\n"
+              f"Content-Length: {len(jpeg_bytes)}\r\n\r\n").encode('ascii')
+    return header, jpeg_bytes, b"\r\n"
+
 @app.route('/stream')
 def stream():
+    """Stream the captured screen as binary MJPEG.
+
+    Query parameters: ``fps`` (1-30) caps the client's frame rate, ``width`` and
+    ``height`` bound the frame size (aspect ratio is kept).
+    """
+    if(not analyzer):
+        return jsonify({"message": "No API Key"}), 400
+
+    max_fps = 1 / analyzer.get_frame_interval()
+    fps = min(max(request.args.get('fps', max_fps, type=float), 1.0), max_fps)
+    max_width = request.args.get('width', type=int)
+    max_height = request.args.get('height', type=int)
+    min_interval = 1.0 / fps
+
+    def frame_size():
+        """Client resolution that fits the requested bounds, or None for full size."""
+        with analyzer.frame_lock:
+            if analyzer.frame is None:
+                return None
+            height, width = analyzer.frame.shape[:2]
+        scale = min(max_width / width if max_width else 1.0, max_height / height if max_height else 1.0)
+        if scale >= 1.0:
+            return None
+        return max(int(width * scale), 1), max(int(height * scale), 1)
+
     def generate():
-        while analyzer.is_streaming():
-            frame_data = analyzer.get_encoded_frame()
-            if frame_data:
-                yield f"data:image/jpeg;base64,{frame_data}\n\n"
-            time.sleep(analyzer.get_frame_interval())
-            
-    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+        consumer_id = analyzer.add_frame_consumer(min_interval)
+        sent_generation = None
+        try:
+            while analyzer.is_streaming():
+                # Only wake up once the capture thread has produced a new frame
+                if analyzer.wait_for_frame(sent_generation, timeout=1.0) == sent_generation:
+                    continue
+                started = time.time()
+                sent_generation, frame_bytes = analyzer.get_encoded_frame_bytes(size=frame_size())
+                if frame_bytes:
+                    # Yield blocks until a slow client drains the socket; frames captured
+                    # meanwhile are skipped because only the latest generation is fetched
+                    yield from mjpeg_part(frame_bytes)
+                time.sleep(max(0.0, min_interval - (time.time() - started)))
+        finally:
+            analyzer.remove_frame_consumer(consumer_id)
+
+    return Response(generate(), mimetype=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}',
+                    headers={'Cache-Control': 'no-cache, no-store', 'X-Accel-Buffering': 'no'})
     
 @app.route('/get_gemini_response')
 def get_gemini_response():
-    response_data = {"response": analyzer.get_response()}
-    return jsonify(response_data)
+    """Latest vision analysis; answers 304 when the client's ETag is still current."""
+    if(not analyzer):
+        return jsonify({"message": "No API Key"}), 400
+    seq, response = analyzer.get_response_snapshot()
+    etag = f"vision-{id(analyzer)}-{seq}"
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+    response_data = jsonify({"response": response, "seq": seq})
+    response_data.set_etag(etag)
+    return response_data
+
+@app.route('/get_vision_stats')
+def get_vision_stats():
+    if(not analyzer):
+        return jsonify({"message": "No API Key"}), 400
+    return jsonify({"stats": analyzer.get_stats()})
+
+@app.route('/get_speech_stats')
+def get_speech_stats():
+    return jsonify({"stats": get_speech_service().get_stats()})
+
+@app.route('/get_cache_stats')
+def get_cache_stats():
+    return jsonify({"stats": get_response_cache().get_stats()})
+
+@app.route('/get_completion_stats')
+def get_completion_stats():
+    return jsonify({"stats": get_completion_service().get_stats()})
+
+@app.route('/get_model_pool_stats')
+def get_model_pool_stats():
+    return jsonify({"stats": get_model_pool().get_stats()})
+
+@app.route('/get_gateway_stats')
+def get_gateway_stats():
+    return jsonify({"stats": get_gemini_gateway().get_stats()})
+
+@app.route('/get_patch_stats')
+def get_patch_stats():
+    return jsonify({"stats": patch_stats.get_stats()})
 
 
 @app.route('/api/set-api-key', methods=['POST'])
 def set_api_key():
     """Set the Gemini API key"""
-    global model,analyzer
+    global analyzer
 
     data = request.json
     api_key = data.get('api_key')
@@ -174,17 +256,17 @@ def set_api_key():
         }), 400
 
     try:
-        # Configure Gemini with the new API key
-        genai.configure(api_key=api_key)
-        analyzer = ScreenAnalyzer(api_key)
-        # Test the configuration by creating a model
-        test_model = genai.GenerativeModel('gemini-2.0-pro-exp-02-05')
+        # Test the key by creating its analyze client; the pool keeps it for later requests
+        pool = get_model_pool()
+        pool.get("analyze", api_key)
+        analyzer = create_analyzer(api_key)
 
         # If successful, save the API key securely
         session['gemini_api_key'] = api_key
 
-        # Update the global model
-        model = test_model
+        # Background work (autocomplete, live talk) uses the newest key
+        pool.set_default_key(api_key)
+        get_completion_service().reset_model()
 
         logger.info("Gemini API key configured successfully")
 
@@ -232,14 +314,15 @@ def check_api_key():
 @app.before_request
 def load_api_key():
     """Load API key from session before each request"""
-    global model,analyzer
+    global analyzer
 
-    if model is None and 'gemini_api_key' in session:
+    if analyzer is None and 'gemini_api_key' in session:
         api_key = session['gemini_api_key']
         try:
-            genai.configure(api_key=api_key)
-            analyzer = ScreenAnalyzer(api_key)
-            model = genai.GenerativeModel('gemini-2.0-pro-exp-02-05')
+            pool = get_model_pool()
+            if pool.default_api_key is None:
+                pool.set_default_key(api_key)
+            analyzer = create_analyzer(api_key)
             logger.info("Gemini API configured from session")
         except Exception as e:
             logger.error(f"Error configuring Gemini API from session: {e}")
@@ -254,41 +337,14 @@ def index():
 
 def speak_message(message):
     """
-    Speaks a message immediately in the background without using the queue system.
+    Queues a message on the shared speech service and returns immediately.
     
     Args:
         message (str): The message to be spoken
     """
     if not message:
         return
-        
-    # Create a separate thread for speaking this specific message
-    speak_thread = threading.Thread(target=speak_single_message, args=(message,))
-    speak_thread.daemon = True
-    speak_thread.start()
-
-def speak_single_message(message):
-    """
-    Internal helper method to speak a single message without queue dependencies.
-    
-    Args:
-        message (str): The message to be spoken
-    """
-    try:
-        time.sleep(1)
-        # Create a new speech engine instance for this message
-        speech_engine = pyttsx3.init()
-        # Set voice properties
-        speech_engine.setProperty('rate', 200)  # Faster speech
-        speech_engine.setProperty('volume', 1.0)  # Full volume
-        
-        print(f"Direct speaking at {time.strftime('%H:%M:%S')}: {message}")
-        speech_engine.say(message)
-        speech_engine.runAndWait()
-        print(f"Finished direct speaking at {time.strftime('%H:%M:%S')}")
-        speech_engine.stop()
-    except Exception as e:
-        print(f"Direct speech error: {e}")
+    get_speech_service().speak(message, priority=PRIORITY_NORMAL)
 
 
 @app.route('/speak', methods=['POST'])
@@ -360,7 +416,14 @@ def set_project_path():
 
 @app.route('/api/list-files', methods=['GET'])
 def list_files():
-    """List files in the current project directory"""
+    """List files in the current project directory.
+
+    Query parameters pick the mode:
+      dir=<folder>            only the direct children of a folder (lazy tree)
+      limit=<n>&cursor=<c>    one page of the flat list; pass back next_cursor for the next page
+      format=ndjson           the flat list streamed as newline-delimited JSON batches
+    Without parameters the whole flat list is returned at once.
+    """
     project_path = session.get('project_path', DEFAULT_PROJECT_DIR)
 
     if not os.path.exists(project_path):
@@ -370,15 +433,46 @@ def list_files():
         }), 400
 
     try:
-        files = []
-        for root, _, filenames in os.walk(project_path):
-            for filename in filenames:
-                rel_path = os.path.relpath(os.path.join(root, filename), project_path)
-                if filename.startswith('.') or rel_path.startswith('.') or "Lib" in rel_path or "Scripts" in rel_path:
-                    continue
+        index = get_file_index(project_path)
+
+        if 'dir' in request.args:
+            listing = index.list_dir(request.args.get('dir', ''))
+            if listing is None:
+                return jsonify({
+                    "success": False,
+                    "message": f"Folder is not in the project index: {request.args.get('dir')}"
+                }), 404
+            dirs, files = listing
+            return jsonify({
+                "success": True,
+                "dir": request.args.get('dir', ''),
+                "dirs": dirs,
+                "files": files
+            })
+
+        if request.args.get('format') == 'ndjson':
+            batch_size = max(1, min(request.args.get('batch', 1000, type=int), 10000))
+            # Snapshot lists are replaced, never mutated, so streaming from one is safe
+            files = index.files()
+
+            def generate():
+                for start in range(0, len(files), batch_size):
+                    yield json.dumps({"files": files[start:start + batch_size]}) + "\n"
+                yield json.dumps({"done": True, "total": len(files)}) + "\n"
 
-                # rel_path = os.path.relpath(os.path.join(root, filename), project_path)
-                files.append(rel_path)
+            return Response(generate(), mimetype='application/x-ndjson')
+
+        if 'limit' in request.args or 'cursor' in request.args:
+            limit = max(1, min(request.args.get('limit', 1000, type=int), 10000))
+            files, next_cursor, total = index.page(request.args.get('cursor') or None, limit)
+            return jsonify({
+                "success": True,
+                "files": files,
+                "next_cursor": next_cursor,
+                "total": total
+            })
+
+        files = index.files()
 
         return jsonify({
             "success": True,
@@ -393,7 +487,14 @@ def list_files():
 
 @app.route('/api/read-file', methods=['POST'])
 def read_file():
-    """Read a file from the project directory"""
+    """Read a file from the project directory.
+
+    Small files come back whole. Larger ones return the first window with
+    ``truncated`` and ``next_offset`` so the rest can be paged in; ``offset`` and
+    ``length`` select a byte window, ``start_line`` and ``line_count`` a line
+    window, and ``stream`` returns the raw text as a streamed body. Binary files
+    are reported with ``binary`` instead of content.
+    """
     data = request.json
     file_path = data.get('path')
 
@@ -419,14 +520,60 @@ def read_file():
             "message": f"File does not exist: {file_path}"
         }), 404
 
+    if not os.path.isfile(full_path):
+        return jsonify({
+            "success": False,
+            "message": f"Not a file: {file_path}"
+        }), 400
+
     try:
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        size = os.path.getsize(full_path)
+        mtime = str(os.stat(full_path).st_mtime_ns)  # Send back as expected_mtime to detect concurrent edits
+        if is_binary(full_path):
+            return jsonify({
+                "success": True,
+                "path": file_path,
+                "binary": True,
+                "size": size,
+                "content": None
+            })
+
+        # Raw streaming: the client reads the body as it arrives
+        if data.get('stream'):
+            offset = int(data.get('offset') or 0)
+            return Response(iter_chunks(full_path, offset), mimetype='text/plain; charset=utf-8',
+                            headers={'X-File-Size': str(size)})
+
+        # Line window: {"start_line": 1, "line_count": 1000}
+        if data.get('start_line') is not None:
+            content, start_line, end_line, total_lines, next_offset = read_lines(
+                full_path, int(data['start_line']), int(data.get('line_count') or 1000))
+            return jsonify({
+                "success": True,
+                "content": content,
+                "path": file_path,
+                "size": size,
+                "start_line": start_line,
+                "end_line": end_line,
+                "total_lines": total_lines,
+                "truncated": end_line < total_lines,
+                "mtime": mtime
+            })
+
+        # Byte window: {"offset": 0, "length": 524288}; a plain read of a large file gets the first window
+        offset = int(data.get('offset') or 0)
+        length = int(data.get('length') or (size if size <= FIRST_WINDOW_BYTES else FIRST_WINDOW_BYTES))
+        content, start, end = read_range(full_path, offset, length)
 
         return jsonify({
             "success": True,
             "content": content,
-            "path": file_path
+            "path": file_path,
+            "size": size,
+            "offset": start,
+            "next_offset": end,
+            "truncated": end < size,
+            "mtime": mtime
         })
     except Exception as e:
         logger.error(f"Error reading file {full_path}: {e}")
@@ -437,12 +584,17 @@ def read_file():
 
 @app.route('/api/write-file', methods=['POST'])
 def write_file():
-    """Write content to a file in the project directory"""
+    """Write content to a file in the project directory.
+
+    Instead of ``content`` the request may carry search/replace ``edits`` or a
+    unified ``diff``, which are applied to the file as it is on disk.
+    Optional ``expected_mtime`` (from read-file) or ``expected_hash`` make the write
+    fail with 409 if the file changed on disk in the meantime.
+    """
     data = request.json
     file_path = data.get('path')
-    content = data.get('content')
 
-    if not file_path or content is None:
+    if not file_path or (data.get('content') is None and not data.get('edits') and not data.get('diff')):
         return jsonify({
             "success": False,
             "message": "File path or content missing"
@@ -459,16 +611,32 @@ def write_file():
         }), 400
 
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        check_precondition(full_path, data.get('expected_mtime'), data.get('expected_hash'))
+        content = content_for_write(full_path, data)
+        changed = atomic_write(full_path, encode_text(content))
+        if changed:
+            index = get_file_index(project_path)
+            index.update_paths([file_path])
+            update_content_index(index, [file_path])
 
         return jsonify({
             "success": True,
-            "message": f"File {file_path} written successfully"
+            "message": f"File {file_path} written successfully" if changed else f"File {file_path} is unchanged",
+            "changed": changed,
+            "mtime": str(os.stat(full_path).st_mtime_ns)
         })
+    except WriteConflict as e:
+        return jsonify({
+            "success": False,
+            "conflict": True,
+            "message": f"{file_path} not saved: {e}"
+        }), 409
+    except PatchError as e:
+        return jsonify({
+            "success": False,
+            "conflict": True,
+            "message": f"{file_path} not saved, the edits do not match the file: {e}"
+        }), 409
     except Exception as e:
         logger.error(f"Error writing to file {full_path}: {e}")
         return jsonify({
@@ -476,27 +644,128 @@ def write_file():
             "message": f"Error writing to file: {str(e)}"
         }), 500
 
+def content_for_write(full_path, item):
+    """New file content for a write request carrying either full content or edits/diff."""
+    if not item.get('edits') and not item.get('diff'):
+        return item.get('content')
+    current = ""
+    if os.path.exists(full_path):
+        with open(full_path, 'r', encoding='utf-8') as f:
+            current = f.read()
+    return apply_change(current, item)
+
+@app.route('/api/write-files', methods=['POST'])
+def write_files():
+    """Write many files in one request.
+
+    Body: {"files": [{"path", "content" | "edits" | "diff", "expected_mtime"?, "expected_hash"?}, ...]}
+    Every path and precondition is checked before anything is written, so a
+    conflict leaves the whole batch unwritten. Each file is replaced atomically
+    and files whose content is already identical are not touched.
+    """
+    data = request.json
+    files = data.get('files')
+
+    if not files or not isinstance(files, list):
+        return jsonify({
+            "success": False,
+            "message": "No files provided"
+        }), 400
+
+    project_path = session.get('project_path', DEFAULT_PROJECT_DIR)
+
+    # Validate the whole batch first
+    writes, conflicts = [], []
+    for item in files:
+        file_path = item.get('path')
+        if not file_path or (item.get('content') is None and not item.get('edits') and not item.get('diff')):
+            return jsonify({
+                "success": False,
+                "message": "File path or content missing"
+            }), 400
+        full_path = os.path.join(project_path, file_path)
+        if not os.path.normpath(full_path).startswith(os.path.normpath(project_path)):
+            return jsonify({
+                "success": False,
+                "message": f"Invalid file path: {file_path}"
+            }), 400
+        try:
+            check_precondition(full_path, item.get('expected_mtime'), item.get('expected_hash'))
+            writes.append((file_path, full_path, content_for_write(full_path, item)))
+        except (WriteConflict, PatchError) as e:
+            conflicts.append({"path": file_path, "status": "conflict", "message": str(e)})
+
+    if conflicts:
+        return jsonify({
+            "success": False,
+            "conflict": True,
+            "message": f"Nothing written, {len(conflicts)} file(s) changed on disk or did not match their edits",
+            "results": conflicts
+        }), 409
+
+    results, written = [], []
+    for file_path, full_path, content in writes:
+        try:
+            changed = atomic_write(full_path, encode_text(content))
+            if changed:
+                written.append(file_path)
+            results.append({
+                "path": file_path,
+                "status": "written" if changed else "unchanged",
+                "mtime": str(os.stat(full_path).st_mtime_ns)
+            })
+        except Exception as e:
+            logger.error(f"Error writing to file {full_path}: {e}")
+            results.append({"path": file_path, "status": "error", "message": str(e)})
+
+    if written:
+        index = get_file_index(project_path)
+        index.update_paths(written)
+        update_content_index(index, written)
+
+    failed = [result for result in results if result["status"] == "error"]
+    return jsonify({
+        "success": not failed,
+        "message": f"{len(written)} written, {len(results) - len(written) - len(failed)} unchanged, {len(failed)} failed",
+        "results": results
+    }), 200 if not failed else 500
+
 @app.route('/api/find-files', methods=['POST'])
 def find_files():
-    """Find files matching a pattern in the project directory"""
+    """Find files by glob pattern, or rank them by fuzzy match when a query is given.
+
+    Body: {"pattern": "src/**/*.py"} or {"query": "mainjs", "limit": 20}
+    """
     data = request.json
     pattern = data.get('pattern', '*.*')
+    query = data.get('query')
+    limit = data.get('limit')
 
     project_path = session.get('project_path', DEFAULT_PROJECT_DIR)
 
     try:
-        # Find files matching the pattern
-        matching_files = []
-        for root, _, _ in os.walk(project_path):
-            for file_path in glob.glob(os.path.join(root, pattern)):
-                if os.path.isfile(file_path):
-                    rel_path = os.path.relpath(file_path, project_path)
-                    matching_files.append(rel_path)
+        search = get_file_search(get_file_index(project_path))
+
+        if query:
+            matches = search.fuzzy(query, limit=int(limit or 50))
+            return jsonify({
+                "success": True,
+                "files": [path for path, _ in matches],
+                "scores": [score for _, score in matches]
+            })
+
+        matching_files, truncated = search.glob(pattern, limit=int(limit) if limit else None)
 
         return jsonify({
             "success": True,
-            "files": matching_files
+            "files": matching_files,
+            "truncated": truncated
         })
+    except re.error as e:
+        return jsonify({
+            "success": False,
+            "message": f"Invalid pattern: {str(e)}"
+        }), 400
     except Exception as e:
         logger.error(f"Error finding files: {e}")
         return jsonify({
@@ -504,6 +773,72 @@ def find_files():
             "message": f"Error finding files: {str(e)}"
         }), 500
 
+@app.route('/api/search-content', methods=['POST'])
+def search_content():
+    """Search file contents line by line.
+
+    Body: {"query": "...", "regex": false, "case_sensitive": false, "limit": 200}
+    """
+    data = request.json
+    query = data.get('query')
+
+    if not query:
+        return jsonify({
+            "success": False,
+            "message": "No search query provided"
+        }), 400
+
+    project_path = session.get('project_path', DEFAULT_PROJECT_DIR)
+
+    try:
+        index = get_content_index(get_file_index(project_path))
+        results, truncated, files_scanned = index.search(
+            query,
+            regex=bool(data.get('regex')),
+            case_sensitive=bool(data.get('case_sensitive')),
+            limit=int(data.get('limit') or 200))
+
+        return jsonify({
+            "success": True,
+            "results": results,
+            "truncated": truncated,
+            "files_scanned": files_scanned
+        })
+    except re.error as e:
+        return jsonify({
+            "success": False,
+            "message": f"Invalid regular expression: {str(e)}"
+        }), 400
+    except Exception as e:
+        logger.error(f"Error searching file contents: {e}")
+        return jsonify({
+            "success": False,
+            "message": f"Error searching file contents: {str(e)}"
+        }), 500
+
+@app.route('/api/symbols', methods=['GET'])
+def find_symbols():
+    """Look up definitions (Python def/class, JS functions/classes) by name, or list one file's."""
+    project_path = session.get('project_path', DEFAULT_PROJECT_DIR)
+
+    try:
+        index = get_content_index(get_file_index(project_path))
+        symbols = index.find_symbols(
+            request.args.get('query', ''),
+            path=request.args.get('path'),
+            limit=request.args.get('limit', 100, type=int))
+
+        return jsonify({
+            "success": True,
+            "symbols": symbols
+        })
+    except Exception as e:
+        logger.error(f"Error finding symbols: {e}")
+        return jsonify({
+            "success": False,
+            "message": f"Error finding symbols: {str(e)}"
+        }), 500
+
 def make_non_blocking(pipe):
     """Make a pipe non-blocking"""
     if pipe is None:
@@ -1013,172 +1348,177 @@ def send_input():
         }), 500
 
 
-def initialize_gemini_chat_for_chatting():
-    """Initialize a new chat session with Gemini."""
-    global chat
-    
-    # Configure the model parameters
-    generation_config = {
-        "temperature": 0.7,
-        "top_p": 0.95,
-        "top_k": 40,
-        "max_output_tokens": 65536,
-    }
-    
-    # Initialize the model
-    model_chat = genai.GenerativeModel(
-        model_name="gemini-2.5-pro-exp-03-25",
-        generation_config=generation_config
-    )
-    
-    # Start a chat session
-    chat = model_chat.start_chat(history=[])
-    
-    return chat
-
-
-def get_gemini_response(message):
-    """Get response from Gemini API."""
-    global chat
-
-    prompt="You are Codify agent user is talking to you live, below is his attached message.\nreply briefly as if you are talking to him live. Do not format your response,only return brief response that is very appropriate for speaking.\n\n User Query:"+message
-    
-    if chat is None:
-        initialize_gemini_chat_for_chatting()
-    
-    try:
-        response = chat.send_message(prompt)
-        return response.text
-    except Exception as e:
-        return f"Error communicating with Gemini: {str(e)}"
-
-
-# Add a global variable to track the current thread
-global_thread = None
-
 @app.route('/api/talk_live', methods=['POST'])
 def chat_endpoint():
-    global global_thread
-    
+    """Start answering a live-talk message and return its turn id right away.
+
+    The reply is spoken sentence by sentence as the model writes it; each sentence is
+    also pushed as a 'talk_event' (see live_talk.LiveTalk) to the Socket.IO client
+    named by ``socket_id``. A new message interrupts the reply in progress.
+    """
     data = request.json
     user_message = data.get('message', '')
     
     if not user_message:
         return jsonify({'response': 'No message received'})
-    
-    # Process in a separate thread to avoid blocking
-    def process_request():
-        response = get_gemini_response(user_message)
-        # In a real-time system, you might send this via WebSockets
-        # For simplicity, we'll just return it in the HTTP response
-    
-    # If there's already a thread running, wait for it to complete
-    if global_thread and global_thread.is_alive():
-        global_thread.join(timeout=1.0)  # Wait for up to 1 second
-    
-    # Start a new thread
-    global_thread = threading.Thread(target=process_request)
-    global_thread.start()
-    
-    # For immediate response
-    response = get_gemini_response(user_message)
-    speak_single_message(response)
-
-    return jsonify({'response': response})
 
+    socket_id = data.get('socket_id')
+    on_event = (lambda event: socketio.emit('talk_event', event, to=socket_id)) if socket_id else None
+    turn_id = live_talk.start_turn(user_message, on_event=on_event)
+    return jsonify({'success': True, 'turn_id': turn_id})
 
 
 @app.route('/api/reset_talking', methods=['POST'])
 def reset_chat():
-    global chat, global_thread
-    
-    # Stop the thread if it's running
-    if global_thread and global_thread.is_alive():
-        # In Python, you can't forcibly terminate a thread safely
-        # Best practice is to use a flag or event to signal the thread to stop
-        # For simplicity here, we'll just wait for it to complete
-        global_thread.join(timeout=2.0)  # Wait up to 2 seconds for thread to finish
-    
-    # Reset the global thread variable
-    global_thread = None
-    
-    # Reset the chat
-    chat = None
-    initialize_gemini_chat_for_chatting()
-    
+    live_talk.reset()
     return jsonify({'status': 'Chat session reset'})
 
+@app.route('/get_talk_stats')
+def get_talk_stats():
+    return jsonify({"stats": live_talk.get_stats()})
 
-@app.route('/api/analyze', methods=['POST'])
-def analyze_project():
-    """Analyze project files and suggest changes based on user prompt"""
-    data = request.json
+
+def resolve_changes(project_path, changes, user_prompt, model, request_missing=True):
+    """Check every suggested edit against the file on disk before the user sees it.
+
+    Edits and diffs that apply are kept as they are, so neither the response nor the
+    later write carries the whole file. A change whose edits do not apply falls back to
+    its full content, asking the model for it if the response had none. With
+    ``request_missing=False`` such changes are left untouched and returned instead, so
+    the caller can make that extra model call later.
+    """
+    deferred = []
+    for change in changes:
+        file_path = change.get("file")
+        if not file_path or (not change.get("edits") and not change.get("diff")):
+            patch_stats.record("full")
+            continue
+        full_path = os.path.join(project_path, file_path)
+        if not os.path.normpath(full_path).startswith(os.path.normpath(project_path)):
+            continue
+        current = ""
+        if os.path.exists(full_path):
+            with open(full_path, 'r', encoding='utf-8') as f:
+                current = f.read()
+        try:
+            new_content = apply_change(current, change)
+            full_bytes, delta_bytes = len(new_content.encode('utf-8')), patch_size(change)
+            change["savings"] = {"full_bytes": full_bytes, "patch_bytes": delta_bytes}
+            change.pop("modified", None)
+            patch_stats.record("patched", full_bytes, delta_bytes)
+        except PatchError as e:
+            if change.get("modified") is None and not request_missing:
+                deferred.append(change)
+                continue
+            logger.warning(f"Edits for {file_path} do not apply ({e}), falling back to full content")
+            if change.get("modified") is None:
+                change["modified"] = request_full_content(file_path, current, change, user_prompt, model)
+            if change.get("modified") is None:
+                change["patch_error"] = str(e)
+                patch_stats.record("failed")
+                continue
+            change.pop("edits", None)
+            change.pop("diff", None)
+            patch_stats.record("fallbacks")
+    return deferred
+
+def request_full_content(file_path, current, change, user_prompt, model):
+    """Ask the model for the complete new content of one file, or None if that fails."""
+    prompt = f"""
+    A user asked: "{user_prompt}"
+
+    These edits were suggested for {file_path} but do not match the file:
+    {json.dumps(change.get("edits") or change.get("diff"), indent=2)}
+
+    Explanation of the change: {change.get("explanation", "")}
+
+    Current content of {file_path}:
+    {current}
+
+    Return only the complete updated content of {file_path} as valid JSON: {{"modified": "complete file content"}}
+    """
+    try:
+        response = model.generate_content(prompt, generation_config={
+            "max_output_tokens": 65536,
+            "response_mime_type": "application/json"
+        })
+        return json.loads(response.text).get("modified")
+    except Exception as e:
+        logger.error(f"Error getting full content for {file_path}: {e}")
+        return None
+
+def prepare_analysis(data):
+    """Model, packed prompt and cache key for an analyze request; returns (analysis, error_response)."""
     user_prompt = data.get('prompt')
     files_to_analyze = data.get('files', [])
     filenames = data.get('filenames',[])
-    f_name=""
-    if filenames:
-        for names_f in filenames:
-            f_name += str(names_f)
 
     if not user_prompt:
-        return jsonify({
+        return None, (jsonify({
             "success": False,
             "message": "No prompt provided"
-        }), 400
+        }), 400)
 
-    global model
-    if not model:
-        # Try to initialize from session or environment
-        api_key = session.get('gemini_api_key') or os.getenv("GEMINI_API_KEY")
-        if api_key:
-            try:
-                genai.configure(api_key=api_key)
-                model = genai.GenerativeModel('gemini-2.0-pro-exp-02-05')
-            except Exception as e:
-                return jsonify({
-                    "success": False,
-                    "message": f"Failed to initialize Gemini API: {str(e)}"
-                }), 500
-        else:
-            return jsonify({
-                "success": False,
-                "message": "Gemini API not configured properly"
-            }), 500
+    api_key = current_api_key()
+    if not api_key:
+        return None, (jsonify({
+            "success": False,
+            "message": "Gemini API not configured properly"
+        }), 500)
+    try:
+        model = get_model_pool().get("analyze", api_key)
+    except Exception as e:
+        return None, (jsonify({
+            "success": False,
+            "message": f"Failed to initialize Gemini API: {str(e)}"
+        }), 500)
 
     project_path = session.get('project_path', DEFAULT_PROJECT_DIR)
 
-    # Read the content of selected files
-    file_contents = {}
-    for file_path in files_to_analyze:
-        full_path = os.path.join(project_path, file_path)
-
-        # Check path traversal
-        if not os.path.normpath(full_path).startswith(os.path.normpath(project_path)):
-            continue
-        try:
-            with open(full_path, 'r', encoding='utf-8') as f:
-                file_contents[file_path] = str(f.read())
-        except Exception as e:
-            logger.error(f"Error reading file {full_path}: {e}")
-            file_contents[file_path] = f"[Error reading file: {str(e)}]"
+    # Pack the selected files, most relevant first, into the context token budget
+    started = time.perf_counter()
+    file_context, context_report = pack_context(project_path, files_to_analyze, user_prompt,
+                                                filenames=[str(name) for name in filenames])
+    context_report["pack_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Analyze context: {context_report['tokens']} of {context_report['budget']} tokens, "
+                f"{sum(1 for f in context_report['files'] if f['status'] != 'dropped')} files in {context_report['pack_ms']} ms")
 
-    # Prepare the prompt for Gemini
-    analysis_prompt = f"""
+    # Same model, prompt and file contents as an earlier call reuse its response
+    generation_config = {
+        "max_output_tokens": 65536,
+        "response_mime_type":"application/json"
+    }
+    key = cache_key(purpose="analyze", version=ANALYZE_PROMPT_VERSION, model=getattr(model, 'model_name', ''),
+                    config=generation_config, prompt=user_prompt, filenames=filenames,
+                    files=file_hashes(project_path, files_to_analyze), budget=context_report["budget"])
+    return {
+        "model": model,
+        "prompt": build_analysis_prompt(user_prompt, file_context),
+        "generation_config": generation_config,
+        "cache_key": key,
+        "use_cache": not data.get('no_cache'),
+        "project_path": project_path,
+        "user_prompt": user_prompt,
+        "context": context_report,
+    }, None
+
+def build_analysis_prompt(user_prompt, file_context):
+    """Prompt for Gemini"""
+    return f"""
     You are an AI assistant for analyzing and improving code projects. A user has the following request:
 
     "{user_prompt}"
 
-    Here are the relevant files from the project:
+    Here are the relevant files from the project. Large files may be shortened to their most relevant lines, with "... (lines X-Y omitted)" marking what is not shown; search blocks must only copy lines that are shown:
 
-    {json.dumps(file_contents, indent=2) +" " +f_name}
+{file_context}
 
     Based on the user's request, analyze these files and provide:
     1. A summary of what you've found. Remember user is on windows machine.
     2. Specific changes you recommend for each file(only if file content is passsed and need changes)
     3. If any libraries are to be installed also include them as modification.
     4. Any terminal commands that need to be executed (give in order of execution)(like installing packages, starting services, etc.)
-    5. The complete file code with updated content for each file that needs changes is to be returned in modifed filed.
+    5. For a file that already exists, return only the edits: each "search" block is copied exactly from the current file (a few whole lines, unique in the file) and "replace" is what those lines become. For a new file, or when most of a file changes, return the complete file content in "modified" instead of edits.
     6. Do not introduce or conclude your response just return correct json as below. Always if needed return command to run the file like python app.py
     7. If you are making a web app based on flask. run it using webbrowser python library.(not on port 5000)
     8. Do not the return file in change key if that file do not require modification.(return files that need modifications)
@@ -1202,47 +1542,72 @@ def analyze_project():
         "changes": [
             {{
                 "file": "path/to/file",
-                "original": "original wrong content of respective file(not full file just the old part which has error/need improvement)",
-                "modified": "modified complete file content(do not give only modified part give full modified file)",
+                "edits": [
+                    {{
+                        "search": "exact lines of the current file to replace",
+                        "replace": "the new lines"
+                    }}
+                ],
+                "modified": "complete file content, only for new files or full rewrites (leave out when giving edits)",
                 "explanation": "explanation of changes"
             }}
         ]
     }}
     """
 
+def parse_analysis_response(response_text):
+    """The JSON object in a model response, or None if there is none."""
+    # Extract JSON from the response
+    json_match = re.search(r'```json\s*([\s\S]*?)\s*```', response_text)
     try:
-        # Call Gemini API
-        generation_config = {
-            "max_output_tokens": 65536,
-            "response_mime_type":"application/json"
-        }
-        response = model.generate_content(analysis_prompt, generation_config=generation_config)
-        response_text = response.text
+        return json.loads(json_match.group(1) if json_match else response_text)
+    except ValueError:
+        return None
+
+def raw_analysis_result(response_text):
+    # If not valid JSON, create a structured response
+    return {
+        "summary": "The AI generated a non-JSON response. Here's the raw output:",
+        "commands": [],
+        "changes": [],
+        "raw_response": response_text
+    }
 
-        # Extract JSON from the response
-        json_match = re.search(r'```json\s*([\s\S]*?)\s*```', response_text)
-        if json_match:
-            response_json = json.loads(json_match.group(1))
-        else:
-            # Try parsing the whole response as JSON
-            try:
-                response_json = json.loads(response_text)
-            except:
-                # If not valid JSON, create a structured response
-                return jsonify({
-                    "success": True,
-                    "data": {
-                        "summary": "The AI generated a non-JSON response. Here's the raw output:",
-                        "commands": [],
-                        "changes": [],
-                        "raw_response": response_text
-                    }
-                })
+@app.route('/api/analyze', methods=['POST'])
+def analyze_project():
+    """Analyze project files and suggest changes based on user prompt"""
+    analysis, error = prepare_analysis(request.json)
+    if error:
+        return error
+
+    try:
+        cache = get_response_cache()
+        response_text = cache.get(analysis["cache_key"]) if analysis["use_cache"] else None
+        cached = response_text is not None
+        if not cached:
+            # Call Gemini API
+            started = time.perf_counter()
+            response = analysis["model"].generate_content(analysis["prompt"], generation_config=analysis["generation_config"])
+            response_text = response.text
+            latency = time.perf_counter() - started
+
+        response_json = parse_analysis_response(response_text)
+        if response_json is None:
+            return jsonify({
+                "success": True,
+                "data": raw_analysis_result(response_text)
+            })
 
         # Ensure commands field exists
         if "commands" not in response_json:
             response_json["commands"] = []
 
+        if not cached:
+            cache.put(analysis["cache_key"], response_text, latency, usage_tokens(response))
+        resolve_changes(analysis["project_path"], response_json.get("changes") or [], analysis["user_prompt"], analysis["model"])
+        response_json["context"] = analysis["context"]
+        response_json["cached"] = cached
+
         return jsonify({
             "success": True,
             "data": response_json
@@ -1253,6 +1618,140 @@ def analyze_project():
             "message": f"Error analyzing project: {str(e)}"
         }), 500
 
+analysis_stop_events = {}  # analysis_id -> Event that stops its stream
+analysis_lock = threading.Lock()
+analysis_ids = itertools.count(1)
+
+@app.route('/api/analyze-stream', methods=['POST'])
+def analyze_project_stream():
+    """Start a streamed analysis and return its ID right away.
+
+    Results arrive as Socket.IO 'analysis_event' messages for that ID: 'summary',
+    then every 'command' and 'change' as soon as the model has finished writing it,
+    and finally 'done' with the complete result (or 'error'). They only go to the
+    Socket.IO client whose ``socket_id`` the request names.
+    """
+    socket_id = request.json.get('socket_id')
+    if not socket_id:
+        return jsonify({
+            "success": False,
+            "message": "No socket_id provided"
+        }), 400
+    analysis, error = prepare_analysis(request.json)
+    if error:
+        return error
+
+    analysis_id = f"analysis-{int(time.time())}-{next(analysis_ids)}"
+    stop_event = Event()
+    with analysis_lock:
+        analysis_stop_events[analysis_id] = stop_event
+    threading.Thread(target=stream_analysis, args=(analysis_id, analysis, stop_event, socket_id), daemon=True).start()
+
+    return jsonify({
+        "success": True,
+        "analysis_id": analysis_id,
+        "context": analysis["context"]
+    })
+
+@app.route('/api/analyze-stream/stop', methods=['POST'])
+def stop_analysis_stream():
+    """Stop a streamed analysis; anything already emitted stays valid."""
+    analysis_id = request.json.get('analysis_id')
+    with analysis_lock:
+        stop_event = analysis_stop_events.get(analysis_id)
+    if not stop_event:
+        return jsonify({
+            "success": False,
+            "message": f"No running analysis with ID: {analysis_id}"
+        }), 404
+    stop_event.set()
+    return jsonify({"success": True, "message": f"Analysis {analysis_id} stopped"})
+
+def response_texts(response):
+    """Text of every streamed chunk, skipping chunks that carry none (e.g. only safety ratings)."""
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            continue
+        if text:
+            yield text
+
+def stream_analysis(analysis_id, analysis, stop_event, socket_id):
+    """Feed model chunks through an incremental parser and emit every element once it is complete."""
+    def emit(kind, **fields):
+        socketio.emit('analysis_event', dict(fields, analysis_id=analysis_id, type=kind), to=socket_id)
+
+    cache = get_response_cache()
+    parser = IncrementalJSONParser()
+    changes = []  # Resolved as they stream in
+    deferred = []  # (index, change) whose edits did not apply; their full content is requested after the stream
+    started = time.perf_counter()
+    first_event_ms = None
+    response = None
+    chunks = None
+    try:
+        cached_text = cache.get(analysis["cache_key"]) if analysis["use_cache"] else None
+        if cached_text is not None:
+            chunks = iter([cached_text])
+        else:
+            response = analysis["model"].generate_content(analysis["prompt"], generation_config=analysis["generation_config"],
+                                                          stream=True)
+            chunks = response_texts(response)
+
+        for chunk in chunks:
+            if stop_event.is_set():
+                emit('error', message="Analysis stopped")
+                return
+            for path, value in parser.feed(chunk):
+                if first_event_ms is None:
+                    first_event_ms = round((time.perf_counter() - started) * 1000)
+                if path == ("summary",):
+                    emit('summary', value=value)
+                elif len(path) == 2 and path[0] == "commands":
+                    emit('command', index=path[1], value=value)
+                elif len(path) == 2 and path[0] == "changes" and isinstance(value, dict):
+                    # Edits are checked against the files before the UI may apply them; asking the
+                    # model for a full file would stall the stream, so that waits until it ends
+                    changes.append(value)
+                    if resolve_changes(analysis["project_path"], [value], analysis["user_prompt"], analysis["model"],
+                                       request_missing=False):
+                        deferred.append((path[1], value))
+                    else:
+                        emit('change', index=path[1], value=value)
+
+        for index, value in deferred:
+            if stop_event.is_set():
+                emit('error', message="Analysis stopped")
+                return
+            resolve_changes(analysis["project_path"], [value], analysis["user_prompt"], analysis["model"])
+            emit('change', index=index, value=value)
+
+        response_json = parser.values if parser.done else parse_analysis_response(parser.text)
+        if response_json is None:
+            emit('done', data=raw_analysis_result(parser.text))
+            return
+        if response is not None:
+            cache.put(analysis["cache_key"], parser.text, time.perf_counter() - started, usage_tokens(response))
+        if parser.done:
+            response_json = dict(response_json, changes=changes)
+        else:
+            resolve_changes(analysis["project_path"], response_json.get("changes") or [], analysis["user_prompt"], analysis["model"])
+        response_json["commands"] = response_json.get("commands") or []
+        response_json["context"] = analysis["context"]
+        response_json["cached"] = cached_text is not None
+        response_json["first_event_ms"] = first_event_ms
+        emit('done', data=response_json)
+    except Exception as e:
+        logger.error(f"Error streaming analysis {analysis_id}: {e}")
+        emit('error', message=f"Error analyzing project: {str(e)}")
+    finally:
+        if response is not None:
+            chunks.close()
+            cancel_response(response)  # Stops a stopped stream and frees its slot
+        with analysis_lock:
+            analysis_stop_events.pop(analysis_id, None)
+
 
 
 
@@ -1716,6 +2215,37 @@ def handle_connect():
 def handle_disconnect():
     logger.info("Client disconnected")
 
+@socketio.on('vision_subscribe')
+def handle_vision_subscribe():
+    """A page that reconnected (and so has a new socket id) keeps getting 'vision_response'."""
+    global vision_socket_id
+    if analyzer and analyzer.is_streaming():
+        vision_socket_id = request.sid
+
+@socketio.on('autocomplete_request')
+def handle_autocomplete_request(data):
+    """Stream a completion to the requesting editor.
+
+    Pieces of ghost text arrive as 'autocomplete_chunk' {request_id, text} as soon as
+    the model writes them; 'autocomplete_done' carries the full result and timings.
+    """
+    request_id = data.get('request_id')
+    sid = request.sid
+    channel = data.get('editor_id') or sid
+    api_key = current_api_key()
+
+    def on_text(text):
+        socketio.emit('autocomplete_chunk', {'request_id': request_id, 'text': text}, to=sid)
+
+    try:
+        result = get_completion_service().complete(data.get('prefix', ''), data.get('suffix', ''),
+                                                   data.get('language') or '', channel, on_text=on_text,
+                                                   api_key=api_key)
+    except Exception as e:
+        logger.error(f"Error streaming completion: {e}")
+        result = {"completion": None, "message": f"Error getting completion: {str(e)}"}
+    socketio.emit('autocomplete_done', dict(result, request_id=request_id), to=sid)
+
 
 def run_server():
     """Run the Flask server"""
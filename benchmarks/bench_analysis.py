@@ -0,0 +1,160 @@
+"""Frame-to-answer latency of the vision pipeline against a local fake model.
+
+The fake model answers in 150-400 ms with a 10% chance of a 1.5 s stall. The screen
+changes every 0.3-0.9 s. For every change we measure the time until an answer built
+from a frame captured after that change is published. Three setups are compared:
+the old blocking loop, and the asyncio engine with one and two requests in flight.
+
+    python benchmarks/bench_analysis.py
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_engine import percentile  # noqa: E402
+from screen_analyzer import ScreenAnalyzer  # noqa: E402
+
+DURATION = 15.0
+SAMPLE_INTERVAL = 0.1
+LEGACY_GEMINI_INTERVAL = 1.0  # Fixed sleep after every call in the old loop
+
+
+class FakeVisionModel:
+    """Stands in for GenerativeModel; reports which screen version it was shown."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def generate_content(self, parts, stream=False, **kwargs):
+        image = cv2.imdecode(np.frombuffer(parts[-1]["data"], np.uint8), cv2.IMREAD_GRAYSCALE)
+        version = level_to_version(image.mean())
+        with self.lock:
+            delay = 1.5 if self.rng.random() < 0.1 else self.rng.uniform(0.15, 0.4)
+        text = json.dumps({"summary": str(version), "vison_stop_agent": "False", "screen_voice": str(version)})
+
+        def chunks():
+            time.sleep(delay * 0.7)  # Time to first token
+            for i in range(0, len(text), 20):
+                time.sleep(delay * 0.3 / (len(text) / 20))
+                yield types.SimpleNamespace(text=text[i:i + 20])
+        return chunks()
+
+
+def version_to_level(version):
+    # Consecutive versions differ by 37 gray levels, well above the change detector's threshold
+    return (version * 37) % 250
+
+
+def level_to_version(level):
+    return min(range(250), key=lambda version: abs(version_to_level(version) - level))
+
+
+class Screen:
+    """Solid-colour frames whose gray level encodes a version number."""
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        self.version = 0
+        self.changes = []  # (version, time)
+
+    def change(self):
+        with self.analyzer.frame_lock:
+            self.version += 1
+            level = version_to_level(self.version)
+            self.analyzer.frame = np.full((270, 480, 3), level, dtype=np.uint8)
+            self.analyzer.frame_generation += 1
+        self.changes.append((self.version % 250, time.time()))
+
+
+def drive(screen, seed):
+    rng = random.Random(seed)
+    end = time.time() + DURATION
+    while time.time() < end:
+        screen.change()
+        time.sleep(rng.uniform(0.3, 0.9))
+
+
+def change_latencies(changes, answers):
+    """For each change, time until an answer for that version or a later one appeared."""
+    latencies = []
+    for index, (version, changed_at) in enumerate(changes):
+        later = {v for v, _ in changes[index:]}
+        for answered_version, answered_at in answers:
+            if answered_at >= changed_at and answered_version in later:
+                latencies.append(answered_at - changed_at)
+                break
+    return sorted(latencies)
+
+
+def make_analyzer(seed):
+    analyzer = ScreenAnalyzer("benchmark")
+    analyzer.model = FakeVisionModel(seed)
+    analyzer.frame_process_interval = SAMPLE_INTERVAL
+    analyzer.scheduler.base_interval = SAMPLE_INTERVAL
+    analyzer.scheduler.min_interval = SAMPLE_INTERVAL
+    analyzer.scheduler.requests_per_minute = None
+    analyzer.scheduler.reset()
+    analyzer._add_to_speech_queue = lambda text: None
+    return analyzer
+
+
+def run_legacy(seed):
+    """The pre-engine loop: blocking call, then sleep gemini_interval."""
+    analyzer = make_analyzer(seed)
+    screen = Screen(analyzer)
+    answers = []
+    driver = threading.Thread(target=drive, args=(screen, seed))
+    driver.start()
+    time.sleep(0.05)
+    while driver.is_alive():
+        _, data = analyzer.get_encoded_frame_bytes()
+        text = "".join(c.text for c in analyzer.model.generate_content(["p", {"data": data}], stream=True))
+        answers.append((int(json.loads(text)["summary"]), time.time()))
+        time.sleep(LEGACY_GEMINI_INTERVAL)
+    return change_latencies(screen.changes, answers)
+
+
+def run_engine(seed, in_flight):
+    analyzer = make_analyzer(seed)
+    analyzer.max_requests_in_flight = in_flight
+    answers = []
+    analyzer.on_response = lambda seq, response: answers.append((response["summary"], time.time()))
+    screen = Screen(analyzer)
+    screen.change()
+    analyzer.streaming = True
+    analyzer.engine.max_in_flight = in_flight
+    analyzer.engine.start()
+    sampler = threading.Thread(target=analyzer._analyze_frames, args=(["p"],))
+    sampler.start()
+    drive(screen, seed)
+    analyzer.stop_flag = True
+    analyzer.engine.stop()
+    sampler.join()
+    # Placeholder responses carry no version
+    answers = [(int(v), t) for v, t in answers if v.isdigit()]
+    return change_latencies(screen.changes, answers)
+
+
+def main():
+    results = [
+        ("legacy blocking loop", run_legacy(1)),
+        ("engine, 1 in flight", run_engine(1, 1)),
+        ("engine, 2 in flight", run_engine(1, 2)),
+    ]
+    print(f"{'pipeline':24} {'changes':>8} {'p50':>8} {'p95':>8}")
+    for name, latencies in results:
+        print(f"{name:24} {len(latencies):8d} {percentile(latencies, 50) * 1000:6.0f}ms "
+              f"{percentile(latencies, 95) * 1000:6.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Keystroke-to-suggestion latency: legacy /autocomplete vs CompletionService, on a fake model.
+
+The fake model serves one request at a time (like a rate-limited backend), pays a
+prefill cost per prompt character, a time-to-first-token and a cost per output
+token, and stops generating when the caller stops reading its stream. Each cycle
+of the simulated session:
+
+1. the user pauses (a request starts), resumes typing before it answers, then
+   pauses again; the second pause is measured
+2. the user types the first characters of the suggestion just shown; measured
+
+Latency counts from the last keystroke, so it includes the client's 1000 ms
+debounce, the same for both. Streamed over Socket.IO, ghost text shows from the
+first streamed text, reported separately.
+
+    python benchmarks/bench_autocomplete.py [cycles]
+"""
+import os
+import sys
+import time
+from threading import Lock, Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_engine import percentile  # noqa: E402
+from completion_service import CompletionService  # noqa: E402
+
+PREFILL_PER_CHAR = 0.000005
+FIRST_TOKEN = 0.1
+PER_TOKEN = 0.01
+CLIENT_CREATION = 0.02
+SUGGESTION = "total + tax_rate)\n    return round(result, 2)\n" * 4
+LEGACY_DEBOUNCE = 1.0
+NEW_DEBOUNCE = 1.0
+
+backend = Lock()  # The fake backend answers one request at a time
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    model_name = "fake"
+
+    def __init__(self):
+        time.sleep(CLIENT_CREATION)
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        chunks = self._generate(len(prompt))
+        return chunks if stream else Chunk(''.join(chunk.text for chunk in chunks))
+
+    def _generate(self, prompt_chars):
+        with backend:
+            time.sleep(FIRST_TOKEN + prompt_chars * PREFILL_PER_CHAR)
+            for i in range(0, len(SUGGESTION), 16):  # ~4 tokens per chunk
+                time.sleep(4 * PER_TOKEN)
+                yield Chunk(SUGGESTION[i:i + 16])
+
+
+def legacy_complete(prefix):
+    """What the old route did: a new client per request and the whole buffer in the prompt."""
+    model = FakeModel()
+    return model.generate_content(f"Existing Code:\n{prefix}\n").text.strip()
+
+
+def make_source(lines=3000):
+    return ''.join(f"def function_{i}(total, tax_rate):\n    return total * tax_rate + {i}\n\n" for i in range(lines // 3))
+
+
+def run(complete, debounce, cycles, source):
+    paused, typed_into = [], []
+    for cycle in range(cycles):
+        prefix = source + f"result_{cycle} = compute("
+        stale = Thread(target=complete, args=(prefix,))
+        stale.start()
+        time.sleep(0.1)  # The user types on while the first request is in flight
+        prefix += "sub"
+        last_key = time.perf_counter()
+        time.sleep(debounce)
+        suggestion = complete(prefix)
+        paused.append(time.perf_counter() - last_key)
+        stale.join()
+
+        # Typing the start of the suggestion
+        last_key = time.perf_counter()
+        complete(prefix + (suggestion or "")[:3], typing_into=True)
+        typed_into.append(time.perf_counter() - last_key)
+    return sorted(paused), sorted(typed_into)
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    source = make_source()
+    model = FakeModel()
+    service = CompletionService(lambda api_key: model)
+
+    def new_complete(prefix, typing_into=False):
+        # Typing into a suggestion needs no debounce: the client checks it locally, as the service does
+        return service.complete(prefix, "", "python", "bench").get("completion")
+
+    def old_complete(prefix, typing_into=False):
+        if typing_into:
+            time.sleep(LEGACY_DEBOUNCE)
+        return legacy_complete(prefix)
+
+    print(f"source {len(source) // 1024} KB, {cycles} cycles\n")
+    print(f"{'':34} {'p50':>8} {'p95':>8}")
+    for name, complete, debounce in (("legacy", old_complete, LEGACY_DEBOUNCE), ("service", new_complete, NEW_DEBOUNCE)):
+        paused, typed_into = run(complete, debounce, cycles, source)
+        print(f"{name + ': pause after typing on':34} {percentile(paused, 50) * 1000:6.0f}ms {percentile(paused, 95) * 1000:6.0f}ms")
+        print(f"{name + ': typing into suggestion':34} {percentile(typed_into, 50) * 1000:6.0f}ms "
+              f"{percentile(typed_into, 95) * 1000:6.0f}ms")
+    stats = service.get_stats()
+    print(f"{'service: first streamed text':34} {stats['first_text_p50_ms']:6.0f}ms {stats['first_text_p95_ms']:6.0f}ms"
+          "  (from the request, model calls only)")
+    print(f"\nservice stats: {stats}")
+
+
+if __name__ == "__main__":
+    main()
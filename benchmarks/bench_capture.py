@@ -0,0 +1,82 @@
+"""Compare the legacy full-frame capture pipeline with TiledFrameCapture.
+
+Uses a synthetic BGRA frame source that mimics a terminal scrolling a few
+lines at the bottom of a 2560x1440 screen, so it runs without a display.
+
+    python benchmarks/bench_capture.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_capture import TiledFrameCapture  # noqa: E402
+
+
+class SyntheticScreen:
+    """Produces BGRA frames where only a small band changes between grabs."""
+
+    def __init__(self, width=2560, height=1440, changing_rows=60):
+        rng = np.random.default_rng(0)
+        self.frame = rng.integers(0, 255, (height, width, 4), dtype=np.uint8)
+        self.changing_rows = changing_rows
+        self.tick = 0
+
+    def grab(self):
+        self.tick += 1
+        band = self.frame[-self.changing_rows:, :1200]
+        band[...] = np.roll(band, 12, axis=0)
+        return self.frame
+
+
+def legacy_pipeline(raw):
+    frame = np.array(raw)
+    height, width = frame.shape[:2]
+    if width > 1920 or height > 1080:
+        scale = min(1920 / width, 1080 / height)
+        frame = cv2.resize(frame, (int(width * scale), int(height * scale)))
+    return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+
+
+def measure(process, source, frames):
+    cpu = 0.0
+    allocated = 0
+    tracemalloc.start()
+    for _ in range(frames):
+        raw = source.grab()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        started = time.process_time()
+        process(raw)
+        cpu += time.process_time() - started
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - base
+    tracemalloc.stop()
+    return cpu / frames, allocated / frames
+
+
+def main(frames=120):
+    legacy_cpu, legacy_alloc = measure(legacy_pipeline, SyntheticScreen(), frames)
+
+    capture = TiledFrameCapture()
+    capture.update(SyntheticScreen().grab())  # Buffers are allocated once, outside the measurement
+    tiled_cpu, tiled_alloc = measure(capture.update, SyntheticScreen(), frames)
+
+    # The legacy loop captured at ~30 FPS; the tiled loop runs at the analyzer's 1 FPS unless /stream is open
+    rows = [
+        ("legacy (30 FPS)", legacy_cpu, legacy_alloc, 30),
+        ("tiled (1 FPS, analyzer only)", tiled_cpu, tiled_alloc, 1),
+        ("tiled (30 FPS, /stream open)", tiled_cpu, tiled_alloc, 30),
+    ]
+    print(f"{'pipeline':32} {'cpu/frame':>10} {'alloc/frame':>12} {'cpu/s':>8} {'alloc/s':>10}")
+    for name, cpu, alloc, fps in rows:
+        print(f"{name:32} {cpu * 1000:8.2f}ms {alloc / 1e6:10.2f}MB "
+              f"{cpu * fps * 100:7.1f}% {alloc * fps / 1e6:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
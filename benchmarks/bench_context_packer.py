@@ -0,0 +1,101 @@
+"""Analyze prompt size: legacy json.dumps packing vs the token-budgeted context packer.
+
+Generates a small project (ordinary modules, one 5,000-line module, a vendored
+dependency and a minified bundle) in a temporary folder and packs all of it for
+a prompt about one function, once the legacy way and once per budget.
+
+    python benchmarks/bench_context_packer.py
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_engine import percentile  # noqa: E402
+from context_packer import estimate_tokens, pack_context  # noqa: E402
+
+PROMPT = "The apply_discount function in billing.py rounds the invoice total wrong, fix it"
+WORDS = ["user", "session", "invoice", "total", "price", "order", "config", "cache", "client", "record"]
+
+
+def module(rng, name, functions):
+    lines = [f'"""{name} module."""', "import os", "import json", ""]
+    for i in range(functions):
+        a, b = rng.choice(WORDS), rng.choice(WORDS)
+        lines += [
+            f"def {a}_{b}_{i}(items, limit=10):",
+            f'    """Return the {a} values of each {b}."""',
+            "    result = []",
+            "    for item in items:",
+            f'        if item.get("{a}") and len(result) < limit:',
+            f'            result.append(item["{a}"] * 2)',
+            "    return result",
+            "",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def generate_project(root):
+    rng = random.Random(0)
+    files = {}
+    for i in range(12):
+        files[f"app/module_{i}.py"] = module(rng, f"module_{i}", 40)
+    files["app/big_module.py"] = module(rng, "big_module", 620)
+    files["app/billing.py"] = module(rng, "billing", 30) + (
+        "def apply_discount(invoice, percent):\n"
+        "    total = invoice['total'] * (1 - percent / 100)\n"
+        "    return int(total)\n")
+    files["node_modules/lodash/lodash.js"] = module(rng, "lodash", 200)
+    files["static/app.min.js"] = ";".join(f"var a{i}=function(b){{return b*{i}}}" for i in range(4000))
+    for path, text in files.items():
+        full_path = os.path.join(root, *path.split("/"))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return sorted(files)
+
+
+def legacy_pack(root, paths):
+    file_contents = {}
+    for path in paths:
+        with open(os.path.join(root, path), "r", encoding="utf-8") as f:
+            file_contents[path] = str(f.read())
+    return json.dumps(file_contents, indent=2)
+
+
+def timed(function, repeat=10):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    return sorted(samples), result
+
+
+def main():
+    root = tempfile.mkdtemp(prefix="codify-bench-")
+    try:
+        paths = generate_project(root)
+        print(f"{'packing':28} {'p50':>8} {'tokens':>8} {'KB':>8}  files (included/truncated/dropped)")
+
+        samples, text = timed(lambda: legacy_pack(root, paths))
+        print(f"{'legacy json.dumps':28} {percentile(samples, 50) * 1000:6.1f}ms {estimate_tokens(text):8d} "
+              f"{len(text.encode('utf-8')) / 1024:8.1f}  {len(paths)}/0/0")
+
+        for budget in (100000, 30000, 8000):
+            samples, (text, report) = timed(lambda: pack_context(root, paths, PROMPT, budget=budget))
+            statuses = [f["status"] for f in report["files"]]
+            first = next(f["path"] for f in report["files"] if f["status"] != "dropped")
+            print(f"{f'packer, budget {budget}':28} {percentile(samples, 50) * 1000:6.1f}ms {estimate_tokens(text):8d} "
+                  f"{len(text.encode('utf-8')) / 1024:8.1f}  {statuses.count('included')}/"
+                  f"{statuses.count('truncated')}/{statuses.count('dropped')}  first: {first}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Filename search latency: legacy per-directory glob vs FileSearch over the cached index.
+
+Generates a project tree in a temporary folder (200k empty files by default, shaped
+like a monorepo of packages with nested source folders) and times glob and fuzzy
+queries. Pass a file count to use a smaller tree.
+
+    python benchmarks/bench_file_search.py [files]
+"""
+import glob
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_engine import percentile  # noqa: E402
+from file_index import FileIndex  # noqa: E402
+from file_search import FileSearch  # noqa: E402
+
+WORDS = ["user", "auth", "session", "router", "payment", "invoice", "render", "config",
+         "client", "server", "utils", "model", "view", "store", "cache", "parser"]
+EXTENSIONS = [".py", ".js", ".ts", ".tsx", ".json", ".md", ".css"]
+
+GLOB_QUERIES = ["*.py", "*.json", "**/components/*.tsx", "/packages/pkg3/**/*.md", "*router*"]
+FUZZY_QUERIES = ["usrv", "authsess", "pkg12cfg", "paymentinvoice", "rdr", "m"]
+
+
+def generate_tree(root, file_count, seed=0):
+    rng = random.Random(seed)
+    created = 0
+    package = 0
+    while created < file_count:
+        for folder in ("src", "src/components", "src/lib", "tests", "docs"):
+            path = os.path.join(root, "packages", f"pkg{package}", *folder.split("/"),
+                                f"{rng.choice(WORDS)}_{package % 50}")
+            os.makedirs(path, exist_ok=True)
+            for _ in range(40):
+                name = f"{rng.choice(WORDS)}{rng.choice(WORDS).title()}{created}{rng.choice(EXTENSIONS)}"
+                open(os.path.join(path, name), "w").close()
+                created += 1
+        package += 1
+
+
+def legacy_find(root, pattern):
+    matching = []
+    for directory, _, _ in os.walk(root):
+        for path in glob.glob(os.path.join(directory, pattern)):
+            if os.path.isfile(path):
+                matching.append(os.path.relpath(path, root))
+    return matching
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return sorted(samples)
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    root = tempfile.mkdtemp(prefix="codify-bench-")
+    try:
+        print(f"generating {file_count} files ...")
+        generate_tree(root, file_count)
+
+        index = FileIndex(root)
+        index.build()
+        search = FileSearch(index)
+        search.glob("*.py", limit=1)  # Build the path snapshot once
+        print(f"index build {index.build_ms:.0f} ms, {index.file_count} files, {len(index.dirs)} folders\n")
+
+        legacy = timed(lambda: legacy_find(root, "*.py"), 1)
+        print(f"{'legacy find *.py (os.walk + glob)':42} {legacy[0] * 1000:8.1f} ms")
+
+        print(f"\n{'query':42} {'p50':>8} {'p95':>8} {'results':>8}")
+        for pattern in GLOB_QUERIES:
+            for limit in (None, 100):
+                samples = timed(lambda: search.glob(pattern, limit=limit), 20)
+                count = len(search.glob(pattern, limit=limit)[0])
+                name = f"glob {pattern}" + (f" (limit {limit})" if limit else "")
+                print(f"{name:42} {percentile(samples, 50) * 1000:6.1f}ms {percentile(samples, 95) * 1000:6.1f}ms {count:8d}")
+        for query in FUZZY_QUERIES:
+            samples = timed(lambda: search.fuzzy(query, limit=20), 20)
+            top = search.fuzzy(query, limit=20)
+            name = f"fuzzy {query!r} top 20"
+            print(f"{name:42} {percentile(samples, 50) * 1000:6.1f}ms {percentile(samples, 95) * 1000:6.1f}ms "
+                  f"{len(top):8d}  {top[0][0] if top else ''}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Gemini calls under a quota: direct SDK calls vs the gateway, against a local fake server.
+
+The fake server speaks the Gemini REST API (generateContent and streamGenerateContent),
+answers after SERVER_LATENCY, allows QUOTA_PER_SECOND requests per model per second
+(429 beyond that) and fails ERROR_RATE of requests with 503. The real SDK talks to it
+through GEMINI_API_ENDPOINT.
+
+The workload mixes interactive calls (autocomplete streams, analyze calls of which
+some repeat the same prompt at the same time) with background vision streams that
+keep the quota busy. Vision runs on the autocomplete model here, so the two compete
+for one quota and priority decides who waits.
+
+    python benchmarks/bench_gateway.py [seconds]
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_engine import percentile  # noqa: E402
+import gemini_gateway  # noqa: E402
+import model_pool  # noqa: E402
+
+SERVER_LATENCY = 0.05
+QUOTA_PER_SECOND = 10
+ERROR_RATE = 0.05
+INTERACTIVE_CLIENTS = 4
+DUPLICATE_CLIENTS = 3   # Send the same analyze prompt at the same moment
+BACKGROUND_CLIENTS = 4
+
+
+class FakeGemini(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        model = self.path.split("models/")[1].split(":")[0]
+        status, body = self.server.answer(model, "streamGenerateContent" in self.path)
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeGemini)
+        self.lock = threading.Lock()
+        self.recent = defaultdict(deque)  # model -> request times in the last second
+        self.requests = 0
+        self.rejected = 0
+        self.failed = 0
+        self.rng = random.Random(0)
+
+    def answer(self, model, stream):
+        time.sleep(SERVER_LATENCY)
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            recent = self.recent[model]
+            while recent and now - recent[0] > 1.0:
+                recent.popleft()
+            if len(recent) >= QUOTA_PER_SECOND:
+                self.rejected += 1
+                return 429, {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                       "status": "RESOURCE_EXHAUSTED"}}
+            recent.append(now)
+            if self.rng.random() < ERROR_RATE:
+                self.failed += 1
+                return 503, {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}}
+        chunk = {"candidates": [{"content": {"parts": [{"text": "ok"}], "role": "model"}, "finishReason": "STOP"}],
+                 "usageMetadata": {"totalTokenCount": 10}}
+        return 200, [chunk] if stream else chunk
+
+    def reset(self):
+        with self.lock:
+            self.recent.clear()
+            self.requests = self.rejected = self.failed = 0
+
+
+def run(pool, seconds):
+    latencies = defaultdict(list)
+    failures = defaultdict(int)
+    stop = time.monotonic() + seconds
+    barrier = threading.Barrier(DUPLICATE_CLIENTS)
+
+    def timed(kind, call):
+        started = time.perf_counter()
+        try:
+            response = call()
+            if kind != "analyze":
+                list(response)  # Read the stream to the end
+            latencies[kind].append(time.perf_counter() - started)
+        except Exception:
+            failures[kind] += 1
+
+    def interactive(n):
+        i = 0
+        while time.monotonic() < stop:
+            model = pool.get("autocomplete")
+            timed("autocomplete", lambda: model.generate_content(f"complete {n}-{i}", stream=True))
+            i += 1
+            time.sleep(0.3)
+
+    def duplicate():
+        i = 0
+        while time.monotonic() < stop:
+            try:
+                barrier.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                return
+            model = pool.get("analyze")
+            timed("analyze", lambda: model.generate_content(f"analyze the project, round {i}"))
+            i += 1
+            time.sleep(0.5)
+
+    def background(n):
+        i = 0
+        while time.monotonic() < stop:
+            model = pool.get("vision")
+            timed("vision", lambda: model.generate_content(f"frame {n}-{i}", stream=True))
+            i += 1
+
+    threads = [threading.Thread(target=interactive, args=(n,)) for n in range(INTERACTIVE_CLIENTS)]
+    threads += [threading.Thread(target=duplicate) for _ in range(DUPLICATE_CLIENTS)]
+    threads += [threading.Thread(target=background, args=(n,)) for n in range(BACKGROUND_CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    server = FakeServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GEMINI_API_ENDPOINT"] = f"http://127.0.0.1:{server.server_address[1]}"
+
+    rpm = QUOTA_PER_SECOND * 60
+    purposes = dict(model_pool.PURPOSES)
+    purposes["vision"] = dict(purposes["vision"], model_name=purposes["autocomplete"]["model_name"])
+    setups = (
+        ("direct", lambda: model_pool.ModelPool(purposes)),
+        ("gateway", lambda: model_pool.ModelPool(purposes, gateway=gemini_gateway.GeminiGateway(default_rpm=rpm))),
+    )
+    print(f"{seconds:.0f}s per run, quota {QUOTA_PER_SECOND}/s per model, {ERROR_RATE:.0%} server errors\n")
+    print(f"{'':24} {'ok':>5} {'failed':>7} {'p50':>8} {'p95':>8}")
+    for name, make_pool in setups:
+        server.reset()
+        pool = make_pool()
+        pool.set_default_key("fake-key")
+        with contextlib.redirect_stdout(io.StringIO()):  # The gateway logs every retry
+            latencies, failures = run(pool, seconds)
+        for kind in ("autocomplete", "analyze", "vision"):
+            samples = sorted(latencies[kind])
+            p50 = f"{percentile(samples, 50) * 1000:6.0f}ms" if samples else f"{'-':>8}"
+            p95 = f"{percentile(samples, 95) * 1000:6.0f}ms" if samples else f"{'-':>8}"
+            print(f"{name + ': ' + kind:24} {len(samples):5d} {failures[kind]:7d} {p50} {p95}")
+        print(f"{name + ': server':24} {server.requests} requests, {server.rejected} rejected (429), "
+              f"{server.failed} failed (503)")
+        if pool.gateway is not None:
+            print(f"{name + ': gateway':24} {pool.gateway.get_stats()}")
+        print()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Live talk: the old blocking /api/talk_live flow vs LiveTalk, on a fake model and silent speech.
+
+The fake model serves one request at a time, waits FIRST_TOKEN before its first
+chunk and then CHUNK_DELAY per chunk of a four-sentence reply. Speech starts after
+SPEECH_STARTUP and takes SECONDS_PER_CHAR per character.
+
+The old flow called the model twice per message (once in a thread whose answer was
+discarded, once for the reply), then spoke the whole reply and only then answered
+the HTTP request. LiveTalk makes one streamed call and speaks each sentence as
+soon as it is complete.
+
+    python benchmarks/bench_live_talk.py [turns]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_engine import percentile  # noqa: E402
+from live_talk import LiveTalk  # noqa: E402
+from speech_service import NullAudioBackend, SpeechService, PRIORITY_HIGH  # noqa: E402
+
+FIRST_TOKEN = 0.4
+CHUNK_DELAY = 0.05
+SPEECH_STARTUP = 0.05
+SECONDS_PER_CHAR = 0.004
+REPLY = ("Sure, I can help with that. The error comes from the missing import in app.py. "
+         "Add the import at the top of the file and run it again. Let me know if it still fails.")
+
+backend = threading.Lock()  # The fake backend answers one request at a time
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def generate_content(self, contents, generation_config=None, stream=False):
+        chunks = self._generate()
+        return chunks if stream else Chunk(''.join(chunk.text for chunk in chunks))
+
+    def _generate(self):
+        with backend:
+            time.sleep(FIRST_TOKEN)
+            for i in range(0, len(REPLY), 12):  # ~3 tokens per chunk
+                time.sleep(CHUNK_DELAY)
+                yield Chunk(REPLY[i:i + 12])
+
+
+def legacy_turn(model, speech, message):
+    """What chat_endpoint did: a discarded threaded call, a second call, then blocking speech."""
+    thread = threading.Thread(target=lambda: model.generate_content(message))
+    thread.start()
+    reply = model.generate_content(message).text
+    spoken = speech.speak(reply, priority=PRIORITY_HIGH, preempt=True)
+    spoken.wait()
+    thread.join()
+    return spoken
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    model = FakeModel()
+    speech = SpeechService(NullAudioBackend(startup_delay=SPEECH_STARTUP, seconds_per_char=SECONDS_PER_CHAR))
+
+    legacy_http, legacy_audio = [], []
+    for _ in range(turns):
+        started = time.time()
+        spoken = legacy_turn(model, speech, "why does my script fail?")
+        legacy_http.append(time.time() - started)
+        legacy_audio.append(spoken.first_audio_at - started)
+
+    talk = LiveTalk(lambda: model, speech=speech)
+    done = threading.Event()
+    talk.on_event = lambda event: event["type"] in ("done", "error") and done.set()
+    new_http = []
+    for _ in range(turns):
+        done.clear()
+        started = time.perf_counter()
+        talk.start_turn("why does my script fail?")
+        new_http.append(time.perf_counter() - started)
+        done.wait()
+        while speech.is_speaking() or speech.get_stats()["queued"]:
+            time.sleep(0.01)
+    stats = talk.get_stats()
+
+    print(f"{turns} turns, reply of {len(REPLY)} chars\n")
+    print(f"{'':32} {'p50':>8} {'p95':>8}")
+    for name, samples in (("legacy: HTTP response", legacy_http), ("legacy: first spoken word", legacy_audio),
+                          ("live talk: HTTP response", new_http)):
+        samples = sorted(samples)
+        print(f"{name:32} {percentile(samples, 50) * 1000:6.0f}ms {percentile(samples, 95) * 1000:6.0f}ms")
+    print(f"{'live talk: first spoken word':32} {stats['first_audio_p50_ms']:6.0f}ms {stats['first_audio_p95_ms']:6.0f}ms")
+    print(f"{'live talk: first segment queued':32} {stats['first_segment_p50_ms']:6.0f}ms "
+          f"{stats['first_segment_p95_ms']:6.0f}ms")
+    speech.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import re
+import time
+from collections import deque
+from threading import Lock
+
+from analysis_engine import percentile
+from model_pool import cancel_response, get_model_pool
+from response_cache import cache_key, get_response_cache
+
+WINDOW_BEFORE_LINES = 60   # Lines before the cursor sent to the model
+WINDOW_AFTER_LINES = 15    # Lines after the cursor sent to the model
+WINDOW_MAX_CHARS = 6000    # Cap on each side, for files with very long lines
+MAX_OUTPUT_TOKENS = 512
+MAX_COMPLETION_LINES = 40  # Even without a block boundary, stop after this many lines
+PROMPT_VERSION = 2         # Bump when the prompt changes so cached completions are not reused
+LATENCY_SAMPLES = 500
+
+FENCE = re.compile(r'^```[\w+-]*\n(.*?)\n?```\s*$', re.DOTALL)
+
+
+def completion_window(prefix, suffix):
+    """The end of ``prefix`` and the start of ``suffix`` that are sent to the model."""
+    before = '\n'.join(prefix.rsplit('\n', WINDOW_BEFORE_LINES)[-WINDOW_BEFORE_LINES:])
+    after = '\n'.join(suffix.split('\n', WINDOW_AFTER_LINES)[:WINDOW_AFTER_LINES])
+    return before[-WINDOW_MAX_CHARS:], after[:WINDOW_MAX_CHARS]
+
+
+def build_prompt(before, after, language):
+    return (
+        "You are a code completion engine. Continue the code at <CURSOR>.\n"
+        f"Language: {language or 'detect it from the code'}\n\n"
+        "Rules:\n"
+        "1. Return only the text to insert at <CURSOR>: no explanations, no code fences, no repeated code.\n"
+        "2. Finish the current statement or block; it must fit with the code after <CURSOR>.\n"
+        "3. If the current line is already complete, start with a newline.\n"
+        "4. Keep the indentation and style of the surrounding code.\n\n"
+        f"{before}<CURSOR>{after}"
+    )
+
+
+def clean_completion(text):
+    """Strip the code fence models sometimes add despite being told not to."""
+    match = FENCE.match(text.strip())
+    return match.group(1) if match else text.rstrip()
+
+
+def indent_width(text):
+    return len(text.expandtabs(4)) - len(text.expandtabs(4).lstrip(' '))
+
+
+class BlockLimiter:
+    """Cuts a streamed completion where the block it is writing ends.
+
+    Text is passed through as it arrives, except the start of each line, which is
+    held until its indentation is known. Indentation languages (Python) end at the
+    first line that dedents below the cursor's line, or back to it after going
+    deeper. Brace languages end after the ``}`` that closes the enclosing block, or
+    at the end of the line where a block the completion opened is closed again.
+    Code fences are dropped, and nothing goes past MAX_COMPLETION_LINES.
+    """
+
+    def __init__(self, prefix, language="", max_lines=MAX_COMPLETION_LINES):
+        language = language if isinstance(language, str) else ""
+        self.indent_based = language.lower() in ("python", "py", "yaml")
+        current_line = prefix[prefix.rfind('\n') + 1:]
+        self.base_indent = indent_width(current_line)
+        self.check_indent = not current_line.strip()  # Mid-line, the first line continues the cursor's line
+        self.max_lines = max_lines
+        self.pending = ""      # Start of the current line, held until its indentation is known
+        self.holding = True
+        self.depth = 0         # Open brackets since the cursor
+        self.braces = 0        # Open braces since the cursor
+        self.opened = False    # A line deeper than the cursor's, or a brace, was written
+        self.close_at_newline = False
+        self.lines = 0
+        self.emitted = False
+        self.done = False
+
+    def feed(self, text):
+        """The part of ``text`` that belongs to the completion; sets ``done`` once it is complete."""
+        out = []
+        for c in text:
+            if self.done:
+                break
+            if not self.holding:
+                self._emit(c, out)
+                continue
+            self.pending += c
+            stripped = self.pending.lstrip(' \t')
+            if c == '\n':
+                pending, self.pending = self.pending, ""
+                if stripped.startswith('```'):
+                    if self.emitted:
+                        self.done = True  # Closing fence
+                    continue  # Opening fence
+                out.append(pending)  # Blank line
+                self._newline()
+                continue
+            if stripped in ('', '`', '``') or stripped.startswith('```'):
+                continue
+            if self._ends_block(indent_width(self.pending[:len(self.pending) - len(stripped)])):
+                self.done = True
+                break
+            pending, self.pending = self.pending, ""
+            self.holding = False
+            for held in pending:
+                self._emit(held, out)
+        text = ''.join(out)
+        if text.strip():
+            self.emitted = True
+        return text
+
+    def _ends_block(self, indent):
+        if not self.indent_based or not self.check_indent or self.depth > 0:
+            return False
+        if indent < self.base_indent or (self.opened and indent <= self.base_indent):
+            return True
+        if indent > self.base_indent:
+            self.opened = True
+        return False
+
+    def _emit(self, c, out):
+        if self.done:
+            return
+        out.append(c)
+        if c in '([{':
+            self.depth += 1
+        elif c in ')]}':
+            self.depth -= 1
+        if self.indent_based:
+            if c == '\n':
+                self._newline()
+            return
+        if c == '{':
+            self.braces += 1
+            self.opened = True
+        elif c == '}':
+            self.braces -= 1
+            if self.braces < 0:
+                self.done = True  # The enclosing block is closed
+            elif self.braces == 0 and self.opened:
+                self.close_at_newline = True
+        elif c == '\n':
+            if self.close_at_newline:
+                self.done = True
+            self._newline()
+
+    def _newline(self):
+        self.lines += 1
+        self.holding = True
+        self.check_indent = True
+        if self.lines >= self.max_lines:
+            self.done = True
+
+
+class CompletionService:
+    """Editor completions from the shared model client of each API key.
+
+    Only a window of code around the cursor is sent. Each editor (``channel``) has at
+    most one live request: a newer request makes the older one stop reading its
+    stream and return as cancelled. While the user types the same characters a
+    suggestion starts with, the rest of that suggestion is returned without a call.
+    ``model_factory(api_key)`` returns the client for a key (None: the default key).
+    """
+
+    def __init__(self, model_factory, cache=None, max_output_tokens=MAX_OUTPUT_TOKENS):
+        self.model_factory = model_factory
+        self.cache = cache
+        self.max_output_tokens = max_output_tokens
+        self.lock = Lock()
+        self.latest = {}       # channel -> sequence number of its newest request
+        self.suggestions = {}  # channel -> (prefix it was made for, completion)
+        self.requests = 0
+        self.model_calls = 0
+        self.reused = 0
+        self.cache_hits = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.first_text_latencies = deque(maxlen=LATENCY_SAMPLES)  # Request to first streamed text, model calls only
+        self.cut_at_block = 0
+
+    def reset_model(self):
+        """Forget the suggestions made so far, e.g. after the API key changed."""
+        with self.lock:
+            self.suggestions.clear()
+
+    def complete(self, prefix, suffix="", language="", channel="default", on_text=None, api_key=None):
+        """Completion for the cursor between ``prefix`` and ``suffix``.
+
+        Returns {"completion", "source", "latency_ms", "first_text_ms"} where source is
+        "reuse", "cache" or "model", or {"completion": None, "cancelled": True} when a
+        newer request from the same channel replaced this one. ``on_text`` is called
+        with each new piece of the completion as soon as it is known. ``api_key`` is
+        the caller's Gemini key; None uses the default one.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            self.requests += 1
+            seq = self.latest.get(channel, 0) + 1
+            self.latest[channel] = seq
+            previous = self.suggestions.get(channel)
+
+        # Typing into the last suggestion: the rest of it is still the best guess
+        if previous and prefix.startswith(previous[0]):
+            typed = prefix[len(previous[0]):]
+            if typed and previous[1].startswith(typed) and len(typed) < len(previous[1]):
+                with self.lock:
+                    self.reused += 1
+                rest = previous[1][len(typed):]
+                if on_text:
+                    on_text(rest)
+                return self._finish(channel, prefix, rest, "reuse", started, remember=False)
+
+        before, after = completion_window(prefix, suffix)
+        model = self.model_factory(api_key)
+        key = None
+        if self.cache is not None:
+            key = cache_key(purpose="completion", version=PROMPT_VERSION, model=getattr(model, 'model_name', ''),
+                            max_output_tokens=self.max_output_tokens, before=before, after=after, language=language)
+            cached = self.cache.get(key)
+            if cached is not None:
+                with self.lock:
+                    self.cache_hits += 1
+                if on_text:
+                    on_text(cached)
+                return self._finish(channel, prefix, cached, "cache", started)
+
+        try:
+            text, first_text_ms = self._generate(model, build_prompt(before, after, language), channel, seq,
+                                                 BlockLimiter(prefix, language), on_text, started)
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            raise
+        if text is None:
+            with self.lock:
+                self.cancelled += 1
+            return {"completion": None, "cancelled": True}
+        completion = clean_completion(text)
+        if key is not None and completion:
+            self.cache.put(key, completion, time.perf_counter() - started)
+        result = self._finish(channel, prefix, completion, "model", started)
+        result["first_text_ms"] = first_text_ms
+        return result
+
+    def is_current(self, channel, seq):
+        return self.latest.get(channel) == seq
+
+    def get_stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            first_text = sorted(self.first_text_latencies)
+            return {
+                "requests": self.requests,
+                "model_calls": self.model_calls,
+                "reused": self.reused,
+                "cache_hits": self.cache_hits,
+                "cancelled": self.cancelled,
+                "errors": self.errors,
+                "cut_at_block": self.cut_at_block,
+                "latency_p50_ms": percentile(latencies, 50),
+                "latency_p95_ms": percentile(latencies, 95),
+                "first_text_p50_ms": percentile(first_text, 50),
+                "first_text_p95_ms": percentile(first_text, 95),
+            }
+
+    def _generate(self, model, prompt, channel, seq, limiter, on_text, started):
+        """Stream the model's answer up to the end of its block; returns (text, first_text_ms).
+
+        Returns (None, None) as soon as a newer request makes this one stale.
+        """
+        if not self.is_current(channel, seq):
+            return None, None
+        with self.lock:
+            self.model_calls += 1
+        response = model.generate_content(prompt, generation_config={"max_output_tokens": self.max_output_tokens},
+                                          stream=True)
+        parts = []
+        first_text_ms = None
+        try:
+            for chunk in response:
+                if not self.is_current(channel, seq):
+                    return None, None
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # A chunk without text (finish reason or safety ratings only)
+                text = limiter.feed(text or "")
+                if text:
+                    if first_text_ms is None:
+                        first_text_ms = round((time.perf_counter() - started) * 1000, 1)
+                        with self.lock:
+                            self.first_text_latencies.append(first_text_ms)
+                    parts.append(text)
+                    if on_text:
+                        on_text(text)
+                if limiter.done:
+                    # The block is complete; no need to pay for the rest
+                    with self.lock:
+                        self.cut_at_block += 1
+                    break
+        finally:
+            cancel_response(response)  # Stops a stream we left early and frees its slot
+        return ''.join(parts), first_text_ms
+
+    def _finish(self, channel, prefix, completion, source, started, remember=True):
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        with self.lock:
+            if remember and completion:
+                self.suggestions[channel] = (prefix, completion)
+            self.latencies.append(latency_ms)
+        return {"completion": completion, "source": source, "latency_ms": latency_ms}
+
+
+_service = None
+_service_lock = Lock()
+
+
+def get_completion_service():
+    """Shared CompletionService on the pool's autocomplete clients, using the response cache."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CompletionService(lambda api_key: get_model_pool().get("autocomplete", api_key),
+                                         cache=get_response_cache())
+        return _service
@@ -0,0 +1,424 @@
+import os
+import re
+import sys
+import time
+from threading import Thread, Lock, RLock, Event
+
+MAX_FILE_SIZE = 1024 * 1024  # Larger files (bundles, logs, data dumps) are not indexed
+MAX_LINE_LENGTH = 300        # Result lines are cut to this length
+
+# Definitions recognised per file extension: (regex, kind); the name is group "name"
+PYTHON_SYMBOLS = [
+    (re.compile(r'^(?P<indent>[ \t]*)class[ \t]+(?P<name>\w+)', re.MULTILINE), "class"),
+    (re.compile(r'^(?P<indent>[ \t]*)(?:async[ \t]+)?def[ \t]+(?P<name>\w+)', re.MULTILINE), "function"),
+]
+JS_SYMBOLS = [
+    (re.compile(r'^(?P<indent>[ \t]*)(?:export[ \t]+)?(?:default[ \t]+)?class[ \t]+(?P<name>[\w$]+)', re.MULTILINE), "class"),
+    (re.compile(r'^(?P<indent>[ \t]*)(?:export[ \t]+)?(?:default[ \t]+)?(?:async[ \t]+)?function\*?[ \t]*(?P<name>[\w$]+)',
+                re.MULTILINE), "function"),
+    (re.compile(r'^(?P<indent>[ \t]*)(?:export[ \t]+)?(?:const|let|var)[ \t]+(?P<name>[\w$]+)[ \t]*=[ \t]*'
+                r'(?:async[ \t]*)?(?:function\b|\([^)\n]*\)[ \t]*=>|[\w$]+[ \t]*=>)', re.MULTILINE), "function"),
+    (re.compile(r'^(?P<indent>[ \t]+)(?:static[ \t]+)?(?:async[ \t]+)?(?P<name>[\w$]+)[ \t]*\([^)\n]*\)[ \t]*\{',
+                re.MULTILINE), "method"),
+]
+SYMBOL_PATTERNS = {
+    ".py": PYTHON_SYMBOLS,
+    ".js": JS_SYMBOLS, ".jsx": JS_SYMBOLS, ".mjs": JS_SYMBOLS, ".cjs": JS_SYMBOLS,
+    ".ts": JS_SYMBOLS, ".tsx": JS_SYMBOLS,
+}
+JS_KEYWORDS = frozenset(("if", "for", "while", "switch", "catch", "function", "return", "with"))
+
+
+def extract_symbols(path, text):
+    """Definitions in a source file as a list of (name, kind, line)."""
+    patterns = SYMBOL_PATTERNS.get(os.path.splitext(path)[1].lower())
+    if not patterns:
+        return []
+    found = []
+    for regex, kind in patterns:
+        for match in regex.finditer(text):
+            name = match.group("name")
+            if kind == "method" and name in JS_KEYWORDS:
+                continue
+            # Indented Python functions are methods (or nested helpers)
+            symbol_kind = "method" if kind == "function" and patterns is PYTHON_SYMBOLS and match.group("indent") else kind
+            found.append((match.start(), name, symbol_kind))
+    found.sort()
+
+    # Count newlines incrementally so big files stay linear
+    symbols, line, position = [], 1, 0
+    for start, name, kind in found:
+        line += text.count('\n', position, start)
+        position = start
+        symbols.append((name, kind, line))
+    return symbols
+
+
+def trigrams(text):
+    """Set of lowercase three-character substrings of ``text``."""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def required_literals(pattern):
+    """Literal strings that every match of the regex ``pattern`` must contain.
+
+    Conservative: alternation anywhere gives up (returns []), groups are skipped,
+    and characters made optional by ``?``, ``*`` or ``{`` are dropped from the run
+    they end.
+    """
+    if '|' in pattern:
+        return []
+    runs, current = [], []
+    depth = 0
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '\\' and i + 1 < n:
+            escaped = pattern[i + 1]
+            if escaped.isalnum() or depth:
+                runs.append(''.join(current))  # \d, \w, \b, back references...
+                current = []
+            else:
+                current.append(escaped)
+            i += 2
+            continue
+        if c in '?*{':
+            if current:
+                current.pop()
+            runs.append(''.join(current))
+            current = []
+            if c == '{':
+                end = pattern.find('}', i)
+                i = n if end == -1 else end
+        elif c == '[':
+            runs.append(''.join(current))
+            current = []
+            end = pattern.find(']', i + 2)
+            i = n if end == -1 else end
+        elif c in '().^$+':
+            depth += 1 if c == '(' else -1 if c == ')' else 0
+            runs.append(''.join(current))
+            current = []
+        elif not depth:
+            current.append(c)
+        i += 1
+    runs.append(''.join(current))
+    return [run for run in runs if len(run) >= 3]
+
+
+class ContentIndex:
+    """Trigram index over the text files of a FileIndex, plus a symbol table.
+
+    Every indexed file contributes the set of lowercase trigrams in its content; the
+    file keeps them as a tuple of interned strings, just enough to drop its postings
+    later without a second copy of every set.
+    A query is reduced to the trigrams its matches must contain, only files holding
+    all of them are opened, and those are scanned line by line. Files are kept in
+    sync with the FileIndex and by mtime on ``refresh``; ``update_paths`` reindexes
+    files the app itself just wrote.
+    """
+
+    def __init__(self, file_index, rescan_interval=10.0):
+        self.file_index = file_index
+        self.root = file_index.root
+        self.rescan_interval = rescan_interval
+        self.lock = RLock()
+        self.ready = Event()
+        self.stop_event = Event()
+        self.thread = None
+
+        self.files = {}     # path -> {"id", "mtime", "size", "trigrams", "symbols"}
+        self.paths = {}     # file id -> path
+        self.postings = {}  # trigram -> set of file ids
+        self.next_id = 0
+        self.synced_generation = -1
+
+        self.build_ms = None
+        self.last_refresh_ms = None
+        self.files_reindexed = 0
+        self.searches = 0
+        self.last_search_ms = None
+        self.last_files_scanned = 0
+
+    def start(self):
+        """Build the index and keep it fresh from a background thread."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def refresh(self):
+        """Add and drop files to match the FileIndex, and reindex files whose mtime changed."""
+        started = time.time()
+        generation = self.file_index.generation
+        current = set(self.file_index.files())
+        with self.lock:
+            known = {path: entry["mtime"] for path, entry in self.files.items()}
+        # Stat outside the lock, so searches do not wait for a pass over every file
+        stale = [path for path in current if path not in known or known[path] != self._mtime(path)]
+        with self.lock:
+            for path in [path for path in self.files if path not in current]:
+                self._remove(path)
+            for path in stale:
+                self._index_file(path)
+            self.synced_generation = generation
+        self.last_refresh_ms = round((time.time() - started) * 1000, 1)
+
+    def update_paths(self, paths):
+        """Reindex files the app changed (or removed) right away."""
+        with self.lock:
+            for path in paths:
+                path = os.path.normpath(path)
+                if os.path.isfile(os.path.join(self.root, path)):
+                    self._index_file(path)
+                else:
+                    self._remove(path)
+
+    def search(self, query, regex=False, case_sensitive=False, limit=200, paths=None, timeout=30.0):
+        """Lines matching ``query``; returns (results, truncated, files_scanned).
+
+        Each result is ``{"path", "line", "column", "text"}``. ``query`` is a literal
+        unless ``regex`` is set. ``paths`` optionally restricts the search to a set
+        of relative paths.
+        """
+        started = time.time()
+        self.ready.wait(timeout)
+        flags = 0 if case_sensitive else re.IGNORECASE
+        compiled = re.compile(query if regex else re.escape(query), flags | re.MULTILINE)
+        literals = required_literals(query) if regex else ([query] if len(query) >= 3 else [])
+
+        with self.lock:
+            self._sync()
+            candidates = self._candidates(literals)
+            if paths is not None:
+                wanted = {os.path.normpath(path) for path in paths}
+                candidates = [path for path in candidates if path in wanted]
+            candidates.sort()
+
+        results, scanned, truncated = [], 0, False
+        for path in candidates:
+            text = self._read(path)
+            if text is None:
+                continue
+            scanned += 1
+            last_line, line_number, counted = None, 1, 0
+            for match in compiled.finditer(text):
+                line_start = text.rfind('\n', 0, match.start()) + 1
+                line_number += text.count('\n', counted, line_start)
+                counted = line_start
+                if line_number == last_line:
+                    continue  # One result per line
+                last_line = line_number
+                if len(results) >= limit:
+                    truncated = True
+                    break
+                line_end = text.find('\n', match.start())
+                line = text[line_start:line_end if line_end != -1 else len(text)]
+                results.append({
+                    "path": path,
+                    "line": line_number,
+                    "column": match.start() - line_start + 1,
+                    "text": line[:MAX_LINE_LENGTH],
+                })
+            if truncated:
+                break
+
+        with self.lock:
+            self.searches += 1
+            self.last_search_ms = round((time.time() - started) * 1000, 1)
+            self.last_files_scanned = scanned
+        return results, truncated, scanned
+
+    def find_symbols(self, query="", path=None, limit=100, timeout=30.0):
+        """Definitions by name: exact matches first, then prefix, then substring (case-insensitive).
+
+        With ``path`` only that file's symbols are returned, in line order.
+        """
+        self.ready.wait(timeout)
+        with self.lock:
+            self._sync()
+            if path is not None:
+                entry = self.files.get(os.path.normpath(path))
+                symbols = entry["symbols"] if entry else []
+                return [self._symbol(os.path.normpath(path), symbol) for symbol in symbols][:limit]
+
+            query = query.lower()
+            ranked = []
+            for file_path, entry in self.files.items():
+                for symbol in entry["symbols"]:
+                    name = symbol[0].lower()
+                    if name == query:
+                        rank = 0
+                    elif name.startswith(query):
+                        rank = 1
+                    elif query in name:
+                        rank = 2
+                    else:
+                        continue
+                    ranked.append((rank, len(name), file_path, symbol))
+            ranked.sort(key=lambda item: (item[0], item[1], item[2], item[3][2]))
+            return [self._symbol(file_path, symbol) for _, _, file_path, symbol in ranked[:limit]]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "ready": self.ready.is_set(),
+                "files": len(self.files),
+                "trigrams": len(self.postings),
+                "symbols": sum(len(entry["symbols"]) for entry in self.files.values()),
+                "build_ms": self.build_ms,
+                "last_refresh_ms": self.last_refresh_ms,
+                "files_reindexed": self.files_reindexed,
+                "searches": self.searches,
+                "last_search_ms": self.last_search_ms,
+                "last_files_scanned": self.last_files_scanned,
+            }
+
+    def _run(self):
+        started = time.time()
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Content index build error: {e}")
+        self.build_ms = round((time.time() - started) * 1000, 1)
+        self.ready.set()
+        while not self.stop_event.wait(self.rescan_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Content index refresh error: {e}")
+
+    def _sync(self):
+        """Pick up files the FileIndex added or removed since the last refresh. Caller holds the lock."""
+        if self.file_index.generation == self.synced_generation:
+            return
+        generation = self.file_index.generation
+        current = set(self.file_index.files())
+        for path in [path for path in self.files if path not in current]:
+            self._remove(path)
+        for path in current - self.files.keys():
+            self._index_file(path)
+        self.synced_generation = generation
+
+    def _candidates(self, literals):
+        """Paths of files containing every trigram of every literal. Caller holds the lock."""
+        needed = set()
+        for literal in literals:
+            needed |= trigrams(literal)
+        if not needed:
+            return [path for path, entry in self.files.items() if entry["trigrams"] is not None]
+        # Intersect the rarest posting lists first
+        postings = sorted((self.postings.get(trigram, set()) for trigram in needed), key=len)
+        ids = set(postings[0])
+        for posting in postings[1:]:
+            ids &= posting
+            if not ids:
+                break
+        return [self.paths[file_id] for file_id in ids]
+
+    def _index_file(self, path):
+        full_path = os.path.join(self.root, path)
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            self._remove(path)
+            return
+        entry = self.files.get(path)
+        if entry is None:
+            entry = {"id": self.next_id, "mtime": None, "size": 0, "trigrams": None, "symbols": []}
+            self.paths[self.next_id] = path
+            self.next_id += 1
+            self.files[path] = entry
+        self._drop_postings(entry)
+
+        entry["mtime"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        text = self._read(path) if stat.st_size <= MAX_FILE_SIZE else None
+        if text is None:
+            entry["trigrams"] = None  # Binary or too large: listed, but never searched
+            entry["symbols"] = []
+            return
+        entry["trigrams"] = tuple(sys.intern(trigram) for trigram in trigrams(text))
+        entry["symbols"] = extract_symbols(path, text)
+        for trigram in entry["trigrams"]:
+            self.postings.setdefault(trigram, set()).add(entry["id"])
+        self.files_reindexed += 1
+
+    def _remove(self, path):
+        entry = self.files.pop(path, None)
+        if entry is not None:
+            self._drop_postings(entry)
+            self.paths.pop(entry["id"], None)
+
+    def _drop_postings(self, entry):
+        for trigram in entry["trigrams"] or ():
+            posting = self.postings.get(trigram)
+            if posting is not None:
+                posting.discard(entry["id"])
+                if not posting:
+                    del self.postings[trigram]
+
+    def _read(self, path):
+        """File content as text, or None for unreadable, binary or oversized files."""
+        try:
+            with open(os.path.join(self.root, path), 'rb') as f:
+                data = f.read(MAX_FILE_SIZE + 1)
+        except OSError:
+            return None
+        if len(data) > MAX_FILE_SIZE or b'\0' in data[:8192]:
+            return None
+        return data.decode('utf-8', errors='replace')
+
+    def _mtime(self, path):
+        try:
+            return os.stat(os.path.join(self.root, path)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _symbol(self, path, symbol):
+        name, kind, line = symbol
+        return {"name": name, "kind": kind, "path": path, "line": line}
+
+
+_indexes = {}  # FileIndex root -> ContentIndex
+_indexes_lock = Lock()
+
+
+def update_content_index(file_index, paths):
+    """Reindex ``paths`` if a ContentIndex already exists for this FileIndex; never starts one."""
+    with _indexes_lock:
+        index = _indexes.get(file_index.root)
+    if index is not None and index.file_index is file_index and index.ready.is_set():
+        index.update_paths(paths)
+
+
+def get_content_index(file_index):
+    """Shared ContentIndex for a FileIndex; starts building in the background on first use.
+
+    It is stopped and dropped when its FileIndex is stopped (evicted by get_file_index).
+    """
+    with _indexes_lock:
+        index = _indexes.get(file_index.root)
+        if index is None or index.file_index is not file_index:
+            if index is not None:
+                index.stop()
+            index = ContentIndex(file_index)
+            index.start()
+            _indexes[file_index.root] = index
+            file_index.on_stop.append(lambda: _drop_content_index(file_index))
+        return index
+
+
+def _drop_content_index(file_index):
+    with _indexes_lock:
+        index = _indexes.get(file_index.root)
+        if index is None or index.file_index is not file_index:
+            return
+        del _indexes[file_index.root]
+    index.stop()
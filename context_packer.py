@@ -0,0 +1,206 @@
+import math
+import os
+import re
+
+from content_index import extract_symbols
+from file_index import DEFAULT_IGNORED_NAMES
+from file_reader import is_binary
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CODIFY_CONTEXT_TOKENS", "100000"))
+FILE_LIST_SHARE = 0.1     # At most this part of the budget goes to the list of project file names
+MIN_EXCERPT_TOKENS = 300  # Below this, a file that does not fit is left out instead of cut down
+EXCERPT_LINES = 40        # Truncated files keep their most relevant blocks of this many lines
+
+# Folders and files that are dependencies or build output rather than project code
+VENDORED_NAMES = DEFAULT_IGNORED_NAMES | {
+    "node_modules", "bower_components", "vendor", "third_party", "site-packages",
+    "dist", "build", "venv", "env",
+}
+GENERATED_FILES = {"package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock", "composer.lock"}
+MINIFIED_SUFFIXES = (".min.js", ".min.css", ".map", ".bundle.js")
+
+LANGUAGES = {
+    ".py": "python", ".js": "javascript", ".jsx": "jsx", ".ts": "typescript", ".tsx": "tsx",
+    ".html": "html", ".css": "css", ".json": "json", ".md": "markdown", ".sh": "bash",
+    ".bat": "bat", ".ps1": "powershell", ".yml": "yaml", ".yaml": "yaml", ".sql": "sql",
+    ".java": "java", ".c": "c", ".cpp": "cpp", ".h": "c", ".go": "go", ".rs": "rust",
+}
+
+# A BPE tokenizer gives most words one token and most symbols one of their own
+TOKEN_SYMBOLS = "()[]{}.,:;=+-*/<>\"'`#!&|%@\\^~?$_"
+TERM_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_.]{2,}")
+STOP_WORDS = frozenset((
+    "the", "and", "for", "with", "that", "this", "from", "into", "have", "has", "are", "was",
+    "not", "but", "all", "any", "can", "you", "your", "please", "make", "add", "fix", "use",
+    "file", "files", "code", "should", "would", "could", "when", "what", "which", "there",
+    "them", "then", "also", "some", "need", "want", "like", "just", "does", "dont", "how",
+))
+
+
+def estimate_tokens(text):
+    """Approximate model tokens in ``text`` without a network call (words plus symbols)."""
+    return len(text.split()) + sum(text.count(symbol) for symbol in TOKEN_SYMBOLS)
+
+
+def prompt_terms(prompt):
+    """Lowercase search terms of a prompt, including the parts of camelCase and snake_case words."""
+    terms = set()
+    for word in TERM_PATTERN.findall(prompt):
+        word = word.strip('.')
+        terms.add(word.lower())
+        for part in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", word):
+            if len(part) >= 3:
+                terms.add(part.lower())
+    return {term for term in terms if len(term) >= 3 and term not in STOP_WORDS}
+
+
+def skip_reason(path, text=None):
+    """Why a file should not be sent to the model, or None if it should."""
+    parts = path.replace('\\', '/').split('/')
+    if any(part in VENDORED_NAMES for part in parts[:-1]):
+        return "vendored"
+    name = parts[-1]
+    if name in GENERATED_FILES:
+        return "generated"
+    if name.lower().endswith(MINIFIED_SUFFIXES):
+        return "minified"
+    if text is not None and len(text) > 2000:
+        lines = text.count('\n') + 1
+        if len(text) / lines > 300:
+            return "minified"
+    return None
+
+
+def relevance(path, text, terms, prompt):
+    """How relevant a file is to the prompt: names it mentions, symbols it defines, words it contains."""
+    lowered_path = path.replace('\\', '/').lower()
+    score = 0.0
+    if os.path.basename(lowered_path) in prompt.lower():
+        score += 50
+    for term in terms:
+        if term in lowered_path:
+            score += 10
+    for name, _, _ in extract_symbols(path, text):
+        if name.lower() in terms:
+            score += 5
+    lowered = text.lower()
+    for term in terms:
+        count = lowered.count(term)
+        if count:
+            score += 2 * math.log1p(count)
+    return score
+
+
+def excerpt(text, terms, budget):
+    """The blocks of ``text`` most relevant to ``terms`` that fit in ``budget`` tokens.
+
+    The first block (imports, module docstring) is preferred; blocks are kept in file
+    order and every gap is marked with the line numbers left out.
+    """
+    lines = text.splitlines(keepends=True)
+    blocks = []
+    for start in range(0, len(lines), EXCERPT_LINES):
+        block = ''.join(lines[start:start + EXCERPT_LINES])
+        lowered = block.lower()
+        hits = sum(lowered.count(term) for term in terms)
+        blocks.append((hits + (1 if start == 0 else 0), start, block, estimate_tokens(block)))
+
+    chosen, used = [], 0
+    for hits, start, block, tokens in sorted(blocks, key=lambda b: (-b[0], b[1])):
+        if used + tokens + 10 <= budget:
+            chosen.append((start, block))
+            used += tokens + 10
+    chosen.sort()
+
+    parts, next_line = [], 0
+    for start, block in chosen:
+        if start > next_line:
+            parts.append(f"... (lines {next_line + 1}-{start} omitted)\n")
+        parts.append(block if block.endswith('\n') else block + '\n')
+        next_line = start + EXCERPT_LINES
+    if next_line < len(lines):
+        parts.append(f"... (lines {next_line + 1}-{len(lines)} omitted)\n")
+    return ''.join(parts)
+
+
+def fenced(path, text):
+    """``text`` in a Markdown code block labelled with its path, fenced so the content cannot close it."""
+    longest = max((len(run) for run in re.findall(r"`{3,}", text)), default=2)
+    fence = '`' * (longest + 1)
+    language = LANGUAGES.get(os.path.splitext(path)[1].lower(), "")
+    if not text.endswith('\n'):
+        text += '\n'
+    return f"{path}\n{fence}{language}\n{text}{fence}\n"
+
+
+def pack_context(project_path, paths, prompt, budget=DEFAULT_TOKEN_BUDGET, filenames=None):
+    """Pack the given project files into at most ``budget`` tokens of plain fenced blocks.
+
+    Files are ranked by relevance to the prompt and added whole while they fit; the
+    first one that does not fit is cut down to its most relevant blocks. Vendored,
+    generated, minified and binary files are left out. Returns (text, report) where
+    the report lists every file with its status, tokens and score.
+    """
+    terms = prompt_terms(prompt)
+    report = {"budget": budget, "tokens": 0, "files": []}
+    candidates = []
+    for path in paths:
+        full_path = os.path.join(project_path, path)
+        # Check path traversal
+        if not os.path.normpath(full_path).startswith(os.path.normpath(project_path)):
+            continue
+        reason = skip_reason(path)
+        text = None
+        if reason is None:
+            try:
+                if is_binary(full_path):
+                    reason = "binary"
+                else:
+                    with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
+                        text = f.read()
+                    reason = skip_reason(path, text)
+            except OSError as e:
+                reason = f"unreadable: {e}"
+        if reason:
+            report["files"].append({"path": path, "status": "dropped", "reason": reason})
+            continue
+        candidates.append((relevance(path, text, terms, prompt), path, text))
+
+    candidates.sort(key=lambda candidate: (-candidate[0], len(candidate[2])))
+    file_list_budget = int(budget * FILE_LIST_SHARE) if filenames else 0
+    remaining = budget - file_list_budget
+    blocks = []
+    for score, path, text in candidates:
+        block = fenced(path, text)
+        tokens = estimate_tokens(block)
+        entry = {"path": path, "score": round(score, 1), "tokens": tokens}
+        if tokens <= remaining:
+            entry["status"] = "included"
+        elif remaining >= MIN_EXCERPT_TOKENS:
+            block = fenced(path, excerpt(text, terms, remaining - 20))
+            entry["full_tokens"] = tokens
+            entry["tokens"] = tokens = estimate_tokens(block)
+            entry["status"] = "truncated"
+        else:
+            entry.update(status="dropped", reason="over budget", tokens=0)
+            report["files"].append(entry)
+            continue
+        blocks.append(block)
+        remaining -= tokens
+        report["files"].append(entry)
+
+    if filenames:
+        remaining += file_list_budget
+        listing, used = [], 0
+        for name in filenames:
+            tokens = estimate_tokens(name) + 1
+            if used + tokens > remaining:
+                listing.append(f"... and {len(filenames) - len(listing)} more")
+                break
+            listing.append(name)
+            used += tokens
+        blocks.append(fenced("Project files", '\n'.join(listing)))
+        remaining -= used
+
+    report["tokens"] = budget - remaining
+    return '\n'.join(blocks), report
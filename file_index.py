@@ -0,0 +1,401 @@
+import bisect
+import os
+import re
+import time
+from collections import OrderedDict
+from threading import Thread, Lock, RLock, Event
+
+# Always left out of the index: virtualenv folders on Windows and bytecode caches.
+# Names starting with "." are skipped as well.
+DEFAULT_IGNORED_NAMES = frozenset(("Lib", "Scripts", "__pycache__"))
+
+
+def glob_to_regex(pattern, multiline=False):
+    """Translate a gitignore-style glob (``*``, ``?``, ``[...]``, ``**``) into a regex body.
+
+    With ``multiline`` no wildcard matches a newline, so the regex can scan many
+    newline-separated paths at once.
+    """
+    any_char = '[^\\n]' if multiline else '.'
+    segment_char = '[^/\\n]' if multiline else '[^/]'
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                if pattern.startswith('**/', i):
+                    out.append('(?:' + any_char + '*/)?')
+                    i += 3
+                else:
+                    out.append(any_char + '*')
+                    i += 2
+                continue
+            out.append(segment_char + '*')
+        elif c == '?':
+            out.append(segment_char)
+        elif c == '[':
+            end = pattern.find(']', i + 2 if pattern.startswith('[!', i) else i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    # A negated class must not cross a folder (or path) boundary either
+                    body = '^/' + ('\\n' if multiline else '') + body[1:]
+                out.append('[' + body + ']')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class IgnoreRules:
+    """Decides which project paths stay out of the index, following .gitignore semantics.
+
+    Rules are loaded per directory; a path is checked against the root .gitignore first
+    and deeper ones after, and the last matching rule wins (``!`` re-includes).
+    """
+
+    def __init__(self, ignored_names=DEFAULT_IGNORED_NAMES):
+        self.ignored_names = ignored_names
+        self.rules = {}  # rel_dir -> [(regex, negate, dir_only)]
+
+    def load(self, rel_dir, path):
+        """Parse the .gitignore at ``path`` for the directory ``rel_dir``."""
+        rules = []
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            lines = []
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            elif line.startswith('\\'):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.strip('/') if dir_only else line
+            anchored = '/' in line
+            line = line.lstrip('/')
+            if not line:
+                continue
+            prefix = '^' if anchored else '^(?:.*/)?'
+            rules.append((re.compile(prefix + glob_to_regex(line) + '$'), negate, dir_only))
+        if rules:
+            self.rules[rel_dir] = rules
+        else:
+            self.rules.pop(rel_dir, None)
+
+    def forget(self, rel_dir):
+        self.rules.pop(rel_dir, None)
+
+    def is_ignored(self, rel_path, is_dir):
+        """Whether ``rel_path`` ('/'-separated, relative to the project root) is ignored."""
+        parts = rel_path.split('/')
+        name = parts[-1]
+        if name.startswith('.') or name in self.ignored_names:
+            return True
+        if not self.rules:
+            return False
+        ignored = False
+        for depth in range(len(parts)):
+            rules = self.rules.get('/'.join(parts[:depth]))
+            if not rules:
+                continue
+            sub_path = '/'.join(parts[depth:])
+            for regex, negate, dir_only in rules:
+                if dir_only and not is_dir:
+                    continue
+                if regex.match(sub_path):
+                    ignored = not negate
+        return ignored
+
+
+class FileIndex:
+    """In-memory index of the files under a project directory.
+
+    The first ``build`` walks the whole tree. After that ``refresh`` only stats the
+    known directories and rescans those whose mtime changed (an entry was added,
+    removed or renamed), so keeping the index fresh costs one stat per directory.
+    Both walk and stat without holding the lock, so lookups never wait on the disk.
+    A background thread started with ``start`` refreshes every ``rescan_interval``
+    seconds; ``update_paths`` applies known changes (such as our own writes) at once.
+    Symlinks to directories are left out: following them could loop or index a
+    subtree twice.
+    """
+
+    def __init__(self, root, rescan_interval=2.0, ignored_names=DEFAULT_IGNORED_NAMES):
+        self.root = os.path.abspath(root)
+        self.rescan_interval = rescan_interval
+        self.ignored_names = ignored_names
+        self.lock = RLock()
+        self.stop_event = Event()
+        self.thread = None
+        self.on_stop = []  # Callbacks run by stop(), e.g. to drop indexes built on this one
+
+        self.dirs = {}        # rel_dir ('' is the root) -> {"mtime", "files": set, "subdirs": set}
+        self.gitignores = {}  # rel_dir -> mtime of its .gitignore
+        self.rules = IgnoreRules(ignored_names)
+        self.generation = 0   # Bumped whenever the set of files changes
+        self.sorted_files = []
+        self.sorted_generation = -1
+
+        self.file_count = 0
+        self.full_scans = 0
+        self.dirs_rescanned = 0
+        self.build_ms = None
+        self.last_refresh_ms = None
+        self.last_refresh = 0.0
+
+    def build(self):
+        """Index the whole tree from scratch."""
+        started = time.time()
+        fresh = FileIndex(self.root, self.rescan_interval, self.ignored_names)
+        fresh._scan_tree('')  # Lookups keep using the old index until the new one is swapped in
+        with self.lock:
+            self.dirs = fresh.dirs
+            self.gitignores = fresh.gitignores
+            self.rules = fresh.rules
+            self.file_count = fresh.file_count
+            self.generation += 1
+            self.full_scans += 1
+            self.last_refresh = time.time()
+        self.build_ms = round((time.time() - started) * 1000, 1)
+
+    def refresh(self):
+        """Rescan directories whose mtime changed since they were last scanned."""
+        started = time.time()
+        with self.lock:
+            gitignores = dict(self.gitignores)
+            dir_mtimes = {rel_dir: state["mtime"] for rel_dir, state in self.dirs.items()}
+
+        # An edited .gitignore changes what every directory below it should contain
+        for rel_dir, mtime in gitignores.items():
+            if self._mtime(self._join(rel_dir, '.gitignore')) != mtime:
+                self.build()
+                return
+        stale = [rel_dir for rel_dir, mtime in dir_mtimes.items() if self._mtime(rel_dir) != mtime]
+
+        with self.lock:
+            changed = False
+            for rel_dir in stale:
+                state = self.dirs.get(rel_dir)
+                if state is None or state["mtime"] != dir_mtimes[rel_dir]:
+                    continue  # Removed while rescanning a parent, or already rescanned by update_paths
+                changed = self._rescan_dir(rel_dir) or changed
+            if changed:
+                self.generation += 1
+            self.last_refresh = time.time()
+        self.last_refresh_ms = round((time.time() - started) * 1000, 1)
+
+    def update_paths(self, rel_paths):
+        """Pick up changes to specific paths right away, without waiting for the next refresh."""
+        with self.lock:
+            changed = False
+            for rel_path in rel_paths:
+                rel_dir = self._parent(self._normalize(rel_path))
+                # Walk up to the nearest indexed directory; new folders are scanned from there
+                while rel_dir not in self.dirs and rel_dir:
+                    rel_dir = self._parent(rel_dir)
+                if rel_dir in self.dirs:
+                    changed = self._rescan_dir(rel_dir) or changed
+            if changed:
+                self.generation += 1
+
+    def files(self):
+        """All indexed files as sorted paths relative to the root, using the OS separator."""
+        with self.lock:
+            if self.sorted_generation != self.generation:
+                paths = []
+                for rel_dir, state in self.dirs.items():
+                    prefix = rel_dir + '/' if rel_dir else ''
+                    paths.extend(prefix + name for name in state["files"])
+                paths.sort()
+                if os.sep != '/':
+                    paths = [path.replace('/', os.sep) for path in paths]
+                self.sorted_files = paths
+                self.sorted_generation = self.generation
+            return self.sorted_files
+
+    def page(self, cursor=None, limit=1000):
+        """One page of ``files()`` starting after the path ``cursor``; returns (paths, next_cursor, total).
+
+        The cursor is the last path of the previous page, so paging stays consistent
+        while files are added or removed between requests.
+        """
+        files = self.files()
+        start = bisect.bisect_right(files, cursor) if cursor else 0
+        paths = files[start:start + limit]
+        next_cursor = paths[-1] if paths and start + limit < len(files) else None
+        return paths, next_cursor, len(files)
+
+    def list_dir(self, rel_dir=''):
+        """Direct children of an indexed directory as (dirs, files), or None if it is not indexed.
+
+        ``dirs`` holds ``{"name", "path", "has_children"}`` entries so a tree view can
+        load one level at a time.
+        """
+        rel_dir = self._normalize(rel_dir)
+        with self.lock:
+            state = self.dirs.get(rel_dir)
+            if state is None:
+                return None
+            prefix = rel_dir + '/' if rel_dir else ''
+            dirs = []
+            for name in sorted(state["subdirs"]):
+                child = self.dirs.get(prefix + name)
+                dirs.append({
+                    "name": name,
+                    "path": (prefix + name).replace('/', os.sep),
+                    "has_children": bool(child and (child["files"] or child["subdirs"])),
+                })
+            files = [(prefix + name).replace('/', os.sep) for name in sorted(state["files"])]
+            return dirs, files
+
+    def start(self):
+        """Keep the index fresh from a background thread."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._watch)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for callback in self.on_stop:
+            try:
+                callback()
+            except Exception as e:
+                print(f"File index stop callback error: {e}")
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "root": self.root,
+                "files": self.file_count,
+                "directories": len(self.dirs),
+                "generation": self.generation,
+                "full_scans": self.full_scans,
+                "dirs_rescanned": self.dirs_rescanned,
+                "build_ms": self.build_ms,
+                "last_refresh_ms": self.last_refresh_ms,
+                "seconds_since_refresh": round(time.time() - self.last_refresh, 1),
+            }
+
+    def _watch(self):
+        while not self.stop_event.wait(self.rescan_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"File index refresh error: {e}")
+
+    def _scan_tree(self, rel_dir):
+        pending = [rel_dir]
+        while pending:
+            pending.extend(self._scan_dir(pending.pop()))
+
+    def _scan_dir(self, rel_dir):
+        """Read one directory into the index and return its subdirectories that still need scanning."""
+        full_path = self._join(rel_dir)
+        mtime = self._mtime(rel_dir)
+        try:
+            entries = list(os.scandir(full_path))
+        except OSError:
+            entries = []
+
+        # The directory's own .gitignore applies to its entries
+        if any(entry.name == '.gitignore' for entry in entries):
+            self.rules.load(rel_dir, os.path.join(full_path, '.gitignore'))
+            self.gitignores[rel_dir] = self._mtime(self._join(rel_dir, '.gitignore'))
+        else:
+            self.rules.forget(rel_dir)
+            self.gitignores.pop(rel_dir, None)
+
+        prefix = rel_dir + '/' if rel_dir else ''
+        files, subdirs = set(), set()
+        for entry in entries:
+            try:
+                if entry.is_symlink() and entry.is_dir():
+                    continue
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if self.rules.is_ignored(prefix + entry.name, is_dir):
+                continue
+            (subdirs if is_dir else files).add(entry.name)
+
+        old = self.dirs.get(rel_dir)
+        self.file_count += len(files) - (len(old["files"]) if old else 0)
+        self.dirs[rel_dir] = {"mtime": mtime, "files": files, "subdirs": subdirs}
+        return [prefix + name for name in subdirs if prefix + name not in self.dirs]
+
+    def _rescan_dir(self, rel_dir):
+        """Rescan a directory whose entries changed; returns True when the file set changed."""
+        old = self.dirs[rel_dir]
+        old_files, old_subdirs = old["files"], old["subdirs"]
+        self.dirs_rescanned += 1
+        if not os.path.isdir(self._join(rel_dir)):
+            self._remove_dir(rel_dir)
+            return True
+        self._scan_tree(rel_dir)
+        state = self.dirs[rel_dir]
+        prefix = rel_dir + '/' if rel_dir else ''
+        for name in old_subdirs - state["subdirs"]:
+            self._remove_dir(prefix + name)
+        return state["files"] != old_files or state["subdirs"] != old_subdirs
+
+    def _remove_dir(self, rel_dir):
+        prefix = rel_dir + '/'
+        for key in [key for key in self.dirs if key == rel_dir or key.startswith(prefix)]:
+            self.file_count -= len(self.dirs.pop(key)["files"])
+            self.rules.forget(key)
+            self.gitignores.pop(key, None)
+
+    def _join(self, rel_dir, name=None):
+        path = os.path.join(self.root, *rel_dir.split('/')) if rel_dir else self.root
+        return os.path.join(path, name) if name else path
+
+    def _mtime(self, rel_dir_or_path):
+        path = rel_dir_or_path if os.path.isabs(rel_dir_or_path) else self._join(rel_dir_or_path)
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _normalize(self, rel_path):
+        return rel_path.replace(os.sep, '/').replace('\\', '/').strip('/')
+
+    def _parent(self, rel_path):
+        return rel_path.rsplit('/', 1)[0] if '/' in rel_path else ''
+
+
+_indexes = OrderedDict()  # Most recently used project roots last
+_indexes_lock = Lock()
+MAX_INDEXES = 4
+
+
+def get_file_index(root):
+    """Shared, self-refreshing FileIndex for a project root; built on first use."""
+    key = os.path.normcase(os.path.abspath(root))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = FileIndex(root)
+            index.build()
+            index.start()
+            _indexes[key] = index
+            while len(_indexes) > MAX_INDEXES:
+                _, evicted = _indexes.popitem(last=False)
+                evicted.stop()
+        _indexes.move_to_end(key)
+        return index
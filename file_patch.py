@@ -0,0 +1,181 @@
+import re
+from threading import Lock
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+# Rough size of a model token, used to turn saved bytes into saved tokens
+BYTES_PER_TOKEN = 4
+
+
+class PatchError(Exception):
+    """An edit does not apply cleanly to the current file."""
+
+
+def apply_edits(text, edits):
+    """Apply search/replace edits in order and return the new text.
+
+    Every ``search`` block has to occur exactly once in the file. When there is no
+    exact match, lines are compared again ignoring trailing whitespace, which models
+    often get wrong. An empty ``search`` is only allowed for an empty file.
+    """
+    for number, edit in enumerate(edits, 1):
+        search = edit.get('search') or ''
+        replace = edit.get('replace') or ''
+        if not search:
+            if text.strip():
+                raise PatchError(f"edit {number} has an empty search block")
+            text = replace
+            continue
+        count = text.count(search)
+        if count > 1:
+            raise PatchError(f"edit {number} matches {count} places, the search block must be unique")
+        if count == 1:
+            start = text.index(search)
+            end = start + len(search)
+        else:
+            start, end = _find_ignoring_trailing_space(text, search, number)
+        text = text[:start] + replace + text[end:]
+    return text
+
+
+def _find_ignoring_trailing_space(text, search, number):
+    lines = text.splitlines(keepends=True)
+    wanted = [line.rstrip() for line in search.splitlines()]
+    stripped = [line.rstrip() for line in lines]
+    matches = [i for i in range(len(lines) - len(wanted) + 1) if stripped[i:i + len(wanted)] == wanted]
+    if not matches:
+        raise PatchError(f"edit {number} search block was not found in the file")
+    if len(matches) > 1:
+        raise PatchError(f"edit {number} matches {len(matches)} places, the search block must be unique")
+    first = matches[0]
+    start = sum(len(line) for line in lines[:first])
+    end = start + sum(len(line) for line in lines[first:first + len(wanted)])
+    if not search.endswith('\n'):
+        last = lines[first + len(wanted) - 1]
+        end -= len(last) - len(last.rstrip('\r\n'))  # Keep the line break the block did not include
+    return start, end
+
+
+def parse_unified_diff(diff):
+    """Hunks of a unified diff as (old_start, [(tag, line), ...]), tag being ' ', '-' or '+'."""
+    hunks = []
+    current = None
+    for line in diff.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header:
+            current = []
+            hunks.append((int(header.group(1)), current))
+        elif current is None or line.startswith(('--- ', '+++ ', 'diff ', 'index ')):
+            continue
+        elif line.startswith('\\'):
+            continue  # "\ No newline at end of file"
+        elif line == '':
+            current.append((' ', ''))  # Blank context lines often lose their leading space
+        elif line[0] in ' -+':
+            current.append((line[0], line[1:]))
+        else:
+            raise PatchError(f"unexpected line in diff: {line[:60]!r}")
+    if not hunks:
+        raise PatchError("diff contains no hunks")
+    return hunks
+
+
+def apply_unified_diff(text, diff):
+    """Apply a unified diff to ``text``, checking every context and removed line.
+
+    Hunks are looked for at their stated line first and then anywhere after the
+    previous hunk, so diffs with stale line numbers still apply when the context is
+    unambiguous.
+    """
+    lines = text.splitlines(keepends=True)
+    bare = [line.rstrip('\r\n') for line in lines]
+    newline = '\r\n' if '\r\n' in text else '\n'
+    result = []
+    position = 0
+    for number, (old_start, hunk) in enumerate(parse_unified_diff(diff), 1):
+        old = [line for tag, line in hunk if tag != '+']
+        new = [line for tag, line in hunk if tag != '-']
+        start = _locate_hunk(bare, old, max(old_start - 1, 0), position)
+        if start is None:
+            raise PatchError(f"hunk {number} does not match the current file")
+        result.extend(lines[position:start])
+        result.extend(line + newline for line in new)
+        position = start + len(old)
+    result.extend(lines[position:])
+    patched = ''.join(result)
+    if position >= len(lines) and text and not text.endswith('\n') and patched.endswith(newline):
+        patched = patched[:-len(newline)]  # The last line had no line break before either
+    return patched
+
+
+def _locate_hunk(bare, old, expected, position):
+    def matches(start):
+        return bare[start:start + len(old)] == old or \
+            [line.rstrip() for line in bare[start:start + len(old)]] == [line.rstrip() for line in old]
+
+    if not old:
+        return min(max(expected, position), len(bare))
+    if expected >= position and matches(expected):
+        return expected
+    found = [start for start in range(position, len(bare) - len(old) + 1) if matches(start)]
+    if len(found) == 1:
+        return found[0]
+    if found:
+        return min(found, key=lambda start: abs(start - expected))  # Closest to where the diff says
+    return None
+
+
+def apply_change(text, change):
+    """New content of a file for a suggested change: its edits, its diff or its full content."""
+    if change.get('edits'):
+        return apply_edits(text, change['edits'])
+    if change.get('diff'):
+        return apply_unified_diff(text, change['diff'])
+    if change.get('modified') is not None:
+        return change['modified']
+    raise PatchError("change has no edits, diff or content")
+
+
+def patch_size(change):
+    """Bytes the model had to produce for a change in its delta form."""
+    if change.get('edits'):
+        return sum(len((edit.get('search') or '').encode('utf-8')) + len((edit.get('replace') or '').encode('utf-8'))
+                   for edit in change['edits'])
+    return len((change.get('diff') or '').encode('utf-8'))
+
+
+class PatchStats:
+    """Counts how changes arrived and how many bytes and tokens deltas saved over full files."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.patched = 0      # Applied from edits or a diff
+        self.full = 0         # Sent as complete file content
+        self.fallbacks = 0    # Deltas that did not apply and were replaced by full content
+        self.failed = 0       # Deltas that did not apply and had no fallback
+        self.full_bytes = 0   # What the patched changes would have cost as complete files
+        self.patch_bytes = 0  # What they actually cost
+
+    def record(self, kind, full_bytes=0, patch_bytes=0):
+        with self.lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+            if kind == 'patched':
+                self.full_bytes += full_bytes
+                self.patch_bytes += patch_bytes
+
+    def get_stats(self):
+        with self.lock:
+            saved = self.full_bytes - self.patch_bytes
+            return {
+                "patched": self.patched,
+                "full": self.full,
+                "fallbacks": self.fallbacks,
+                "failed": self.failed,
+                "full_bytes": self.full_bytes,
+                "patch_bytes": self.patch_bytes,
+                "bytes_saved": saved,
+                "tokens_saved": saved // BYTES_PER_TOKEN,
+            }
+
+
+patch_stats = PatchStats()
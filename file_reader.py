@@ -0,0 +1,130 @@
+import mmap
+import os
+from array import array
+from collections import OrderedDict
+from threading import Lock
+
+FIRST_WINDOW_BYTES = 512 * 1024  # A whole-file read of anything larger returns this much first
+MAX_WINDOW_BYTES = 8 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+BINARY_SNIFF_BYTES = 8192
+
+
+def is_binary(path):
+    """Guess whether a file is binary from its first bytes (NUL bytes or invalid UTF-8)."""
+    with open(path, 'rb') as f:
+        head = f.read(BINARY_SNIFF_BYTES)
+    if b'\0' in head:
+        return True
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is fine
+        return e.start < len(head) - 3
+    return False
+
+
+def _char_start(data, position):
+    """Move ``position`` back to the first byte of the UTF-8 character it falls in."""
+    limit = max(0, position - 3)
+    while position > limit and position < len(data) and (data[position] & 0xC0) == 0x80:
+        position -= 1
+    return position
+
+
+def read_range(path, offset=0, length=FIRST_WINDOW_BYTES):
+    """Decode ``length`` bytes from ``offset``, without splitting a UTF-8 character.
+
+    Returns (text, start, end) where ``end`` is the offset to continue from.
+    Large files are memory-mapped, so only the requested pages are touched.
+    """
+    size = os.path.getsize(path)
+    offset = min(max(0, offset), size)
+    length = max(0, min(length, MAX_WINDOW_BYTES))
+    if size == 0:
+        return "", 0, 0
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = _char_start(data, offset)
+            end = min(size, start + length)
+            if end < size:
+                end = _char_start(data, end)
+                if end <= start:
+                    end = min(size, start + 4)  # Always make progress
+            return data[start:end].decode('utf-8', errors='replace'), start, end
+
+
+class LineOffsets:
+    """Byte offset of every line start in a file, built once per (size, mtime) with mmap."""
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.key = (stat.st_size, stat.st_mtime_ns)
+        self.size = stat.st_size
+        self.offsets = array('Q', [0])
+        if self.size:
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    position = data.find(b'\n')
+                    while position != -1:
+                        self.offsets.append(position + 1)
+                        position = data.find(b'\n', position + 1)
+        if self.offsets[-1] == self.size and self.size:
+            self.offsets.pop()  # A trailing newline does not start another line
+
+    @property
+    def line_count(self):
+        return len(self.offsets)
+
+    def byte_range(self, start_line, count):
+        """Byte range covering ``count`` lines from the 1-based ``start_line``."""
+        first = min(max(1, start_line), self.line_count) - 1
+        last = min(self.line_count, first + max(0, count))
+        end = self.offsets[last] if last < self.line_count else self.size
+        return self.offsets[first], end
+
+
+_line_cache = OrderedDict()  # path -> LineOffsets, most recently used last
+_line_cache_lock = Lock()
+LINE_CACHE_SIZE = 16
+
+
+def line_offsets(path):
+    """Cached LineOffsets for ``path``, rebuilt when the file changes."""
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _line_cache_lock:
+        cached = _line_cache.get(path)
+        if cached is not None and cached.key == key:
+            _line_cache.move_to_end(path)
+            return cached
+    offsets = LineOffsets(path)
+    with _line_cache_lock:
+        _line_cache[path] = offsets
+        _line_cache.move_to_end(path)
+        while len(_line_cache) > LINE_CACHE_SIZE:
+            _line_cache.popitem(last=False)
+    return offsets
+
+
+def read_lines(path, start_line=1, count=1000):
+    """Decode a window of lines; returns (text, start_line, end_line, total_lines, next_offset)."""
+    offsets = line_offsets(path)
+    start, end = offsets.byte_range(start_line, count)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8', errors='replace')
+    first = min(max(1, start_line), offsets.line_count)
+    last = min(offsets.line_count, first + max(0, count) - 1)
+    return text, first, last, offsets.line_count, end
+
+
+def iter_chunks(path, offset=0, chunk_size=STREAM_CHUNK_BYTES):
+    """Yield the file from ``offset`` in raw byte chunks."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
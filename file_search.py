@@ -0,0 +1,273 @@
+import bisect
+import heapq
+import os
+import re
+import weakref
+from threading import Lock
+
+from file_index import glob_to_regex
+
+# Characters after which a match counts as the start of a word
+BOUNDARY_CHARS = "/\\_-. "
+
+# Fuzzy queries score at most this many candidates in Python; the regex tiers pick the best ones
+MAX_FUZZY_CANDIDATES = 500
+
+
+class FileSearch:
+    """Glob and fuzzy filename search over a FileIndex snapshot.
+
+    All paths are kept in one newline-separated string. Every query first jumps to
+    candidate lines with a C-level scan for a literal (or an ordered run of
+    letters) and only then checks those lines in Python, so nothing loops over all
+    paths. Glob queries stop once ``limit`` matches are found. Fuzzy queries collect
+    candidates in tiers (query inside the file name, letters in order inside the
+    file name, letters in order anywhere in the path), score at most
+    MAX_FUZZY_CANDIDATES of them fzf-style, and return the top ``limit``.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.lock = Lock()
+        self.generation = -1
+        self.paths = []        # '/'-separated, in index order
+        self.text = ""         # paths joined by newlines
+        self.starts = []       # offset of each path in text
+        self.lower_text = ""   # lowercased paths joined by newlines
+        self.lower_starts = []
+        self.char_counts = {}  # Occurrences of each character in lower_text, filled on demand
+        self.ignore_case = os.name == 'nt'
+
+    def glob(self, pattern, limit=None):
+        """Paths matching a glob; returns (paths, truncated).
+
+        A pattern without ``/`` matches file names. A pattern with ``/`` matches
+        relative to any folder (``src/*.py``) unless it starts with ``/``, which
+        anchors it to the project root. ``**`` matches any number of folders.
+        """
+        pattern = pattern.replace('\\', '/') if os.sep == '\\' else pattern
+        anchored = pattern.startswith('/')
+        pattern = pattern.lstrip('/')
+        prefix = '^' if anchored else '^(?:.*/)?'
+        regex = re.compile(prefix + glob_to_regex(pattern) + '$', re.IGNORECASE if self.ignore_case else 0)
+        self._snapshot()
+
+        # Jump straight to lines containing the pattern's longest literal followed by a
+        # matching remainder; only those lines are checked against the full pattern
+        literal, rest = split_literal(pattern.lower() if self.ignore_case else pattern)
+        prefix_end = min([pattern.find(c) for c in '*?[\\' if c in pattern] or [len(pattern)])
+        if anchored and prefix_end and not self.ignore_case:
+            # Paths are sorted, so a pattern anchored at the root with a literal start is a range
+            start = bisect.bisect_left(self.paths, pattern[:prefix_end])
+            end = bisect.bisect_left(self.paths, pattern[:prefix_end] + '\U0010ffff')
+            candidates = range(start, end)
+        elif len(literal) >= 2:
+            scan = re.compile(re.escape(literal) + glob_to_regex(rest, multiline=True) + '$', re.MULTILINE)
+            if self.ignore_case:
+                candidates = self._lines(scan, self.lower_text, self.lower_starts)
+            else:
+                candidates = self._lines(scan, self.text, self.starts)
+        else:
+            candidates = range(len(self.paths))
+
+        paths = []
+        for i in candidates:
+            if regex.match(self.paths[i]):
+                if limit is not None and len(paths) >= limit:
+                    return self._to_os(paths), True
+                paths.append(self.paths[i])
+        return self._to_os(paths), False
+
+    def fuzzy(self, query, limit=50):
+        """The ``limit`` best fuzzy matches for ``query`` as (path, score), best first."""
+        query = query.replace('\\', '/').strip().lower()
+        if not query:
+            return []
+        self._snapshot()
+
+        # Scans start at the query's rarest letter so the C search skips most of the text.
+        # Each gap stops at the next wanted letter, so failed lines cost linear time.
+        # Letters before the anchor are checked by fuzzy_score on the candidates.
+        anchor = min(range(len(query)), key=lambda j: self._char_count(query[j]))
+
+        def gaps(within):
+            parts = [re.escape(query[anchor])]
+            for c in query[anchor + 1:]:
+                parts.append('[^' + within + re.escape(c) + ']*' + re.escape(c))
+            return ''.join(parts)
+
+        tiers = [
+            re.escape(query) + '[^/\n]*$',
+            gaps('/\n') + '[^/\n]*$',
+            gaps('\n'),
+        ]
+        candidates = {}
+        for tier in tiers:
+            for i in self._lines(re.compile(tier, re.MULTILINE), self.lower_text, self.lower_starts):
+                candidates[i] = True
+                if len(candidates) >= MAX_FUZZY_CANDIDATES:
+                    break
+            if len(candidates) >= MAX_FUZZY_CANDIDATES:
+                break
+
+        scored = []
+        for i in candidates:
+            score = fuzzy_score(query, self.paths[i])
+            if score is not None:
+                scored.append((score, -len(self.paths[i]), self.paths[i]))
+        best = heapq.nlargest(limit, scored)
+        return [(self._to_os([path])[0], score) for score, _, path in best]
+
+    def _char_count(self, c):
+        count = self.char_counts.get(c)
+        if count is None:
+            count = self.char_counts[c] = self.lower_text.count(c)
+        return count
+
+    def _lines(self, regex, text, starts):
+        """Indexes of the lines of ``text`` where ``regex`` matches, each line reported once."""
+        position = 0
+        last = len(starts) - 1
+        while True:
+            match = regex.search(text, position)
+            if match is None:
+                return
+            i = bisect.bisect_right(starts, match.start()) - 1
+            yield i
+            if i >= last:
+                return
+            position = starts[i + 1]
+
+    def _snapshot(self):
+        """Rebuild the joined path text when the index has changed."""
+        with self.lock:
+            if self.generation != self.index.generation:
+                paths = self.index.files()
+                if os.sep != '/':
+                    paths = [path.replace(os.sep, '/') for path in paths]
+                lowered = [path.lower() for path in paths]
+                self.paths = paths
+                self.text, self.starts = '\n'.join(paths), _line_starts(paths)
+                self.lower_text, self.lower_starts = '\n'.join(lowered), _line_starts(lowered)
+                self.char_counts = {}
+                self.generation = self.index.generation
+
+    def _to_os(self, paths):
+        return [path.replace('/', os.sep) for path in paths] if os.sep != '/' else paths
+
+
+def split_literal(pattern):
+    """Split a glob into its longest literal run and the pattern that follows it.
+
+    Every path matching ``pattern`` contains that literal, followed by text matching
+    the remainder, which makes the pair a cheap prefilter.
+    """
+    best = ("", pattern)
+    current, start = [], 0
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c in '*?[':
+            if len(current) > len(best[0]):
+                best = (''.join(current), pattern[i:])
+            current = []
+            if c == '[':
+                end = pattern.find(']', i + 2)
+                i = n if end == -1 else end
+            elif pattern.startswith('**/', i):
+                i += 2  # The slash after ** is optional
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            current.append(pattern[i])
+        else:
+            current.append(c)
+        i += 1
+    if len(current) >= len(best[0]):
+        best = (''.join(current), "")
+    return best
+
+
+def _line_starts(lines):
+    starts, offset = [], 0
+    for line in lines:
+        starts.append(offset)
+        offset += len(line) + 1
+    return starts
+
+
+def fuzzy_score(query, path):
+    """fzf-style score of ``path`` for a lowercase ``query``, or None if it does not match.
+
+    Letters must appear in order. Matches at word starts, camelCase humps and runs of
+    consecutive letters score higher, gaps cost a little, and matches that fit in the
+    file name beat matches spread over folders.
+    """
+    lower = path.lower()
+    if len(lower) != len(path):
+        path = lower  # Rare characters whose lowercase form has another length
+    name_start = lower.rfind('/') + 1
+    span = _best_span(query, lower, name_start)
+    in_name = span is not None
+    if span is None:
+        span = _best_span(query, lower, 0)
+        if span is None:
+            return None
+
+    score = 0
+    previous = None
+    for position in span:
+        score += 16
+        before = path[position - 1] if position else '/'
+        if before in BOUNDARY_CHARS:
+            score += 10 if position == name_start else 8
+        elif path[position].isupper() and before.islower():
+            score += 7
+        if previous is not None:
+            gap = position - previous - 1
+            score += 6 if gap == 0 else -min(gap, 8)
+        previous = position
+    if in_name:
+        score += 20
+    return score - len(path) // 16
+
+
+def _best_span(query, lower, start):
+    """Positions of the shortest left-most window of ``lower[start:]`` containing ``query`` in order."""
+    # Forward pass finds where the first full match ends
+    position = start - 1
+    for c in query:
+        position = lower.find(c, position + 1)
+        if position == -1:
+            return None
+    end = position
+
+    # Backward pass from that end finds the latest possible start
+    positions = []
+    position = end + 1
+    for c in reversed(query):
+        position = lower.rfind(c, start, position)
+        positions.append(position)
+    positions.reverse()
+
+    # Then take the earliest positions inside that window, which keeps consecutive runs together
+    window_start = positions[0]
+    result = []
+    position = window_start - 1
+    for c in query:
+        position = lower.find(c, position + 1, end + 1)
+        result.append(position)
+    return result
+
+
+_searches = weakref.WeakKeyDictionary()
+_searches_lock = Lock()
+
+
+def get_file_search(index):
+    """FileSearch bound to a FileIndex, created on first use."""
+    with _searches_lock:
+        search = _searches.get(index)
+        if search is None:
+            search = FileSearch(index)
+            _searches[index] = search
+        return search
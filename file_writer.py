@@ -0,0 +1,107 @@
+import hashlib
+import os
+import tempfile
+
+
+class WriteConflict(Exception):
+    """A write precondition failed: the file changed since the client read it."""
+
+
+def content_hash(data):
+    """SHA-256 hex digest of bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def encode_text(content):
+    """Bytes for ``content`` as text mode would write them (UTF-8, platform line endings)."""
+    if os.linesep != '\n':
+        content = content.replace('\n', os.linesep)
+    return content.encode('utf-8')
+
+
+def file_version(path, with_hash=True):
+    """(mtime_ns, sha256) of a file, or (None, None) if it does not exist.
+
+    With ``with_hash=False`` the file is only stat'ed and the hash is None.
+    """
+    if not with_hash:
+        try:
+            return os.stat(path).st_mtime_ns, None
+        except FileNotFoundError:
+            return None, None
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+    except FileNotFoundError:
+        return None, None
+    return mtime, content_hash(data)
+
+
+def check_precondition(path, expected_mtime=None, expected_hash=None):
+    """Raise WriteConflict unless the file on disk still matches what the client last saw.
+
+    ``expected_mtime`` is the mtime in nanoseconds; an ``expected_hash`` of "" means
+    the file must not exist yet.
+    """
+    if expected_mtime is None and expected_hash is None:
+        return
+    mtime, digest = file_version(path, with_hash=expected_hash is not None)
+    if expected_hash is not None and (digest or "") != expected_hash:
+        raise WriteConflict("content changed on disk" if digest else "file was deleted")
+    if expected_mtime is not None and mtime != int(expected_mtime):
+        raise WriteConflict("modified on disk since it was read" if mtime else "file was deleted")
+
+
+def atomic_write(path, data):
+    """Replace ``path`` with ``data`` via a synced temp file and rename, so readers never see half a file.
+
+    A symlinked ``path`` writes through to the file it points to and keeps the link,
+    and the file keeps its permissions. A file with other hard links is rewritten in
+    place instead, since a rename would detach it from them.
+    Returns False without touching the file when it already holds exactly ``data``.
+    """
+    path = os.path.realpath(path)
+    try:
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size == len(data) and f.read() == data:
+                return False
+        mode = stat.st_mode & 0o7777
+    except FileNotFoundError:
+        mode = None
+    else:
+        if stat.st_nlink > 1:
+            with open(path, 'r+b') as f:
+                f.write(data)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            return True
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    # Persist the rename itself; directories cannot be opened for this on Windows
+    if os.name != 'nt':
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return True
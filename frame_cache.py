@@ -0,0 +1,36 @@
+from threading import Lock
+
+
+class EncodedFrameCache:
+    """Holds encoded bytes for the current frame generation, one entry per set of encode parameters."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.generation = None
+        self.entries = {}
+        self.encodes = 0
+        self.hits = 0
+
+    def lookup(self, generation, key):
+        """Return cached bytes for a generation and encode key, or None if not encoded yet."""
+        with self.lock:
+            if generation != self.generation:
+                return None
+            data = self.entries.get(key)
+            if data is not None:
+                self.hits += 1
+            return data
+
+    def store(self, generation, key, data):
+        """Store encoded bytes, dropping every entry that belongs to an older generation."""
+        with self.lock:
+            if generation != self.generation:
+                self.generation = generation
+                self.entries = {}
+            self.entries[key] = data
+            self.encodes += 1
+            return data
+
+    def get_stats(self):
+        with self.lock:
+            return {"encodes": self.encodes, "hits": self.hits, "formats_cached": len(self.entries)}
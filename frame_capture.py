@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+
+
+class TiledFrameCapture:
+    """Composes captured screens into a preallocated BGR frame, reprocessing only changed tiles."""
+
+    def __init__(self, max_size=(1920, 1080), tile_size=(240, 135)):
+        self.max_size = max_size
+        self.tile_size = tile_size  # Tile size in output pixels (width, height)
+
+        # Buffers are allocated lazily for the first frame and whenever the screen size changes
+        self.source_shape = None
+        self.frame = None        # Composed BGR output frame
+        self.previous = None     # Last raw BGRA capture, used to find changed tiles
+        self.tiles = []          # (source slice, output slice) pairs
+        self.scratch = {}        # BGR scratch buffers for scaled tiles, keyed by shape
+        self.scaled = False
+
+        self.frames_processed = 0
+        self.tiles_processed = 0
+        self.last_dirty_tiles = 0
+
+    def _allocate(self, shape):
+        """Allocate buffers and compute the tile layout for a source of the given shape."""
+        height, width = shape[:2]
+        scale = 1.0
+        if width > self.max_size[0] or height > self.max_size[1]:
+            scale = min(self.max_size[0] / width, self.max_size[1] / height)
+        out_width, out_height = int(width * scale), int(height * scale)
+
+        self.source_shape = shape
+        self.scaled = scale != 1.0
+        self.frame = np.zeros((out_height, out_width, 3), dtype=np.uint8)
+        self.previous = np.zeros(shape, dtype=np.uint8)
+        self.scratch = {}
+
+        # Tiles are laid out in output coordinates and mapped back onto the source
+        self.tiles = []
+        tile_w, tile_h = self.tile_size
+        for y0 in range(0, out_height, tile_h):
+            y1 = min(y0 + tile_h, out_height)
+            for x0 in range(0, out_width, tile_w):
+                x1 = min(x0 + tile_w, out_width)
+                src = (slice(round(y0 / scale), min(round(y1 / scale), height)),
+                       slice(round(x0 / scale), min(round(x1 / scale), width)))
+                dst = (slice(y0, y1), slice(x0, x1))
+                self.tiles.append((src, dst))
+
+    def update(self, raw):
+        """Fold a raw BGRA capture into the composed frame.
+
+        Returns the number of tiles that changed. The composed frame is updated in
+        place, so callers sharing ``self.frame`` must synchronise around this call.
+        """
+        if raw.shape != self.source_shape:
+            self._allocate(raw.shape)
+            force = True
+        else:
+            force = False
+
+        dirty = 0
+        for src, dst in self.tiles:
+            src_tile = raw[src]
+            prev_tile = self.previous[src]
+            if not force and cv2.norm(src_tile, prev_tile, cv2.NORM_INF) == 0:
+                continue
+
+            np.copyto(prev_tile, src_tile)
+            out_tile = self.frame[dst]
+            if self.scaled:
+                # Convert first so the resize only touches three channels
+                bgr = self.scratch.get(src_tile.shape[:2])
+                if bgr is None:
+                    bgr = np.empty(src_tile.shape[:2] + (3,), dtype=np.uint8)
+                    self.scratch[src_tile.shape[:2]] = bgr
+                cv2.cvtColor(src_tile, cv2.COLOR_BGRA2BGR, dst=bgr)
+                cv2.resize(bgr, (out_tile.shape[1], out_tile.shape[0]), dst=out_tile,
+                           interpolation=cv2.INTER_AREA)
+            else:
+                cv2.cvtColor(src_tile, cv2.COLOR_BGRA2BGR, dst=out_tile)
+            dirty += 1
+
+        self.frames_processed += 1
+        self.tiles_processed += dirty
+        self.last_dirty_tiles = dirty
+        return dirty
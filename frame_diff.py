@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+
+class FrameChangeDetector:
+    """Perceptual diff between captured frames using downscaled grayscale fingerprints."""
+
+    def __init__(self, fingerprint_size=(96, 54), grid=(8, 6), pixel_threshold=18,
+                 region_threshold=0.01, min_dirty_regions=1):
+        # Fingerprint resolution (width, height) and region grid (columns, rows)
+        self.fingerprint_size = fingerprint_size
+        self.grid = grid
+        # A fingerprint pixel counts as changed when its gray level moves by more than this
+        self.pixel_threshold = pixel_threshold
+        # A region is dirty when this fraction of its pixels changed
+        self.region_threshold = region_threshold
+        # The frame is considered changed when at least this many regions are dirty
+        self.min_dirty_regions = min_dirty_regions
+
+        self.reference = None
+        self.last_dirty_map = None
+        self.last_score = 0.0
+
+    def fingerprint(self, frame):
+        """Return a small grayscale fingerprint of a BGR/BGRA frame."""
+        if frame.ndim == 3:
+            code = cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+            frame = cv2.cvtColor(frame, code)
+        return cv2.resize(frame, self.fingerprint_size, interpolation=cv2.INTER_AREA)
+
+    def dirty_map(self, fingerprint, reference):
+        """Return a (rows, cols) boolean map of regions that differ between two fingerprints."""
+        cols, rows = self.grid
+        height, width = fingerprint.shape
+        changed = cv2.absdiff(fingerprint, reference) > self.pixel_threshold
+
+        # Trim so the fingerprint splits evenly into the grid, then average per region
+        cell_h, cell_w = height // rows, width // cols
+        changed = changed[:cell_h * rows, :cell_w * cols]
+        ratios = changed.reshape(rows, cell_h, cols, cell_w).mean(axis=(1, 3))
+        return ratios > self.region_threshold
+
+    def has_changed(self, frame):
+        """Check a frame against the last accepted reference without updating it."""
+        fingerprint = self.fingerprint(frame)
+        if self.reference is None:
+            cols, rows = self.grid
+            self.last_dirty_map = np.ones((rows, cols), dtype=bool)
+            self.last_score = 1.0
+            return True, fingerprint
+
+        dirty = self.dirty_map(fingerprint, self.reference)
+        self.last_dirty_map = dirty
+        self.last_score = float(dirty.mean())
+        return int(dirty.sum()) >= self.min_dirty_regions, fingerprint
+
+    def accept(self, fingerprint):
+        """Make a fingerprint the reference that later frames are compared against."""
+        self.reference = fingerprint
+
+    def reset(self):
+        """Forget the reference so the next frame always counts as changed."""
+        self.reference = None
+        self.last_dirty_map = None
+        self.last_score = 0.0
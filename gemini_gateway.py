@@ -0,0 +1,270 @@
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+from threading import Condition, Event, Lock
+
+from adaptive_scheduler import is_rate_limit_error
+from analysis_engine import percentile
+
+# Lower numbers get rate-limit tokens first
+PRIORITY_INTERACTIVE = 0  # The user is waiting: autocomplete, analyze, live talk
+PRIORITY_BACKGROUND = 1   # Vision commentary
+
+DEFAULT_RPM = float(os.getenv("CODIFY_GEMINI_RPM", "60"))  # Requests per minute per model
+MAX_RETRIES = 4
+BACKGROUND_RETRIES = 1     # The vision loop samples a newer frame soon anyway
+BACKOFF_BASE = 0.5         # Seconds; doubles on every retry
+BACKOFF_CAP = 8.0
+WAIT_TIMEOUT = 60.0        # Longest a call waits for a rate-limit token
+LATENCY_SAMPLES = 500
+
+
+class GatewayTimeout(RuntimeError):
+    """No rate-limit token became available in time."""
+
+
+def error_code(error):
+    """HTTP status of an SDK (google.api_core) exception, or None."""
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_quota_error(error):
+    code = error_code(error)
+    return code == 429 if code is not None else is_rate_limit_error(error)
+
+
+def is_transient_error(error):
+    """Whether a failed call is worth retrying: quota errors and server-side failures."""
+    code = error_code(error)
+    if code is not None:
+        return code == 429 or code >= 500
+    if is_rate_limit_error(error):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in (
+        "internalservererror", "internal error", "serviceunavailable", "service unavailable",
+        "deadline exceeded", "deadlineexceeded", "connection reset", "connectionerror"))
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff, so clients that failed together do not retry together."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Requests-per-minute limiter that hands out tokens by priority, then arrival order.
+
+    ``pause`` stops all callers for a while, e.g. after the server reported a quota
+    error, so they back off together instead of each finding out on its own.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_RPM, burst=None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst or max(1.0, requests_per_minute / 60)  # At most a second's worth at once
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.condition = Condition()
+        self.waiters = []  # Heap of (priority, arrival)
+        self.arrivals = itertools.count()
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=WAIT_TIMEOUT):
+        """Take one token, waiting behind higher-priority callers; returns seconds waited."""
+        started = time.monotonic()
+        ticket = (priority, next(self.arrivals))
+        with self.condition:
+            heapq.heappush(self.waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self.waiters[0] == ticket and now >= self.paused_until and self.tokens >= 1:
+                        heapq.heappop(self.waiters)
+                        self.tokens -= 1
+                        self.condition.notify_all()
+                        return now - started
+                    remaining = timeout - (now - started)
+                    if remaining <= 0:
+                        raise GatewayTimeout("Timed out waiting for the Gemini rate limit")
+                    if self.waiters[0] == ticket:
+                        wait = max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.001)
+                    else:
+                        wait = remaining  # Woken when the callers ahead are served
+                    self.condition.wait(min(wait, remaining))
+            except BaseException:
+                if ticket in self.waiters:
+                    self.waiters.remove(ticket)
+                    heapq.heapify(self.waiters)
+                    self.condition.notify_all()
+                raise
+
+    def pause(self, seconds):
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class _Flight:
+    """An in-flight call that identical calls wait on instead of repeating it."""
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class GeminiGateway:
+    """The one path every Gemini call takes.
+
+    Per model: a token bucket holds calls to the configured requests per minute,
+    interactive calls ahead of background ones. Quota and server errors are retried
+    with jittered exponential backoff; a quota error also pauses that model's bucket
+    for everyone. Identical calls (same ``key``) made while one is in flight share
+    its result instead of reaching the server again.
+    """
+
+    def __init__(self, rate_limits=None, default_rpm=DEFAULT_RPM, max_retries=MAX_RETRIES,
+                 background_retries=BACKGROUND_RETRIES, sleep=time.sleep):
+        self.rate_limits = rate_limits or {}  # model name -> requests per minute
+        self.default_rpm = default_rpm
+        self.max_retries = max_retries
+        self.background_retries = background_retries
+        self.sleep = sleep
+        self.lock = Lock()
+        self.buckets = {}
+        self.flights = {}  # key -> _Flight
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.failures = 0
+        self.coalesced = 0
+        self.queue_waits = {PRIORITY_INTERACTIVE: deque(maxlen=LATENCY_SAMPLES),
+                            PRIORITY_BACKGROUND: deque(maxlen=LATENCY_SAMPLES)}
+
+    def bucket(self, model_name):
+        with self.lock:
+            bucket = self.buckets.get(model_name)
+            if bucket is None:
+                bucket = TokenBucket(self.rate_limits.get(model_name, self.default_rpm))
+                self.buckets[model_name] = bucket
+            return bucket
+
+    def call(self, model_name, fn, priority=PRIORITY_INTERACTIVE, key=None):
+        """Run ``fn()`` against ``model_name`` under the rate limit, with retries.
+
+        Calls passing the same ``key`` while one of them is in flight get that call's
+        result (or exception). Pass no key for calls that must not be shared, such as
+        streams.
+        """
+        with self.lock:
+            self.calls += 1
+            flight = self.flights.get(key) if key is not None else None
+            if flight is not None:
+                flight.followers += 1
+                self.coalesced += 1
+            elif key is not None:
+                self.flights[key] = _Flight()
+        if flight is not None:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        result, error = None, None
+        try:
+            result = self._call_with_retries(model_name, fn, priority)
+        except Exception as e:
+            error = e
+            raise
+        except BaseException:
+            # e.g. KeyboardInterrupt in the leader; its followers get an ordinary error
+            error = RuntimeError("The shared Gemini call was interrupted")
+            raise
+        finally:
+            self._land(key, result=result, error=error)  # Followers must never be left waiting
+        return result
+
+    def get_stats(self):
+        with self.lock:
+            interactive = sorted(self.queue_waits[PRIORITY_INTERACTIVE])
+            background = sorted(self.queue_waits[PRIORITY_BACKGROUND])
+            return {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "server_errors": self.server_errors,
+                "failures": self.failures,
+                "coalesced": self.coalesced,
+                "in_flight_keys": len(self.flights),
+                "interactive_wait_p95_ms": round(percentile(interactive, 95) * 1000, 1) if interactive else None,
+                "background_wait_p95_ms": round(percentile(background, 95) * 1000, 1) if background else None,
+                "rate_limits": {name: round(bucket.rate * 60, 1) for name, bucket in self.buckets.items()},
+            }
+
+    def _call_with_retries(self, model_name, fn, priority):
+        bucket = self.bucket(model_name)
+        retries = self.max_retries if priority == PRIORITY_INTERACTIVE else self.background_retries
+        attempt = 0
+        while True:
+            waited = bucket.acquire(priority)
+            with self.lock:
+                self.attempts += 1
+                self.queue_waits[priority].append(waited)
+            try:
+                return fn()
+            except Exception as e:
+                rate_limited = is_quota_error(e)
+                transient = rate_limited or is_transient_error(e)
+                with self.lock:
+                    if rate_limited:
+                        self.rate_limited += 1
+                    elif transient:
+                        self.server_errors += 1
+                    if not transient or attempt >= retries:
+                        self.failures += 1
+                if not transient or attempt >= retries:
+                    raise
+                delay = backoff_delay(attempt)
+                attempt += 1
+                with self.lock:
+                    self.retries += 1
+                print(f"Gemini {model_name} call failed ({type(e).__name__}), retry {attempt} in {delay:.2f}s")
+                if rate_limited:
+                    bucket.pause(delay)  # The next acquire waits out the pause
+                else:
+                    self.sleep(delay)
+
+    def _land(self, key, result=None, error=None):
+        if key is None:
+            return
+        with self.lock:
+            flight = self.flights.pop(key)
+        flight.result = result
+        flight.error = error
+        flight.done.set()
+
+
+_gateway = None
+_gateway_lock = Lock()
+
+
+def get_gemini_gateway():
+    """Shared GeminiGateway, CODIFY_GEMINI_RPM requests per minute for each model."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = GeminiGateway()
+        return _gateway
@@ -0,0 +1,132 @@
+import json
+
+
+class IncrementalJSONParser:
+    """Parses a JSON object as it streams in, reporting members as soon as each one is complete.
+
+    ``feed`` scans only the newly received text and returns a list of ``(path, value)``
+    events: ``(key,)`` when a member of the root object completes, and ``(key, index)``
+    when an element of an array member completes. Anything before the root ``{``
+    (such as a markdown code fence) is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.stack = []          # Open containers, innermost last
+        self.in_string = False
+        self.escape = False
+        self.token_start = None  # Start of the string or scalar being scanned
+        self.values = {}         # Completed members of the root object
+        self.done = False
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return the events it completed."""
+        events = []
+        if self.done or not chunk:
+            return events
+        self.text += chunk
+        text = self.text
+
+        i = self.pos
+        while i < len(text) and not self.done:
+            c = text[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    self._end_string(i + 1, events)
+                i += 1
+                continue
+
+            if not self.stack:
+                # Skip everything until the root object starts
+                if c == '{':
+                    self.stack.append(self._frame('{'))
+                i += 1
+                continue
+
+            frame = self.stack[-1]
+            if self.token_start is not None and c in ' \t\r\n,}]':
+                # A number or literal ends at whitespace or a delimiter
+                self._end_value(frame, self.token_start, i, events)
+                self.token_start = None
+
+            if c in ' \t\r\n':
+                pass
+            elif c == '"':
+                self.in_string = True
+                self.token_start = i
+                if frame['state'] == 'value':
+                    frame['value_start'] = i
+            elif c in '{[':
+                if frame['state'] == 'value':
+                    frame['value_start'] = i
+                self.stack.append(self._frame(c))
+            elif c in '}]':
+                self.stack.pop()
+                if not self.stack:
+                    self.done = True
+                else:
+                    parent = self.stack[-1]
+                    self._end_value(parent, parent['value_start'], i + 1, events)
+            elif c == ':':
+                frame['state'] = 'value'
+            elif c == ',':
+                frame['state'] = 'key' if frame['kind'] == '{' else 'value'
+            elif frame['state'] == 'value' and self.token_start is None:
+                self.token_start = i
+                frame['value_start'] = i
+            i += 1
+
+        self.pos = i
+        return events
+
+    def get(self, key, default=None):
+        """Return a completed member of the root object."""
+        return self.values.get(key, default)
+
+    def _frame(self, kind):
+        return {
+            'kind': kind,
+            'state': 'key' if kind == '{' else 'value',
+            'key': None,
+            'value_start': None,
+            'index': 0,
+        }
+
+    def _end_string(self, end, events):
+        frame = self.stack[-1]
+        start = self.token_start
+        self.token_start = None
+        if frame['kind'] == '{' and frame['state'] == 'key':
+            frame['key'] = json.loads(self.text[start:end])
+            frame['state'] = 'colon'
+        else:
+            self._end_value(frame, start, end, events)
+
+    def _end_value(self, frame, start, end, events):
+        """Record a completed value inside ``frame`` and emit an event if it is watched."""
+        depth = len(self.stack)
+        frame['state'] = 'after'
+        index = frame['index']
+        frame['index'] += 1
+
+        if depth == 1:
+            path = (frame['key'],)
+        elif depth == 2 and self.stack[0]['kind'] == '{' and frame['kind'] == '[':
+            path = (self.stack[0]['key'], index)
+        else:
+            return
+
+        try:
+            value = json.loads(self.text[start:end])
+        except json.JSONDecodeError:
+            return
+        if depth == 1:
+            self.values[path[0]] = value
+        events.append((path, value))
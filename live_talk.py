@@ -0,0 +1,203 @@
+import itertools
+import re
+import time
+from collections import deque
+from threading import Thread, Lock, Event
+
+from analysis_engine import percentile
+from model_pool import cancel_response
+from speech_service import get_speech_service, PRIORITY_HIGH
+
+TALK_CHANNEL = "talk"
+MIN_SEGMENT_CHARS = 12    # Shorter sentences ("Sure.") are spoken together with the next one
+MAX_SEGMENT_CHARS = 200   # Longer runs without a sentence end are cut at a comma or space
+LATENCY_SAMPLES = 200
+
+LIVE_PROMPT = ("You are Codify agent user is talking to you live, below is his attached message.\n"
+               "reply briefly as if you are talking to him live. Do not format your response,"
+               "only return brief response that is very appropriate for speaking.\n\n User Query:")
+
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+
+
+class SentenceSplitter:
+    """Cuts streamed text into sentence-sized segments that can be spoken on their own."""
+
+    def __init__(self, min_chars=MIN_SEGMENT_CHARS, max_chars=MAX_SEGMENT_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        """Add streamed text; returns the segments it completed."""
+        self.buffer += text
+        segments = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            if len(self.buffer[start:match.start()].strip()) >= self.min_chars:
+                segments.append(self.buffer[start:match.end()].strip())
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        while len(self.buffer) > self.max_chars:
+            cut = max(self.buffer.rfind(', ', 0, self.max_chars), self.buffer.rfind(' ', 0, self.max_chars))
+            cut = cut + 1 if cut > 0 else self.max_chars
+            segments.append(self.buffer[:cut].strip())
+            self.buffer = self.buffer[cut:]
+        return [segment for segment in segments if segment]
+
+    def flush(self):
+        """The rest of the text once the stream has ended, or None."""
+        rest, self.buffer = self.buffer.strip(), ""
+        return rest or None
+
+
+class LiveTalk:
+    """Live voice conversation: one streamed model call per turn, spoken as it is written.
+
+    ``start_turn`` returns at once. A worker thread streams the reply, and every
+    finished sentence is queued for speech and reported through the turn's
+    ``on_event`` (or the instance's) as {"turn_id", "type": "segment"|"done"|"error", ...}.
+    A failed turn speaks its error message instead. A new turn or ``reset``
+    stops the one in progress, both its stream and its speech. The conversation
+    history keeps whatever the interrupted reply had said so far.
+    """
+
+    def __init__(self, model_getter, speech=None):
+        self.model_getter = model_getter  # () -> model for the chat purpose
+        self.speech = speech
+        self.on_event = None
+        self.lock = Lock()
+        self.history = []   # Contents of earlier turns: {"role": "user"|"model", "parts": [text]}
+        self.turn_ids = itertools.count(1)
+        self.current = None  # (turn id, stop Event) of the turn in progress
+        self.generation = 0  # Bumped by reset, so a stopped turn does not write into the new history
+        self.turns = 0
+        self.interrupted = 0
+        self.errors = 0
+        self.first_segment_latencies = deque(maxlen=LATENCY_SAMPLES)  # Request to first segment queued
+        self.first_messages = deque(maxlen=LATENCY_SAMPLES)  # (started, SpeechMessage) of each first segment
+
+    def start_turn(self, message, on_event=None):
+        """Answer ``message`` in the background; returns the turn id events will carry.
+
+        ``on_event`` receives this turn's events, e.g. to send them only to the client that asked.
+        """
+        started = time.perf_counter()
+        stop = Event()
+        with self.lock:
+            self._stop_current()
+            turn_id = next(self.turn_ids)
+            self.current = (turn_id, stop)
+            self.turns += 1
+            history = list(self.history)
+            generation = self.generation
+        worker = Thread(target=self._run_turn, args=(turn_id, message, history, generation, stop, started,
+                                                      on_event or self.on_event))
+        worker.daemon = True
+        worker.start()
+        return turn_id
+
+    def reset(self):
+        """Stop the current turn and forget the conversation."""
+        with self.lock:
+            self._stop_current()
+            self.history = []
+            self.generation += 1
+
+    def get_stats(self):
+        with self.lock:
+            first_segment = sorted(self.first_segment_latencies)
+            first_audio = sorted(spoken.first_audio_at - started for started, spoken in self.first_messages
+                                 if spoken.first_audio_at is not None)
+            return {
+                "turns": self.turns,
+                "interrupted": self.interrupted,
+                "errors": self.errors,
+                "history_messages": len(self.history),
+                "first_segment_p50_ms": self._ms(percentile(first_segment, 50)),
+                "first_segment_p95_ms": self._ms(percentile(first_segment, 95)),
+                "first_audio_p50_ms": self._ms(percentile(first_audio, 50)),
+                "first_audio_p95_ms": self._ms(percentile(first_audio, 95)),
+            }
+
+    @staticmethod
+    def _ms(seconds):
+        return round(seconds * 1000, 1) if seconds is not None else None
+
+    def _stop_current(self):
+        if self.current is not None and not self.current[1].is_set():
+            self.current[1].set()
+            self.interrupted += 1
+        self.current = None
+        self._speech().interrupt(channel=TALK_CHANNEL)
+
+    def _speech(self):
+        if self.speech is None:
+            self.speech = get_speech_service()
+        return self.speech
+
+    def _emit(self, on_event, event):
+        if on_event:
+            try:
+                on_event(event)
+            except Exception as e:
+                print(f"Live talk event error: {e}")
+
+    def _run_turn(self, turn_id, message, history, generation, stop, started, on_event):
+        splitter = SentenceSplitter()
+        segments = []
+        first_segment_ms = None
+        started_wall = time.time() - (time.perf_counter() - started)  # SpeechMessage times are wall-clock
+
+        def say(segment):
+            nonlocal first_segment_ms
+            if stop.is_set():
+                return
+            # The first segment interrupts lower-priority speech (vision); the rest queue behind it
+            spoken = self._speech().speak(segment, priority=PRIORITY_HIGH, channel=TALK_CHANNEL,
+                                          preempt=not segments, coalesce=False)
+            if not segments:
+                first_segment_ms = round((time.perf_counter() - started) * 1000, 1)
+                with self.lock:
+                    self.first_segment_latencies.append(time.perf_counter() - started)
+                    self.first_messages.append((started_wall, spoken))
+            segments.append(segment)
+            self._emit(on_event, {"turn_id": turn_id, "type": "segment", "index": len(segments) - 1, "text": segment})
+
+        user_content = {"role": "user", "parts": [LIVE_PROMPT + message]}
+        response = None
+        try:
+            response = self.model_getter().generate_content(history + [user_content], stream=True)
+            for chunk in response:
+                if stop.is_set():
+                    break
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # A chunk without text (e.g. only safety ratings)
+                for segment in splitter.feed(text or ""):
+                    say(segment)
+            else:
+                rest = splitter.flush()
+                if rest:
+                    say(rest)
+        except Exception as e:
+            print(f"Live talk error: {e}")
+            with self.lock:
+                self.errors += 1
+            error = f"Error communicating with Gemini: {str(e)}"
+            if not stop.is_set():
+                self._speech().speak(error, priority=PRIORITY_HIGH, channel=TALK_CHANNEL,
+                                     preempt=not segments, coalesce=False)
+            self._emit(on_event, {"turn_id": turn_id, "type": "error", "message": error})
+            return
+        finally:
+            if response is not None:
+                cancel_response(response)  # Stops an interrupted stream and frees its slot
+            with self.lock:
+                if segments and generation == self.generation:
+                    self.history += [user_content, {"role": "model", "parts": [" ".join(segments)]}]
+                if self.current is not None and self.current[0] == turn_id:
+                    self.current = None
+        self._emit(on_event, {"turn_id": turn_id, "type": "done", "text": " ".join(segments),
+                    "interrupted": stop.is_set(), "first_segment_ms": first_segment_ms})
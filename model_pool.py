@@ -0,0 +1,300 @@
+import hashlib
+import os
+from threading import BoundedSemaphore, Lock
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+
+from gemini_gateway import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, get_gemini_gateway
+from response_cache import cache_key
+
+SLOT_TIMEOUT = 60.0  # Seconds a call waits for a free slot before giving up
+
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+]
+
+# What each part of the app talks to, how many calls of that kind may run at once,
+# and whether the user is waiting on them (see gemini_gateway)
+PURPOSES = {
+    "analyze": {"model_name": "gemini-2.0-pro-exp-02-05", "max_concurrent": 3, "priority": PRIORITY_INTERACTIVE},
+    "autocomplete": {"model_name": "gemini-2.0-flash-lite", "max_concurrent": 4, "priority": PRIORITY_INTERACTIVE},
+    "chat": {
+        "model_name": "gemini-2.5-pro-exp-03-25",
+        "max_concurrent": 2,
+        "priority": PRIORITY_INTERACTIVE,
+        "generation_config": {"temperature": 0.7, "top_p": 0.95, "top_k": 40, "max_output_tokens": 65536},
+    },
+    "vision": {
+        "model_name": "gemini-2.0-flash-exp",
+        "max_concurrent": 1,
+        "priority": PRIORITY_BACKGROUND,
+        "generation_config": {
+            "temperature": 0.3,
+            "top_p": 0.9,
+            "top_k": 32,
+            "max_output_tokens": 2048,
+            "response_mime_type": "application/json",
+        },
+        "safety_settings": SAFETY_SETTINGS,
+    },
+}
+
+
+class ModelBusyError(RuntimeError):
+    """No concurrency slot for the purpose became free in time."""
+
+
+_configure_lock = Lock()
+
+
+def create_model(spec, api_key):
+    """A GenerativeModel bound to its own client for ``api_key``.
+
+    genai.configure is process-wide, so it only runs under a lock, and the client it
+    creates is attached to the model right away; later configure calls for other
+    keys no longer affect it. GenerativeModel has no public way to take a client, so
+    this sets its private ``_client``, which is why requirements.txt pins
+    google-generativeai==0.8.6; check this function when upgrading.
+
+    Set GEMINI_API_ENDPOINT (e.g. http://127.0.0.1:8000) to talk to a local fake
+    server over REST instead of the real API.
+    """
+    endpoint = os.getenv("GEMINI_API_ENDPOINT")
+    options = {"transport": "rest", "client_options": {"api_endpoint": endpoint}} if endpoint else {}
+    with _configure_lock:
+        genai.configure(api_key=api_key, **options)
+        model = genai.GenerativeModel(model_name=spec["model_name"],
+                                      generation_config=spec.get("generation_config"),
+                                      safety_settings=spec.get("safety_settings"))
+        model._client = genai_client.get_default_generative_client()
+    return model
+
+
+def cancel_response(response):
+    """Best-effort cancel of a streaming generate_content call we no longer need.
+
+    google-generativeai has no public way to stop a stream: its response keeps the
+    transport iterator (gRPC or REST, both with ``cancel()``) in the private
+    ``_iterator``. When an SDK version lacks it, we can only stop reading.
+    Responses from PooledModel also give back their concurrency slot.
+    """
+    if isinstance(response, _StreamLease):
+        response.close()
+        return
+    iterator = getattr(response, "_iterator", None)
+    cancel = getattr(iterator, "cancel", None)
+    if not callable(cancel):
+        if getattr(response, "gi_running", False):
+            return  # A plain generator in use by another thread cannot be closed; it is only abandoned
+        cancel = getattr(response, "close", None)  # Plain generators (fake models in benchmarks)
+    if not callable(cancel):
+        print(f"Cannot cancel {type(response).__name__}: no _iterator.cancel, the stream is only abandoned")
+        return
+    try:
+        cancel()
+    except Exception as e:
+        print(f"Cancelling a model stream failed: {e}")
+
+
+def cancel_when_done(future):
+    """Done-callback for a generate_content future nobody waits for any more: cancel
+    the stream it returns, so the call's concurrency slot comes back."""
+    if not future.cancelled() and future.exception() is None:
+        cancel_response(future.result())
+
+
+def key_id(api_key):
+    """Short fingerprint of an API key, so the key itself never shows up in stats or logs."""
+    return hashlib.sha256((api_key or "").encode('utf-8')).hexdigest()[:12]
+
+
+class _StreamLease:
+    """A streamed response that keeps its concurrency slot until it is read to the end,
+    fails, or is closed; readers that stop early must call ``close`` (or cancel_response)."""
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+        self._finished = False
+
+    def __iter__(self):
+        try:
+            for chunk in self._response:
+                yield chunk
+        except Exception:
+            self.close()
+            raise
+        self._finished = True
+        self._release()
+
+    def close(self):
+        """Cancel the stream if it is still running and give back the slot; safe to call again."""
+        if not self._finished:
+            self._finished = True
+            cancel_response(self._response)
+        self._release()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class PooledModel:
+    """A shared model whose generate_content calls go through the gateway and count
+    against its purpose's concurrency limit."""
+
+    def __init__(self, model, pool, purpose, key_fingerprint=""):
+        self.model = model
+        self.pool = pool
+        self.purpose = purpose
+        self.key_fingerprint = key_fingerprint
+
+    @property
+    def model_name(self):
+        return self.model.model_name
+
+    def generate_content(self, *args, **kwargs):
+        stream = kwargs.get("stream", False)
+        # Identical one-shot calls share one response; a stream can only be read by one caller
+        key = None if stream else cache_key(model=self.model_name, api_key=self.key_fingerprint, args=args, kwargs=kwargs)
+        return self.pool.run(self.purpose, lambda: self._attempt(args, kwargs, stream), key=key)
+
+    def _attempt(self, args, kwargs, stream):
+        release = self.pool.acquire_slot(self.purpose)
+        try:
+            response = self.model.generate_content(*args, **kwargs)
+        except Exception:
+            release()
+            raise
+        if not stream:
+            release()
+            return response
+        return _StreamLease(response, release)
+
+
+class ModelPool:
+    """Model clients keyed by purpose and API key, created on first use and then shared.
+
+    Nothing mutates a client after it is created, so concurrent requests can use the
+    same one. Calls pass through the gateway (rate limit, retries, coalescing), then
+    take one of their purpose's concurrency slots for each attempt; waiting more than
+    SLOT_TIMEOUT for a slot raises ModelBusyError.
+    """
+
+    def __init__(self, purposes=PURPOSES, model_factory=create_model, slot_timeout=SLOT_TIMEOUT, gateway=None):
+        self.purposes = purposes
+        self.model_factory = model_factory
+        self.gateway = gateway
+        self.slot_timeout = slot_timeout
+        self.lock = Lock()
+        self.default_api_key = None
+        self.models = {}     # (purpose, key_id) -> PooledModel
+        self.creating = {}   # (purpose, key_id) -> Lock held while that client is being created
+        self.slots = {purpose: BoundedSemaphore(spec["max_concurrent"]) for purpose, spec in purposes.items()}
+        self.in_flight = {purpose: 0 for purpose in purposes}
+        self.peak_in_flight = {purpose: 0 for purpose in purposes}
+        self.created = 0
+        self.reused = 0
+        self.waited = 0
+        self.busy = 0
+
+    def set_default_key(self, api_key):
+        """Key used when a caller does not pass one, e.g. from background threads."""
+        with self.lock:
+            self.default_api_key = api_key
+
+    def get(self, purpose, api_key=None):
+        """The shared model for ``purpose`` and ``api_key`` (default key when None)."""
+        if purpose not in self.purposes:
+            raise ValueError(f"Unknown model purpose: {purpose}")
+        with self.lock:
+            api_key = api_key or self.default_api_key
+            if not api_key:
+                raise ValueError("Gemini API not configured properly")
+            key = (purpose, key_id(api_key))
+            model = self.models.get(key)
+            if model is not None:
+                self.reused += 1
+                return model
+            creating = self.creating.setdefault(key, Lock())
+        # Only one thread creates a given client; the others wait for it instead of making their own
+        with creating:
+            with self.lock:
+                model = self.models.get(key)
+                if model is not None:
+                    self.reused += 1
+                    return model
+            try:
+                model = PooledModel(self.model_factory(self.purposes[purpose], api_key), self, purpose, key[1])
+            except Exception:
+                with self.lock:
+                    self.creating.pop(key, None)
+                raise
+            with self.lock:
+                self.models[key] = model
+                self.creating.pop(key, None)
+                self.created += 1
+            return model
+
+    def acquire_slot(self, purpose):
+        """Take a concurrency slot for ``purpose``; returns the function that gives it back."""
+        slots = self.slots[purpose]
+        if not slots.acquire(blocking=False):
+            with self.lock:
+                self.waited += 1
+            if not slots.acquire(timeout=self.slot_timeout):
+                with self.lock:
+                    self.busy += 1
+                raise ModelBusyError(f"Too many {purpose} requests in progress")
+        with self.lock:
+            self.in_flight[purpose] += 1
+            self.peak_in_flight[purpose] = max(self.peak_in_flight[purpose], self.in_flight[purpose])
+        released = []
+
+        def release():
+            with self.lock:
+                if released:
+                    return
+                released.append(True)
+                self.in_flight[purpose] -= 1
+            slots.release()
+        return release
+
+    def run(self, purpose, attempt, key=None):
+        """Run ``attempt()`` through the gateway, at the rate limit and priority of ``purpose``'s model."""
+        if self.gateway is None:
+            return attempt()
+        spec = self.purposes[purpose]
+        return self.gateway.call(spec["model_name"], attempt, priority=spec.get("priority", PRIORITY_INTERACTIVE),
+                                 key=key)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "clients": len(self.models),
+                "api_keys": len({key[1] for key in self.models}),
+                "created": self.created,
+                "reused": self.reused,
+                "waited_for_slot": self.waited,
+                "busy": self.busy,
+                "in_flight": dict(self.in_flight),
+                "peak_in_flight": dict(self.peak_in_flight),
+                "limits": {purpose: spec["max_concurrent"] for purpose, spec in self.purposes.items()},
+            }
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_model_pool():
+    """Shared ModelPool on the shared gateway, with GEMINI_API_KEY from the environment as its default key."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ModelPool(gateway=get_gemini_gateway())
+            _pool.set_default_key(os.getenv("GEMINI_API_KEY"))
+        return _pool
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from file_writer import atomic_write
+
+DEFAULT_CACHE_DIR = os.getenv("CODIFY_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".codify_cache"))
+DEFAULT_MAX_BYTES = int(os.getenv("CODIFY_CACHE_MB", "200")) * 1024 * 1024
+DEFAULT_TTL = float(os.getenv("CODIFY_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def cache_key(**parts):
+    """Stable hash of everything a model response depends on (model, config, template version, inputs)."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def file_hashes(project_path, paths):
+    """{path: sha256} of project files, so a cache key changes whenever one of them does."""
+    hashes = {}
+    for path in paths:
+        full_path = os.path.join(project_path, path)
+        try:
+            with open(full_path, 'rb') as f:
+                hashes[path] = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            hashes[path] = None
+    return hashes
+
+
+class ResponseCache:
+    """Model responses on disk, one JSON file per key, evicted by TTL and least recent use.
+
+    Keys are content hashes, so the same inputs give the same entry for every session
+    and every process sharing the folder. Entries are written atomically, and an
+    entry another process has already evicted is treated as a miss.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = Lock()
+        self.entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0  # Model latency the hits did not have to wait for
+        self.saved_tokens = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def get(self, key):
+        """The cached value for ``key``, or None."""
+        with self.lock:
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._forget(key)
+                self.misses += 1
+                return None
+            if time.time() - entry.get("created", 0) > self.ttl:
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            try:
+                os.utime(path)  # Recency survives restarts through the file mtime
+            except OSError:
+                pass
+            if key not in self.entries:
+                self._track(key, os.path.getsize(path))  # Stored by another process
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry.get("latency", 0)
+            self.saved_tokens += entry.get("tokens", 0)
+            return entry["value"]
+
+    def put(self, key, value, latency=0, tokens=0):
+        """Store ``value`` with the latency and tokens it cost, then evict down to the size cap."""
+        data = json.dumps({"created": time.time(), "latency": latency, "tokens": tokens, "value": value}).encode('utf-8')
+        with self.lock:
+            path = self._path(key)
+            try:
+                atomic_write(path, data)
+            except OSError as e:
+                print(f"Response cache write failed: {e}")
+                return
+            self._forget(key)
+            self._track(key, len(data))
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._remove(key)
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "saved_seconds": round(self.saved_seconds, 2),
+                "saved_tokens": self.saved_tokens,
+            }
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def _track(self, key, size):
+        self.entries[key] = size
+        self.total_bytes += size
+
+    def _forget(self, key):
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _remove(self, key):
+        self._forget(key)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _scan(self):
+        """Load the entries already on disk, oldest use first, dropping expired ones."""
+        found = []
+        now = time.time()
+        for folder, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.ttl:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                found.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(found):
+            self._track(key, size)
+
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_response_cache():
+    """Shared ResponseCache in CODIFY_CACHE_DIR (default ~/.codify_cache)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -1,16 +1,30 @@
 import time
 import base64
-from threading import Thread, Lock, Event
+from threading import Thread, Lock, Event, Condition
 import re
 import cv2
 import numpy as np
 import mss
 import mss.tools
-import google.generativeai as genai
 from flask import jsonify
 import json
-import pyttsx3
 import queue
+import itertools
+from collections import deque
+import asyncio
+import functools
+from frame_diff import FrameChangeDetector
+from frame_capture import TiledFrameCapture
+from frame_cache import EncodedFrameCache
+from json_stream import IncrementalJSONParser
+from analysis_engine import AnalysisEngine, percentile
+from adaptive_scheduler import AdaptiveScheduler
+from speech_service import get_speech_service, PRIORITY_LOW
+from model_pool import cancel_response, cancel_when_done, get_model_pool
+
+
+# Keys the UI needs from every vision analysis; once all are parsed the rest of the stream is dropped
+RESPONSE_KEYS = ("summary", "vison_stop_agent", "screen_voice")
 
 
 class ScreenAnalyzer:
@@ -19,61 +33,84 @@ class ScreenAnalyzer:
     def __init__(self, api_key):
         # Configuration with optimized performance
         self.frame_interval = 0.033  # ~30 FPS (1/30 = 0.033)
-        self.gemini_interval = 1.0   # Fetch Gemini responses every 1 second
         self.cooldown_period = 5.0   # Shorter cooldown
         self.voice_interval = 1   # More frequent voice feedback
 
         # Initialize state
         self.frame = None
         self.frame_lock = Lock()
+        self.frame_generation = 0  # Bumped whenever any tile of the captured frame changes
+        self.frame_condition = Condition(self.frame_lock)  # Notified on every new generation
+        self.frame_cache = EncodedFrameCache()
+        self.jpeg_quality = 80  # Shared by /stream and the analyzer so each frame is encoded once
         self.response_text = ""
+        self.response_json = None  # Parsed once in the analysis thread, served as-is by get_response
+        self.response_seq = 0      # Increases every time response_json changes
         self.response_lock = Lock()
+        self.on_response = None    # Optional callback(seq, response) fired for every new response
         self.streaming = False
         self.stop_flag = False
         self.last_stop_time = 0
         
         # Voice related variables
-        self.speech_queue = []
         self.speech_lock = Lock()
+        self.speech_condition = Condition(self.speech_lock)  # Wakes the voice thread for new text or shutdown
+        self.pending_speech = None  # (text, queued_at); only the newest unspoken message is kept
         self.speaking = False
+        self.speech_dropped = 0
+        self.speech_spoken = 0
+        self.speech_wait_times = deque(maxlen=200)  # Seconds a message waited before speaking
+        self.speech_durations = deque(maxlen=200)   # Seconds spent speaking each message
         self.last_voice_time = 0
         self.last_spoken_text = ""
         self.voice_thread = None
         self.voice_stop_event = Event()  # Added an event to signal thread termination
+        self.speech = get_speech_service()  # Shared with app.py; vision speech uses the "vision" channel
         self.debug_mode = False  # Enable debug mode to print voice info
         
         # Frame processing
         self.last_processed_frame_time = 0
-        self.frame_process_interval = 1.0  # Process frames every 1 second
+        self.frame_process_interval = 1.0  # Base sampling interval; the scheduler adapts around it
+
+        # Adaptive sampling: faster while the screen is busy, slower when idle, slow model or rate limited
+        self.requests_per_minute = 60
+        self.tokens_per_minute = 1000000
+        self.scheduler = AdaptiveScheduler(base_interval=self.frame_process_interval,
+                                           requests_per_minute=self.requests_per_minute,
+                                           tokens_per_minute=self.tokens_per_minute)
+
+        # Capture runs only as fast as the most demanding registered frame consumer
+        self.capture = TiledFrameCapture()
+        self.frame_consumers = {}
+        self.frame_consumers_lock = Lock()
+        self.frame_consumer_ids = itertools.count(1)
+        self.capture_wakeup = Event()
+
+        # Change detection: unchanged screens reuse the last response instead of calling Gemini
+        self.change_threshold = 0.01  # Fraction of a region's pixels that must change to mark it dirty
+        self.change_detector = FrameChangeDetector(region_threshold=self.change_threshold)
+        self.detector_lock = Lock()  # Guards change_detector and analysis_valid (sampling vs engine thread)
+        self.analysis_wakeup = Event()  # Set by stop_stream so the sampling thread does not sleep out its interval
+        self.stats_lock = Lock()
+        self.frames_sent = 0
+        self.frames_skipped = 0   # Unchanged frames; the last response stands for them
+        self.frames_deferred = 0  # Changed frames held back by the request or token budget
         
+        # Vision requests run on an asyncio engine: bounded concurrency, latest-wins, deadlines
+        self.max_requests_in_flight = 1
+        self.request_deadline = 30.0  # Seconds before an analysis request is abandoned
+        self.engine = AnalysisEngine(self._run_analysis, max_in_flight=self.max_requests_in_flight,
+                                     deadline=self.request_deadline, on_error=self._handle_analysis_error)
+        self.analysis_valid = False  # True while the last submitted frame is answered or in flight
+        self.newest_answer_seq = 0
+        self.last_screen_voice = ""
+
         # Initialize Gemini model
         self._initialize_model(api_key)
 
     def _initialize_model(self, api_key):
-        """Initialize the Gemini model with the provided API key."""
-        genai.configure(api_key=api_key)
-
-        # Model configuration 
-        generation_config = {
-            "temperature": 0.3,
-            "top_p": 0.9,
-            "top_k": 32,
-            "max_output_tokens": 2048,
-            "response_mime_type":"application/json",
-        }
-
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-        ]
-
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash-exp",
-            generation_config=generation_config,
-            safety_settings=safety_settings
-        )
+        """Use the shared vision client for the provided API key (config in model_pool.PURPOSES)."""
+        self.model = get_model_pool().get("vision", api_key)
 
     def start_stream(self, prompt):
         """Start screen capture and analysis streams."""
@@ -90,8 +127,27 @@ class ScreenAnalyzer:
         self.streaming = True
         self.stop_flag = False
         self.voice_stop_event.clear()  # Reset the stop event
+        with self.speech_lock:
+            self.pending_speech = None
         with self.response_lock:
             self.response_text = ""
+            self.response_json = None
+        with self.detector_lock:
+            self.change_detector.reset()
+            self.analysis_valid = False
+        self.analysis_wakeup.clear()
+        self.last_screen_voice = ""
+        self.engine.max_in_flight = self.max_requests_in_flight
+        self.engine.deadline = self.request_deadline
+        self.engine.start()
+        self.scheduler.base_interval = self.frame_process_interval
+        self.scheduler.requests_per_minute = self.requests_per_minute
+        self.scheduler.tokens_per_minute = self.tokens_per_minute
+        self.scheduler.reset()
+        with self.stats_lock:
+            self.frames_sent = 0
+            self.frames_skipped = 0
+            self.frames_deferred = 0
             
         # Start voice thread if needed
         if self.voice_thread is None or not self.voice_thread.is_alive():
@@ -155,28 +211,25 @@ class ScreenAnalyzer:
         self.stop_flag = True
         self.streaming = False
         self.last_stop_time = time.time()
+        self.engine.cancel_all()  # Abort in-flight Gemini requests immediately
+        self.capture_wakeup.set()
+        self.analysis_wakeup.set()
+        with self.frame_condition:
+            self.frame_condition.notify_all()  # Release clients waiting for a new frame
         
-        # Signal voice thread to stop and wait for current speech to finish
-        self.voice_stop_event.set()
-        
-        # Add final announcement to queue
-        self._add_to_speech_queue("Analysis stopped")
+        # Stop the voice thread and cut off any vision commentary still being spoken
+        with self.speech_condition:
+            self.voice_stop_event.set()
+            self.pending_speech = None
+            self.speech_condition.notify_all()
+        self.speech.interrupt(channel="vision")
+        if self.voice_thread is not None:
+            self.voice_thread.join(timeout=2.0)
+
+        # Final announcement goes straight to the speech service, the voice thread is stopping
+        self.speech.speak("Analysis stopped", priority=PRIORITY_LOW, channel="vision")
         if self.debug_mode:
-            print("Added 'Analysis stopped' to speech queue")
-            
-        # Wait briefly for the final announcement
-        time.sleep(0.2)
-        
-        # Force terminate any active speech
-        try:
-            if self.speaking:
-                if self.debug_mode:
-                    print("Force terminating active speech")
-                # Create a new engine to interrupt the current one
-                interrupt_engine = pyttsx3.init()
-                interrupt_engine.stop()
-        except Exception as e:
-            print(f"Error stopping speech: {e}")
+            print("Queued 'Analysis stopped' for speech")
         
         return True, "Streaming stopped."
 
@@ -184,62 +237,161 @@ class ScreenAnalyzer:
         """Check if streaming is active."""
         return self.streaming
 
+    def get_stats(self):
+        """Get change-detection counters for the current analysis session."""
+        with self.detector_lock:
+            dirty_map = self.change_detector.last_dirty_map
+            change_threshold = self.change_detector.region_threshold
+            last_change_score = self.change_detector.last_score
+        with self.stats_lock:
+            return {
+                "frames_sent": self.frames_sent,
+                "frames_skipped": self.frames_skipped,
+                "frames_deferred": self.frames_deferred,
+                "change_threshold": change_threshold,
+                "last_change_score": last_change_score,
+                "dirty_map": dirty_map.astype(int).tolist() if dirty_map is not None else None,
+                "capture_interval": self._capture_interval(),
+                "last_dirty_tiles": self.capture.last_dirty_tiles,
+                "total_tiles": len(self.capture.tiles),
+                "frame_generation": self.frame_generation,
+                "encoded_frames": self.frame_cache.get_stats(),
+                "requests": self.engine.get_stats(),
+                "schedule": self.scheduler.get_stats(),
+                "voice": self.get_voice_stats(),
+            }
+
+    def get_voice_stats(self):
+        """Get counters for the vision voice queue."""
+        with self.speech_lock:
+            wait_times = sorted(self.speech_wait_times)
+            durations = sorted(self.speech_durations)
+            return {
+                "spoken": self.speech_spoken,
+                "dropped": self.speech_dropped,
+                "pending": self.pending_speech is not None,
+                "speaking": self.speaking,
+                "wait_p50": percentile(wait_times, 50),
+                "wait_p95": percentile(wait_times, 95),
+                "speak_p50": percentile(durations, 50),
+                "speak_p95": percentile(durations, 95),
+            }
+
     def get_frame_interval(self):
         """Get the frame interval."""
         return self.frame_interval
 
+    def add_frame_consumer(self, interval):
+        """Register a consumer that needs a fresh frame every ``interval`` seconds."""
+        with self.frame_consumers_lock:
+            consumer_id = next(self.frame_consumer_ids)
+            self.frame_consumers[consumer_id] = interval
+        self.capture_wakeup.set()  # Let the capture loop pick up a faster rate immediately
+        return consumer_id
+
+    def remove_frame_consumer(self, consumer_id):
+        """Unregister a frame consumer added with add_frame_consumer."""
+        with self.frame_consumers_lock:
+            self.frame_consumers.pop(consumer_id, None)
+
+    def _capture_interval(self):
+        """Capture interval needed by the analyzer and any registered consumers."""
+        with self.frame_consumers_lock:
+            intervals = list(self.frame_consumers.values())
+        return max(self.frame_interval, min([self.scheduler.interval] + intervals))
+
     def get_response(self):
-        """Get the current AI response with improved JSON parsing."""
+        """Get the latest parsed AI response without re-parsing the model output."""
+        return self.get_response_snapshot()[1]
+
+    def get_response_snapshot(self):
+        """Get ``(seq, response)`` so callers can tell whether anything changed."""
         with self.response_lock:
-            # Try to clean and parse the response
-            cleaned_text = self.response_text
-            
-            # Remove markdown code blocks if present
-            json_block_match = re.search(r'```json\s*([\s\S]*?)\s*```', cleaned_text)
-            if json_block_match:
-                cleaned_text = json_block_match.group(1).strip()
-            
-            # Try parsing as JSON
+            seq = self.response_seq
+            if self.response_json is not None:
+                return seq, dict(self.response_json)
+            text = self.response_text
+        return seq, self._default_response(text)
+
+    @staticmethod
+    def _default_response(text):
+        """Placeholder response used until the first analysis has produced a field."""
+        return {
+            "summary": text[:150] + "..." if len(text) > 150 else text,
+            "vison_stop_agent": "False",
+            "screen_voice": "Processing screen, please wait..."
+        }
+
+    def _publish_response(self, fields, replace=False):
+        """Merge completed fields into the current response and notify the listener."""
+        with self.response_lock:
+            if replace:
+                self.response_json = {}
+            elif self.response_json is None:
+                self.response_json = self._default_response(self.response_text)
+            self.response_json.update(fields)
+            self.response_seq += 1
+            seq = self.response_seq
+            snapshot = dict(self.response_json)
+
+        if self.on_response:
             try:
-                response_json = json.loads(cleaned_text)
-                
-                # Process for voice output using the new screen_voice field
-                self._process_response_for_voice(response_json)
-                
-                return response_json
-            except json.JSONDecodeError:
-                # Extract JSON-like structure with regex
-                json_pattern = re.search(r'({[\s\S]*?})', cleaned_text)
-                if json_pattern:
-                    try:
-                        potential_json = json_pattern.group(1)
-                        response_json = json.loads(potential_json)
-                        self._process_response_for_voice(response_json)
-                        return response_json
-                    except json.JSONDecodeError:
-                        pass
-            
-            # Default response if parsing failed
-            default_response = {
-                "summary": self.response_text[:150] + "..." if len(self.response_text) > 150 else self.response_text,
-                "vison_stop_agent": "False",
-                "screen_voice": "Processing screen, please wait..."
-            }
-            
-            self._process_response_for_voice(default_response)
-            return default_response
+                self.on_response(seq, snapshot)
+            except Exception as e:
+                print(f"Response listener error: {e}")
+
+    @staticmethod
+    def _parse_response_text(text):
+        """Fallback parser for model output that is not a single clean JSON object."""
+        json_block_match = re.search(r'```json\s*([\s\S]*?)\s*```', text)
+        if json_block_match:
+            text = json_block_match.group(1).strip()
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            json_pattern = re.search(r'({[\s\S]*?})', text)
+            if json_pattern:
+                try:
+                    return json.loads(json_pattern.group(1))
+                except json.JSONDecodeError:
+                    pass
+        return None
 
     def get_encoded_frame(self):
         """Get the current frame as base64 encoded JPEG with optimized compression."""
+        _, data = self.get_encoded_frame_bytes()
+        if data is None:
+            return None
+        return base64.b64encode(data).decode('utf-8')
+
+    def get_encoded_frame_bytes(self, quality=None, size=None):
+        """Get ``(generation, jpeg_bytes)`` for the current frame, encoding it at most once per format.
+
+        Every caller asking for the same generation and parameters receives the same
+        bytes object. ``size`` is an optional ``(width, height)`` to scale down to.
+        """
+        quality = quality or self.jpeg_quality
+        key = ('.jpg', quality, size)
         with self.frame_lock:
             if self.frame is None:
-                return None
-            frame_copy = self.frame.copy()
-
-        # Optimize encoding for speed
-        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), 80]  
-        _, buffer = cv2.imencode('.jpg', frame_copy, encode_params)
-        return base64.b64encode(buffer).decode('utf-8')
+                return None, None
+            generation = self.frame_generation
+            data = self.frame_cache.lookup(generation, key)
+            if data is None:
+                # Encode while holding the lock so the frame cannot change underneath us
+                frame = self.frame
+                if size and size != (frame.shape[1], frame.shape[0]):
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+                data = self.frame_cache.store(generation, key, buffer.tobytes())
+        return generation, data
+
+    def wait_for_frame(self, last_generation, timeout=None):
+        """Block until a frame newer than ``last_generation`` exists; return the current generation."""
+        with self.frame_condition:
+            self.frame_condition.wait_for(
+                lambda: self.frame_generation != last_generation or not self.streaming, timeout)
+            return self.frame_generation
         
     def _process_response_for_voice(self, response_json):
         """Process the response JSON for voice using the dedicated screen_voice field."""
@@ -287,198 +439,202 @@ class ScreenAnalyzer:
         return cleaned[:80] + "..." if len(cleaned) > 80 else cleaned
 
     def _speak_latest(self):
-        """Thread function to speak the latest message in the queue."""
-        speech_engine = None
-        
-        try:
-            # Initialize speech engine once at start
-            speech_engine = pyttsx3.init()
-            speech_engine.setProperty('rate', 200)  # Faster speech
-            speech_engine.setProperty('volume', 1.0)  # Full volume
-        except Exception as e:
-            print(f"Speech engine initialization error: {e}")
-            
-        while not self.voice_stop_event.is_set():
-            if not self.streaming and not self.speech_queue:
-                # If we're not streaming and there's nothing left to say
-                time.sleep(0.1)
-                continue
-                
-            with self.speech_lock:
-                if self.speech_queue and not self.speaking:
-                    # Get the latest message (last in queue)
-                    latest_message = self.speech_queue[-1]
-                    self.speech_queue = []  # Clear queue after grabbing latest
-                    self.speaking = True
-                    
-            if self.speaking:
-                try:
-                    # Check again if we should stop before speaking
-                    if self.voice_stop_event.is_set():
-                        break
-                        
-                    # Re-initialize the engine if needed
-                    if speech_engine is None:
-                        speech_engine = pyttsx3.init()
-                        speech_engine.setProperty('rate', 200)
-                        speech_engine.setProperty('volume', 1.0)
-                    
-                    print(f"Speaking at {time.strftime('%H:%M:%S')}: {latest_message}")
-                    speech_engine.say(latest_message)
-                    speech_engine.runAndWait()
-                except Exception as e:
-                    print(f"Speech error: {e}")
-                    # Try to reinitialize engine on next iteration
-                    speech_engine = None
-                finally:
-                    print(f"Finished speaking at {time.strftime('%H:%M:%S')}")
-                    with self.speech_lock:
-                        self.speaking = False
-                        
-            # Check if stop event is set
-            if self.voice_stop_event.is_set():
-                break
-                
-            time.sleep(0.1)  # Small delay to prevent tight looping
-            
-        # Clean up resources
-        try:
-            if speech_engine:
-                speech_engine.stop()
-        except:
-            pass
-            
+        """Thread function that speaks the newest pending message; sleeps until there is one."""
+        while True:
+            with self.speech_condition:
+                self.speech_condition.wait_for(
+                    lambda: self.pending_speech is not None or self.voice_stop_event.is_set())
+                if self.voice_stop_event.is_set():
+                    break
+                text, queued_at = self.pending_speech
+                self.pending_speech = None
+                self.speaking = True
+
+            started = time.time()
+            try:
+                # The shared speech service owns the engine; wait so commentary never piles up
+                self.speech.speak(text, priority=PRIORITY_LOW, channel="vision").wait()
+            except Exception as e:
+                print(f"Speech error: {e}")
+            finally:
+                with self.speech_lock:
+                    self.speaking = False
+                    self.speech_spoken += 1
+                    self.speech_wait_times.append(started - queued_at)
+                    self.speech_durations.append(time.time() - started)
+
         print("Voice thread terminated")
 
     def _add_to_speech_queue(self, text):
-        """Add text to speech queue, prioritizing newest information."""
-        if not text or self.voice_stop_event.is_set():
+        """Queue text for the voice thread; a newer message replaces one that has not been spoken yet."""
+        if not text:
             return
-            
-        try:
-            with self.speech_lock:
-                # Add to queue, keeping only most recent items (max 3)
-                self.speech_queue.append(text)
-                if len(self.speech_queue) > 3:
-                    self.speech_queue = self.speech_queue[-3:]
-                    
-            if self.debug_mode:
-                print(f"Added to speech queue: {text}, queue size: {len(self.speech_queue)}")
-        except Exception as e:
-            print(f"Queue error: {e}")
+
+        with self.speech_condition:
+            if self.voice_stop_event.is_set():
+                return
+            if self.pending_speech is not None:
+                self.speech_dropped += 1
+                if self.debug_mode:
+                    print(f"Dropped stale speech: {self.pending_speech[0]}")
+            self.pending_speech = (text, time.time())
+            self.speech_condition.notify()
+
+        if self.debug_mode:
+            print(f"Added to speech queue: {text}")
 
     def _capture_screen(self):
-        """Thread function for optimized screen capture."""
+        """Thread function for demand-driven, tile-incremental screen capture."""
         with mss.mss() as sct:
             monitor = sct.monitors[1]  # Primary monitor
 
             while not self.stop_flag and self.streaming:
-                # Capture screenshot
-                sct_img = sct.grab(monitor)
-                frame = np.array(sct_img)
-                
-                # Resize large screens for better performance
-                height, width = frame.shape[:2]
-                if width > 1920 or height > 1080:
-                    scale = min(1920/width, 1080/height)
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    frame = cv2.resize(frame, (new_width, new_height))
-                
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-
-                # Update frame
+                started = time.time()
+
+                # View the grabbed pixels without copying; only changed tiles are reprocessed
+                raw = np.asarray(sct.grab(monitor))
                 with self.frame_lock:
-                    self.frame = frame
+                    dirty_tiles = self.capture.update(raw)
+                    self.frame = self.capture.frame
+                    if dirty_tiles:
+                        self.frame_generation += 1
+                        self.frame_condition.notify_all()
 
-                time.sleep(self.frame_interval)  # Adjusted for 30 FPS
+                # Sleep until the next frame is due, or until a faster consumer registers
+                self.capture_wakeup.clear()
+                self.capture_wakeup.wait(max(0.0, self._capture_interval() - (time.time() - started)))
 
     def _analyze_frames(self, prompt_parts):
-        """Thread function for AI analysis with intelligent response handling."""
-        last_screen_voice = ""
-        
+        """Thread function that samples changed frames and hands them to the analysis engine."""
         while not self.stop_flag and self.streaming:
-            current_time = time.time()
-            
-            # Process frames at controlled intervals
-            if current_time - self.last_processed_frame_time < self.frame_process_interval:
-                time.sleep(0.01)
+            # Sleep until the adaptive scheduler's next sample is due; stop_stream wakes us early
+            wait = self.last_processed_frame_time + self.scheduler.interval - time.time()
+            if wait > 0:
+                self.analysis_wakeup.wait(wait)
                 continue
-                
-            self.last_processed_frame_time = current_time
-            
+
+            # Skip the model call when the screen has not changed since the last submitted frame
             with self.frame_lock:
                 if self.frame is None:
-                    time.sleep(0.05)
+                    self.frame_condition.wait(1.0)  # Until the capture thread has a first frame
                     continue
-                frame_copy = self.frame.copy()
+                current_time = time.time()
+                with self.detector_lock:
+                    self.change_detector.region_threshold = self.change_threshold
+                    changed, fingerprint = self.change_detector.has_changed(self.frame)
+                    score = self.change_detector.last_score
+                    analysis_valid = self.analysis_valid
+            self.last_processed_frame_time = current_time
+            self.scheduler.on_frame(changed or not analysis_valid, score)
+            if not changed and analysis_valid:
+                with self.stats_lock:
+                    self.frames_skipped += 1
+                if self.debug_mode:
+                    print(f"Screen unchanged (score {score:.3f}), reusing last response")
+                continue
 
-            # Encode image with optimized quality
-            encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), 75]
-            _, encoded_frame = cv2.imencode('.jpg', frame_copy, encode_params)
-            img_data = encoded_frame.tobytes()
+            # Stay inside the requests/tokens per minute budget
+            if not self.scheduler.try_acquire():
+                with self.stats_lock:
+                    self.frames_deferred += 1
+                continue
+
+            # Reuse the encoding /stream clients already paid for
+            _, img_data = self.get_encoded_frame_bytes()
             image_part = {"mime_type": "image/jpeg", "data": img_data}
 
-            try:
-                # Send to Gemini
-                current_prompt = prompt_parts + [image_part]
-                response = self.model.generate_content(current_prompt, stream=True)
-                
-                accumulated_text = ""
-                
-                # Process streaming response efficiently
-                for chunk in response:
-                    if self.stop_flag:
-                        break
-                        
-                    if chunk.text:
-                        accumulated_text += chunk.text
-                        
-                        # Update response text frequently
-                        with self.response_lock:
-                            self.response_text = accumulated_text
-                        
-                        # Check for complete JSON response to break early
-                        if all(key in accumulated_text for key in ['"summary":', '"vison_stop_agent":', '"screen_voice":']):
-                            if accumulated_text.strip().endswith('}'):
-                                break
-                
-                # Final update
-                with self.response_lock:
-                    self.response_text = accumulated_text
-                
-                # Force voice feedback for new analyses
-                try:
-                    response_json = json.loads(accumulated_text)
-                    screen_voice = response_json.get("screen_voice", "")
-                    
-                    # Only speak if it's different from the last one
-                    if screen_voice and screen_voice != last_screen_voice:
-                        self._add_to_speech_queue(screen_voice)
-                        last_screen_voice = screen_voice
+            # Latest wins: a frame still waiting for a free slot is replaced by this one
+            with self.detector_lock:
+                self.change_detector.accept(fingerprint)
+                self.analysis_valid = True
+            with self.stats_lock:
+                self.frames_sent += 1
+            self.engine.submit(prompt_parts + [image_part], captured_at=current_time)
+
+    async def _run_analysis(self, job):
+        """Engine handler: stream one Gemini analysis and publish fields as they complete."""
+        loop = asyncio.get_running_loop()
+        # The SDK call blocks, so it runs in a worker thread; awaiting each chunk keeps
+        # the request cancellable between chunks
+        call = loop.run_in_executor(None, functools.partial(self.model.generate_content, job.payload, stream=True))
+        try:
+            response = await asyncio.shield(call)
+        except asyncio.CancelledError:
+            # Cancelled (stop_stream or the deadline) before the stream opened: the call
+            # still finishes in its thread, and its stream must be closed to free the slot
+            call.add_done_callback(cancel_when_done)
+            raise
+        chunks = iter(response)
+        parser = IncrementalJSONParser()
+        finished = False
+        tokens = 0
+
+        try:
+            while not self.stop_flag:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    finished = True
+                    break
+                usage = getattr(chunk, "usage_metadata", None)
+                tokens = getattr(usage, "total_token_count", 0) or tokens
+                if not chunk.text:
+                    continue
+
+                for path, value in parser.feed(chunk.text):
+                    if len(path) != 1:
+                        continue
+                    # A newer frame has already started answering; this one is stale
+                    if job.seq < self.newest_answer_seq:
+                        return
+                    self.newest_answer_seq = job.seq
+                    self._publish_response({path[0]: value})
+
+                    # Speak new voice feedback right away, without waiting for the rest
+                    if path[0] == "screen_voice" and value and value != self.last_screen_voice:
+                        self._add_to_speech_queue(value)
+                        self.last_screen_voice = value
                         if self.debug_mode:
-                            print(f"Forced voice feedback: {screen_voice}")
-                except Exception as e:
-                    if self.debug_mode:
-                        print(f"Error processing voice feedback: {e}")
+                            print(f"Forced voice feedback: {value}")
+
+                if all(key in parser.values for key in RESPONSE_KEYS):
+                    break
+        finally:
+            if not finished:
+                cancel_response(response)
+        self.scheduler.on_response(time.time() - job.started_at, tokens)
+
+        response_json = parser.values
+        if not response_json:
+            # The stream did not contain a parsable object; try the lenient parser once
+            response_json = self._parse_response_text(parser.text) or {}
+            if response_json:
+                self._publish_response(response_json)
 
-            except Exception as e:
-                error_msg = str(e)
-                print(f"Gemini error: {error_msg}")
-                
-                # Create error JSON with all required fields including screen_voice
-                error_voice = "Analysis error. Retrying."
-                with self.response_lock:
-                    self.response_text = json.dumps({
-                        "summary": f"Error in analysis: {error_msg[:100]}",
-                        "vison_stop_agent": "False",
-                        "screen_voice": error_voice
-                    })
-                
-                # Force error voice feedback
-                if error_voice != last_screen_voice:
-                    self._add_to_speech_queue(error_voice)
-                    last_screen_voice = error_voice
-
-            # Use the adjusted 1-second interval between Gemini requests
-            time.sleep(self.gemini_interval)
\ No newline at end of file
+        with self.response_lock:
+            self.response_text = parser.text
+
+        # Fall back to a summary-based voice line when screen_voice was missing
+        if response_json and not response_json.get("screen_voice"):
+            self._process_response_for_voice(response_json)
+
+    def _handle_analysis_error(self, job, error):
+        """Engine error callback: publish an error response and force the next frame to be resent."""
+        error_msg = str(error) or type(error).__name__
+        print(f"Gemini error: {error_msg}")
+        self.scheduler.on_error(error)
+        with self.detector_lock:
+            self.analysis_valid = False
+            self.change_detector.reset()
+
+        # Create error JSON with all required fields including screen_voice
+        error_voice = "Analysis error. Retrying."
+        self._publish_response({
+            "summary": f"Error in analysis: {error_msg[:100]}",
+            "vison_stop_agent": "False",
+            "screen_voice": error_voice
+        }, replace=True)
+        
+        # Force error voice feedback
+        if error_voice != self.last_screen_voice:
+            self._add_to_speech_queue(error_voice)
+            self.last_screen_voice = error_voice
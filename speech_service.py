@@ -0,0 +1,248 @@
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from threading import Thread, Lock, Condition, Event
+
+from analysis_engine import percentile
+
+# Lower numbers are spoken first
+PRIORITY_HIGH = 0    # Live conversation replies
+PRIORITY_NORMAL = 1  # Explicit /speak requests
+PRIORITY_LOW = 2     # Background vision commentary
+
+
+class SpeechMessage:
+    """A queued utterance and its timing."""
+
+    def __init__(self, message_id, text, priority, channel, preempt):
+        self.id = message_id
+        self.text = text
+        self.priority = priority
+        self.channel = channel
+        self.preempt = preempt
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.first_audio_at = None
+        self.finished_at = None
+        self.cancelled = False
+        self.interrupted = False
+        self.done = Event()
+
+    def wait(self, timeout=None):
+        """Block until the message was spoken, interrupted or dropped."""
+        return self.done.wait(timeout)
+
+
+class Pyttsx3Backend:
+    """Speaks through a single pyttsx3 engine that lives as long as the worker thread."""
+
+    def __init__(self, rate=200, volume=1.0):
+        self.rate = rate
+        self.volume = volume
+        self.engine = None
+        self.on_audio = None
+        self.should_stop = None
+
+    def _ensure_engine(self):
+        if self.engine is None:
+            import pyttsx3
+            self.engine = pyttsx3.init()
+            self.engine.setProperty('rate', self.rate)
+            self.engine.setProperty('volume', self.volume)
+            # pyttsx3 can only be stopped safely from its own callbacks
+            self.engine.connect('started-utterance', lambda name: self.on_audio and self.on_audio())
+            self.engine.connect('started-word', self._check_stop)
+
+    def _check_stop(self, name, location, length):
+        if self.should_stop and self.should_stop():
+            self.engine.stop()
+
+    def speak(self, text, on_audio, should_stop):
+        self._ensure_engine()
+        self.on_audio = on_audio
+        self.should_stop = should_stop
+        try:
+            self.engine.say(text)
+            self.engine.runAndWait()
+        except Exception:
+            # Drop the engine so the next message starts from a fresh one
+            self.engine = None
+            raise
+
+    def close(self):
+        if self.engine is not None:
+            try:
+                self.engine.stop()
+            except Exception:
+                pass
+            self.engine = None
+
+
+class NullAudioBackend:
+    """Silent backend for headless runs; "speaks" for a time proportional to the text."""
+
+    def __init__(self, startup_delay=0.0, seconds_per_char=0.0):
+        self.startup_delay = startup_delay
+        self.seconds_per_char = seconds_per_char
+        self.spoken = []
+
+    def speak(self, text, on_audio, should_stop):
+        time.sleep(self.startup_delay)
+        on_audio()
+        deadline = time.time() + self.seconds_per_char * len(text)
+        while time.time() < deadline:
+            if should_stop():
+                return
+            time.sleep(min(0.01, max(0.0, deadline - time.time())))
+        self.spoken.append(text)
+
+    def close(self):
+        pass
+
+
+class SpeechService:
+    """One long-lived speech worker with a priority queue, preemption and coalescing.
+
+    Messages that share a ``channel`` coalesce: queuing a new one drops any older one
+    from the same channel that has not started yet, unless it is queued with
+    ``coalesce=False`` (parts of one reply that must all be spoken). A message queued with
+    ``preempt=True`` interrupts the current utterance if it has a lower priority
+    (a higher number), or belongs to the same channel.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or Pyttsx3Backend()
+        self.condition = Condition(Lock())
+        self.heap = []
+        self.ids = itertools.count(1)
+        self.current = None
+        self.interrupt_current = False
+        self.closed = False
+
+        self.latencies = deque(maxlen=200)  # Enqueue to first audio, in seconds
+        self.spoken = 0
+        self.coalesced = 0
+        self.preempted = 0
+        self.errors = 0
+
+        self.thread = Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def speak(self, text, priority=PRIORITY_NORMAL, channel=None, preempt=False, coalesce=True):
+        """Queue text to be spoken and return its SpeechMessage."""
+        message = SpeechMessage(next(self.ids), text, priority, channel, preempt)
+        if not text:
+            message.done.set()
+            return message
+
+        with self.condition:
+            if channel is not None and coalesce:
+                for queued in self._queued(channel):
+                    queued.cancelled = True
+                    queued.done.set()
+                    self.coalesced += 1
+            current = self.current
+            if preempt and current is not None and (
+                    priority < current.priority or (channel is not None and channel == current.channel)):
+                self.interrupt_current = True
+            heapq.heappush(self.heap, (priority, message.id, message))
+            self.condition.notify()
+        return message
+
+    def interrupt(self, channel=None):
+        """Stop the current utterance and drop queued messages (only ``channel``'s when given)."""
+        with self.condition:
+            for queued in self._queued(channel):
+                queued.cancelled = True
+                queued.done.set()
+            if self.current is not None and (channel is None or self.current.channel == channel):
+                self.interrupt_current = True
+
+    def is_speaking(self, channel=None):
+        with self.condition:
+            return self.current is not None and (channel is None or self.current.channel == channel)
+
+    def close(self):
+        """Stop the worker thread; queued messages are dropped."""
+        self.interrupt()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join(timeout=2.0)
+
+    def get_stats(self):
+        with self.condition:
+            latencies = sorted(self.latencies)
+            return {
+                "queued": sum(1 for _, _, m in self.heap if not m.cancelled),
+                "speaking": self.current.text if self.current else None,
+                "spoken": self.spoken,
+                "coalesced": self.coalesced,
+                "preempted": self.preempted,
+                "errors": self.errors,
+                "first_audio_p50": percentile(latencies, 50),
+                "first_audio_p95": percentile(latencies, 95),
+            }
+
+    def _queued(self, channel):
+        return [m for _, _, m in self.heap if not m.cancelled and (channel is None or m.channel == channel)]
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and not self._queued(None):
+                    self.heap = []
+                    self.condition.wait()
+                if self.closed:
+                    return
+                _, _, message = heapq.heappop(self.heap)
+                if message.cancelled:
+                    continue
+                self.current = message
+                self.interrupt_current = False
+
+            message.started_at = time.time()
+            try:
+                print(f"Speaking at {time.strftime('%H:%M:%S')}: {message.text}")
+                self.backend.speak(message.text, lambda: self._on_audio(message), lambda: self.interrupt_current)
+            except Exception as e:
+                print(f"Speech error: {e}")
+                with self.condition:
+                    self.errors += 1
+            finally:
+                message.finished_at = time.time()
+                with self.condition:
+                    if self.interrupt_current:
+                        message.interrupted = True
+                        self.preempted += 1
+                    else:
+                        self.spoken += 1
+                    self.current = None
+                    self.interrupt_current = False
+                message.done.set()
+
+    def _on_audio(self, message):
+        if message.first_audio_at is None:
+            message.first_audio_at = time.time()
+            with self.condition:
+                self.latencies.append(message.first_audio_at - message.enqueued_at)
+
+
+_service = None
+_service_lock = Lock()
+
+
+def get_speech_service():
+    """Shared SpeechService for the whole app; CODIFY_TTS_BACKEND=null selects silent audio."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            if os.getenv("CODIFY_TTS_BACKEND", "").lower() == "null":
+                backend = NullAudioBackend()
+            else:
+                backend = Pyttsx3Backend()
+            _service = SpeechService(backend)
+        return _service
@@ -98,22 +98,50 @@ codeMirrorEditor.on('blur', () => {
 
 
 let debounceTimer;
+let lastSuggestion = null;  // { prefix, text } of the last suggestion shown
+let pendingCompletion = null;  // AbortController of the request in flight
+const editorId = Math.random().toString(36).slice(2);  // Lets the server cancel this editor's stale requests
+let completionRequestId = 0;
+let streamingCompletion = null;  // { requestId, prefix, generation, cursor, text } of the streamed request
+let completionListeners = false;
 
 codeMirrorEditor.on('inputRead', (cm, change) => {
     if (change.origin !== '+input') return;
 
     if (document.getElementById('autocomplete').classList.contains('active')) {
         clearTimeout(debounceTimer);
+        if (pendingCompletion) pendingCompletion.abort();  // Its answer is for text that has changed
+        streamingCompletion = null;
+        const cursor = cm.getCursor();
+        const prefix = cm.getRange({ line: 0, ch: 0 }, cursor);
+
+        // Typing the start of the current suggestion just shortens it, no request needed
+        if (lastSuggestion && prefix.startsWith(lastSuggestion.prefix)) {
+            const typed = prefix.slice(lastSuggestion.prefix.length);
+            if (lastSuggestion.text.startsWith(typed) && typed.length < lastSuggestion.text.length) {
+                showCompletionHint(cm, lastSuggestion.text.slice(typed.length));
+                return;
+            }
+        }
+
         debounceTimer = setTimeout(async () => {
             const cursor = cm.getCursor();
-            const linesAbove = cm.getRange({ line: 0, ch: 0 }, cursor);
+            const prefix = cm.getRange({ line: 0, ch: 0 }, cursor);
+            const suffix = cm.getRange(cursor, { line: cm.lastLine(), ch: Infinity });
             const currentLine = cm.getLine(cursor.line);
 
             if (currentLine.trim().length > 10) {
+                if (typeof socket !== 'undefined' && socket.connected) {
+                    requestStreamedCompletion(cm, prefix, suffix, cm.getOption("mode"));
+                    return;
+                }
                 try {
-                    const completion = await getAICompletions(linesAbove, cm.getOption("mode")); // Pass language mode
-                    if (completion) showCompletionHint(cm, completion);
-                    else completionHint.style.display = 'none'; // Hide if no completion
+                    const completion = await getAICompletions(prefix, suffix, cm.getOption("mode")); // Pass language mode
+                    if (completion) {
+                        lastSuggestion = { prefix: prefix, text: completion };
+                        showCompletionHint(cm, completion);
+                    }
+                    else if (completion !== undefined) completionHint.style.display = 'none'; // Hide if no completion
                 } catch (error) {
                     console.error('Autocomplete error:', error);
                 }
@@ -129,13 +157,64 @@ codeMirrorEditor.on('inputRead', (cm, change) => {
 });
 
 
-// Fetch completion from backend
-async function getAICompletions(linesAbove, language) {
+// Ask for a completion over Socket.IO; ghost text grows as the chunks arrive
+function requestStreamedCompletion(cm, prefix, suffix, language) {
+    if (!completionListeners) {
+        socket.on('autocomplete_chunk', onCompletionChunk);
+        socket.on('autocomplete_done', onCompletionDone);
+        completionListeners = true;
+    }
+    const requestId = `${editorId}-${++completionRequestId}`;
+    streamingCompletion = {
+        requestId: requestId,
+        prefix: prefix,
+        generation: cm.changeGeneration(),
+        cursor: cm.getCursor(),
+        text: ''
+    };
+    socket.emit('autocomplete_request', {
+        request_id: requestId, prefix: prefix, suffix: suffix, language: language, editor_id: editorId
+    });
+}
+
+// The streamed request is still for the text and cursor the user is looking at
+function isCompletionCurrent(data) {
+    const current = streamingCompletion;
+    if (!current || data.request_id !== current.requestId) return false;
+    const cursor = codeMirrorEditor.getCursor();
+    return codeMirrorEditor.changeGeneration() === current.generation &&
+        cursor.line === current.cursor.line && cursor.ch === current.cursor.ch;
+}
+
+function onCompletionChunk(data) {
+    if (!isCompletionCurrent(data)) return;
+    streamingCompletion.text += data.text;
+    showCompletionHint(codeMirrorEditor, streamingCompletion.text);
+}
+
+function onCompletionDone(data) {
+    if (!isCompletionCurrent(data)) return;
+    const current = streamingCompletion;
+    streamingCompletion = null;
+    if (data.completion) {
+        lastSuggestion = { prefix: current.prefix, text: data.completion };
+        showCompletionHint(codeMirrorEditor, data.completion);
+    } else if (!data.cancelled) {
+        completionHint.style.display = 'none';
+    }
+}
+
+// Fetch completion from backend; resolves undefined when a newer request replaced this one
+async function getAICompletions(prefix, suffix, language) {
+    if (pendingCompletion) pendingCompletion.abort();
+    const controller = new AbortController();
+    pendingCompletion = controller;
     try {
         const response = await fetch('/autocomplete', {  // Use relative URL for Flask
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ code: linesAbove, language: language }), // Send language
+            body: JSON.stringify({ prefix: prefix, suffix: suffix, language: language, editor_id: editorId }), // Send language
+            signal: controller.signal,
         });
 
         if (!response.ok) {
@@ -145,15 +224,14 @@ async function getAICompletions(linesAbove, language) {
 
 
         const data = await response.json();
-        hint = data.completion;
-        const regex = /```(\w+)\n(.*?)```/s;
-        const match = hint.match(regex);
-        var extractedCode = match ? match[2].trim() : data.completion
-        extractedCode = "\n" + extractedCode;
-        return extractedCode;
+        if (data.cancelled || controller !== pendingCompletion) return undefined;
+        return data.completion;
 
     } catch (error) {
+        if (error.name === 'AbortError') return undefined;
         console.error('Error fetching AI completion:', error);
         return null;
+    } finally {
+        if (controller === pendingCompletion) pendingCompletion = null;
     }
 }
\ No newline at end of file
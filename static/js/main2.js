@@ -40,6 +40,8 @@ document.addEventListener('DOMContentLoaded', () => {
         initial_query: "",
         files: [],
         openFiles: {},  // Map of file paths to their contents
+        partialFiles: {},  // Map of file paths still being paged in to {nextOffset, size, loading}
+        fileVersions: {},  // Map of file paths to the mtime they had when last read or written
         activeFile: null,
         pendingChanges: {},  // Map of file paths to their pending changes
         pendingCommands: []  // Array of suggested commands
@@ -168,11 +170,46 @@ document.addEventListener('DOMContentLoaded', () => {
     async function refreshFileList() {
         try {
             showLoading('Loading files...');
-            const data = await apiRequest('list-files');
-            state.files = data.files || [];
+            const response = await fetch('/api/list-files?format=ndjson');
+            if (!response.ok || !response.body) {
+                // Error responses are plain JSON; fall back to the one-shot listing
+                const data = await apiRequest('list-files');
+                state.files = data.files || [];
+                renderFileList();
+                return;
+            }
+
+            // Render batches as they arrive so big projects show files immediately
+            const files = [];
+            state.files = files;
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            let renderPending = false;
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                lines.forEach(line => {
+                    if (!line) return;
+                    const batch = JSON.parse(line);
+                    if (batch.files) files.push(...batch.files);
+                });
+                hideLoading();
+                if (!renderPending) {
+                    renderPending = true;
+                    requestAnimationFrame(() => {
+                        renderPending = false;
+                        renderFileList();
+                    });
+                }
+            }
             renderFileList();
         } catch (error) {
-            // Error is already logged and shown in apiRequest
+            console.error('API Error (list-files):', error);
+            showNotification(error.message || 'An error occurred', 'error');
         } finally {
             hideLoading();
         }
@@ -328,6 +365,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
         // Remove file from open files
         delete state.openFiles[filePath];
+        delete state.partialFiles[filePath];
+        delete state.fileVersions[filePath];
 
         // Remove tab from DOM
         const tab = document.querySelector(`.file-tab[data-path="${CSS.escape(filePath)}"]`);
@@ -386,6 +425,8 @@ document.addEventListener('DOMContentLoaded', () => {
         // Update file editor content - ensure it's not undefined
         fileEditor.value = state.openFiles[filePath] || '';
         codeMirrorEditor.setValue(fileEditor.value);
+        // A partly loaded file must not be edited, saving it would truncate it
+        codeMirrorEditor.setOption('readOnly', Boolean(state.partialFiles[filePath]));
         // Show editor content, hide placeholder
         editorPlaceholder.classList.add('hidden');
         editorContent.classList.remove('hidden');
@@ -423,9 +464,21 @@ document.addEventListener('DOMContentLoaded', () => {
             showLoading(`Loading ${filePath}...`);
             const data = await apiRequest('read-file', 'POST', { path: filePath });
 
+            if (data.binary) {
+                showNotification(`${filePath} is a binary file and cannot be edited`, 'error');
+                return;
+            }
+
             // Validate file content
             const fileContent = data.content || '';
 
+            state.fileVersions[filePath] = data.mtime;
+
+            // Large files arrive in windows; the rest is paged in as the editor scrolls
+            if (data.truncated) {
+                state.partialFiles[filePath] = { nextOffset: data.next_offset, size: data.size, loading: false };
+            }
+
             // Add to open files
             state.openFiles[filePath] = fileContent;
 
@@ -449,21 +502,63 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Close a file tab
 
+    // Append the next window of a partly loaded file
+    async function loadMoreOfFile(filePath) {
+        const partial = state.partialFiles[filePath];
+        if (!partial || partial.loading) return;
+        partial.loading = true;
+        try {
+            const data = await apiRequest('read-file', 'POST', { path: filePath, offset: partial.nextOffset });
+            state.openFiles[filePath] += data.content || '';
+            if (state.activeFile === filePath) {
+                const lastLine = codeMirrorEditor.lastLine();
+                codeMirrorEditor.replaceRange(data.content || '', { line: lastLine, ch: codeMirrorEditor.getLine(lastLine).length });
+            }
+            if (data.truncated) {
+                partial.nextOffset = data.next_offset;
+            } else {
+                delete state.partialFiles[filePath];
+                if (state.activeFile === filePath) {
+                    codeMirrorEditor.setOption('readOnly', false);
+                }
+            }
+        } catch (error) {
+            // Error is already logged and shown in apiRequest
+        } finally {
+            partial.loading = false;
+        }
+    }
+
+    codeMirrorEditor.on('scroll', () => {
+        if (!state.activeFile || !state.partialFiles[state.activeFile]) return;
+        const scroll = codeMirrorEditor.getScrollInfo();
+        if (scroll.top + scroll.clientHeight > scroll.height - scroll.clientHeight) {
+            loadMoreOfFile(state.activeFile);
+        }
+    });
+
     // Save current file
     async function saveCurrentFile() {
         if (!state.activeFile) {
             showNotification('No file is currently open', 'error');
             return;
         }
+        if (state.partialFiles[state.activeFile]) {
+            showNotification('This file is still loading; scroll to the end before saving', 'error');
+            return;
+        }
         const cont = codeMirrorEditor.getValue();
         const content = cont;
 
         try {
             showLoading(`Saving ${state.activeFile}...`);
-            await apiRequest('write-file', 'POST', {
+            // Refused with a conflict if the file changed on disk since it was opened
+            const data = await apiRequest('write-file', 'POST', {
                 path: state.activeFile,
-                content: content
+                content: content,
+                expected_mtime: state.fileVersions[state.activeFile]
             });
+            state.fileVersions[state.activeFile] = data.mtime;
 
             // Update in-memory content
             state.openFiles[state.activeFile] = content;
@@ -499,14 +594,12 @@ document.addEventListener('DOMContentLoaded', () => {
                 // showNotification('Please open at least one file to analyze', 'error');
 
                 showLoading('Analyzing project and generating suggestions...');
-                const data = await apiRequest('analyze', 'POST', {
+                // Results render as they stream in; super agent mode applies changes as they arrive
+                const data = { data: await streamAnalysis({
                     prompt: prompt,
                     files: [],
                     filenames: state.files
-                });
-                // console.log("app.py return ",data.data);
-                // Display analysis results
-                renderAnalysisResults(data.data);
+                }, state.superagent) };
                 console.log(data.data)
                 console.log(state.superagent)
                 if (state.superagent == true) {
@@ -522,7 +615,9 @@ document.addEventListener('DOMContentLoaded', () => {
                         window.vison_stop_agent == "False"
                     }
                     // stopAllCommands()
-                    await applyAllChanges()
+                    if (Object.keys(state.pendingChanges).length > 0) {
+                        await applyAllChanges()
+                    }
                     await runAllPendingCommands()
                     setTimeout(function () {
                         if ((data.data.need_intervention == 'False' || data.data.need_intervention == false) && (window.vison_stop_agent == false || window.vison_stop_agent == 'False')) {
@@ -545,14 +640,12 @@ document.addEventListener('DOMContentLoaded', () => {
             }
             else {
                 showLoading('Analyzing project and generating suggestions...');
-                const data = await apiRequest('analyze', 'POST', {
+                // Results render as they stream in; super agent mode applies changes as they arrive
+                const data = { data: await streamAnalysis({
                     prompt: prompt,
                     files: filesToAnalyze,
                     filenames: state.files
-                });
-                // console.log(data.data);
-                // Display analysis results
-                renderAnalysisResults(data.data);
+                }, state.superagent) };
                 if (state.superagent == true) {
                     window.initialQuery = state.initial_query; // Make this accessible globally
                     window.commandOutput = state.command_output_f;
@@ -562,7 +655,9 @@ document.addEventListener('DOMContentLoaded', () => {
                     else {
                         window.vison_stop_agent == 'False'
                     }
-                    await applyAllChanges()
+                    if (Object.keys(state.pendingChanges).length > 0) {
+                        await applyAllChanges()
+                    }
                     await runAllPendingCommands()
                     setTimeout(function () {
                         if ((data.data.need_intervention == 'False' || data.data.need_intervention == false) && (window.vison_stop_agent == false || window.vison_stop_agent == 'False')) {
@@ -590,208 +685,375 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Run an analysis over Socket.IO, rendering the summary, each command and each change
+    // as soon as the server has parsed it; resolves with the complete result. The server
+    // pushes to this socket only, so a disconnect or a long silence stops the analysis
+    // and rejects instead of leaving the spinner up.
+    const ANALYSIS_IDLE_TIMEOUT_MS = 180000;
+
+    function stopAnalysisStream(analysisId) {
+        fetch('/api/analyze-stream/stop', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ analysis_id: analysisId })
+        }).catch(error => console.error('Error stopping analysis:', error));
+    }
+
+    function streamAnalysis(body, applyEarly) {
+        return new Promise(async (resolve, reject) => {
+            let analysisId = null;
+            let settled = false;
+            let idleTimer = null;
+            const early = [];     // Events that arrived before the analysis ID
+            const applying = [];  // Changes being applied while generation continues
+
+            const finish = () => {
+                settled = true;
+                clearTimeout(idleTimer);
+                socket.off('analysis_event', onEvent);
+                socket.off('disconnect', onDisconnect);
+            };
+            const abort = (message) => {
+                if (settled) return;
+                finish();
+                if (analysisId) stopAnalysisStream(analysisId);
+                showNotification(message, 'error');
+                reject(new Error(message));
+            };
+            const resetIdleTimer = () => {
+                clearTimeout(idleTimer);
+                idleTimer = setTimeout(() => abort('Analysis timed out'), ANALYSIS_IDLE_TIMEOUT_MS);
+            };
+
+            const handle = (event) => {
+                if (event.analysis_id !== analysisId || settled) return;
+                resetIdleTimer();
+                if (event.type === 'summary') {
+                    hideLoading();
+                    renderSummary(event.value);
+                    analysisResults.classList.remove('hidden');
+                } else if (event.type === 'command') {
+                    renderCommand(event.value, event.index);
+                } else if (event.type === 'change') {
+                    renderChange(event.value, event.index);
+                    if (applyEarly) {
+                        delete state.pendingChanges[event.value.file];
+                        applying.push(applyChange(event.value));
+                    }
+                } else if (event.type === 'done') {
+                    finish();
+                    const results = event.data;
+                    if (results.raw_response) {
+                        renderAnalysisResults(results);
+                    } else {
+                        if (!analysisSummary.innerHTML) renderSummary(results.summary);
+                        if (!suggestedChanges.children.length) suggestedChanges.innerHTML = '<p>No changes suggested.</p>';
+                        if (suggestedCommands && !suggestedCommands.children.length) {
+                            suggestedCommands.innerHTML = '<p>No commands suggested.</p>';
+                        }
+                        analysisResults.classList.remove('hidden');
+                    }
+                    Promise.all(applying).then(() => resolve(results));
+                } else if (event.type === 'error') {
+                    finish();
+                    showNotification(event.message, 'error');
+                    reject(new Error(event.message));
+                }
+            };
+            const onEvent = (event) => analysisId === null ? early.push(event) : handle(event);
+            // Pushes for this analysis went to the old socket id and are lost
+            const onDisconnect = () => abort('Connection lost during analysis');
+
+            resetAnalysisResults();
+            socket.on('analysis_event', onEvent);
+            socket.on('disconnect', onDisconnect);
+            resetIdleTimer();
+            try {
+                const data = await apiRequest('analyze-stream', 'POST', { ...body, socket_id: socket.id });
+                analysisId = data.analysis_id;
+                if (settled) {
+                    stopAnalysisStream(analysisId);  // Aborted while the request was in flight
+                    return;
+                }
+                early.forEach(handle);
+            } catch (error) {
+                finish();
+                reject(error);
+            }
+        });
+    }
+
     // Render analysis results
     function renderAnalysisResults(results) {
-        // Clear previous results
-        analysisSummary.innerHTML = '';
-        suggestedChanges.innerHTML = '';
-        if (suggestedCommands) {
-            suggestedCommands.innerHTML = '';
-        }
+        resetAnalysisResults();
 
         // Add summary
-        analysisSummary.innerHTML = marked.parse(results.summary) || 'Analysis complete. No summary provided.';
+        renderSummary(results.summary);
 
         // Check if we have changes
         if (!results.changes || results.changes.length === 0) {
             suggestedChanges.innerHTML = '<p>No changes suggested.</p>';
             applyAllChangesBtn.disabled = true;
         } else {
-            // Reset pending changes
-            state.pendingChanges = {};
-
             // Render each change
-            results.changes.forEach((change, index) => {
-                const changeItem = document.createElement('div');
-                changeItem.className = 'change-item';
-                changeItem.dataset.index = index;
-
-                const header = document.createElement('div');
-                header.className = 'change-item-header';
-
-                const body = document.createElement('div');
-                body.className = 'change-item-body';
-
-                // Add file path to header
-                const filePath = document.createElement('div');
-                filePath.className = 'change-file-path';
-                filePath.textContent = change.file;
-                header.appendChild(filePath);
-
-                // Add actions to header
-                const actions = document.createElement('div');
-                actions.className = 'change-actions';
-
-                const applyBtn = document.createElement('button');
-                applyBtn.className = 'secondary-btn';
-                applyBtn.innerHTML = '<i class="fas fa-check"></i> Apply';
-                applyBtn.addEventListener('click', () => applyChange(change.file, change.modified));
-                actions.appendChild(applyBtn);
-
-                const viewBtn = document.createElement('button');
-                viewBtn.className = 'secondary-btn';
-                viewBtn.innerHTML = '<i class="fas fa-eye"></i> View';
-                viewBtn.addEventListener('click', () => {
-                    // Toggle visibility of the body
-                    body.classList.toggle('hidden');
+            results.changes.forEach((change, index) => renderChange(change, index));
+        }
 
-                    // Change button text based on visibility
-                    if (body.classList.contains('hidden')) {
-                        viewBtn.innerHTML = '<i class="fas fa-eye"></i> View';
-                    } else {
-                        viewBtn.innerHTML = '<i class="fas fa-eye-slash"></i> Hide';
-                    }
-                });
-                actions.appendChild(viewBtn);
+        // Check if we have commands
+        if (results.commands && results.commands.length > 0) {
+            // Render each command
+            results.commands.forEach((command, index) => renderCommand(command, index));
+        } else if (suggestedCommands) {
+            suggestedCommands.innerHTML = '<p>No commands suggested.</p>';
+        }
 
-                header.appendChild(actions);
+        // Show analysis results section
+        analysisResults.classList.remove('hidden');
+    }
 
-                // Add explanation to body
-                if (change.explanation) {
-                    const explanation = document.createElement('div');
-                    explanation.className = 'change-explanation';
-                    explanation.innerHTML = marked.parse(change.explanation);
-                    body.appendChild(explanation);
-                }
+    // Clear previous results
+    function resetAnalysisResults() {
+        analysisSummary.innerHTML = '';
+        suggestedChanges.innerHTML = '';
+        if (suggestedCommands) {
+            suggestedCommands.innerHTML = '';
+        }
+        state.pendingChanges = {};
+        state.pendingCommands = [];
+        applyAllChangesBtn.disabled = true;
+    }
 
-                // Add code diff to body
-                if (change.original && change.modified) {
-                    // Create diff viewer
-                    const diffContainer = document.createElement('div');
-                    diffContainer.className = 'code-diff';
-
-                    // Simple diff view: show both original and modified
-                    const diffContent = document.createElement('div');
-                    diffContent.style.display = 'flex';
-                    diffContent.style.flexDirection = 'column';
-                    diffContent.style.gap = '10px';
-
-                    // Original code
-                    const originalCode = document.createElement('div');
-                    originalCode.innerHTML = `
-                        <div style="padding: 8px; background-color: #303540; color: #e06c75; font-weight: 500; overflow-x:auto">Original</div>
-                        <pre style="margin: 0; padding: 12px; overflow-x:auto"><code>${hljs.highlight(change.original, { language: 'python' }).value}</code></pre>
-                    `;
-
-                    // Modified code
-                    const modifiedCode = document.createElement('div');
-                    modifiedCode.innerHTML = `
-                        <div style="padding: 8px; background-color: #303540; color: #98c379; font-weight: 500;overflow-x:auto">Modified</div>
-                        <pre style="margin: 0; padding: 12px;overflow-x:auto"><code>${hljs.highlight(change.modified, { language: 'python' }).value}</code></pre>
-                    `;
-
-                    diffContent.appendChild(originalCode);
-                    diffContent.appendChild(modifiedCode);
-                    diffContainer.appendChild(diffContent);
-                    body.appendChild(diffContainer);
-                }
+    function renderSummary(summary) {
+        analysisSummary.innerHTML = (summary && marked.parse(summary)) || 'Analysis complete. No summary provided.';
+    }
 
-                // Hide body by default
-                body.classList.add('hidden');
+    // Add one suggested change and remember it as pending
+    function renderChange(change, index) {
+        const changeItem = document.createElement('div');
+        changeItem.className = 'change-item';
+        changeItem.dataset.index = index;
+
+        const header = document.createElement('div');
+        header.className = 'change-item-header';
+
+        const body = document.createElement('div');
+        body.className = 'change-item-body';
+
+        // Add file path to header
+        const filePath = document.createElement('div');
+        filePath.className = 'change-file-path';
+        filePath.textContent = change.file;
+        header.appendChild(filePath);
+
+        // Add actions to header
+        const actions = document.createElement('div');
+        actions.className = 'change-actions';
+
+        const applyBtn = document.createElement('button');
+        applyBtn.className = 'secondary-btn';
+        applyBtn.innerHTML = '<i class="fas fa-check"></i> Apply';
+        applyBtn.addEventListener('click', () => applyChange(change));
+        actions.appendChild(applyBtn);
+
+        const viewBtn = document.createElement('button');
+        viewBtn.className = 'secondary-btn';
+        viewBtn.innerHTML = '<i class="fas fa-eye"></i> View';
+        viewBtn.addEventListener('click', () => {
+            // Toggle visibility of the body
+            body.classList.toggle('hidden');
+
+            // Change button text based on visibility
+            if (body.classList.contains('hidden')) {
+                viewBtn.innerHTML = '<i class="fas fa-eye"></i> View';
+            } else {
+                viewBtn.innerHTML = '<i class="fas fa-eye-slash"></i> Hide';
+            }
+        });
+        actions.appendChild(viewBtn);
 
-                // Add header and body to change item
-                changeItem.appendChild(header);
-                changeItem.appendChild(body);
+        header.appendChild(actions);
 
-                // Add change item to container
-                suggestedChanges.appendChild(changeItem);
+        // Add explanation to body
+        if (change.explanation) {
+            const explanation = document.createElement('div');
+            explanation.className = 'change-explanation';
+            explanation.innerHTML = marked.parse(change.explanation);
+            body.appendChild(explanation);
+        }
 
-                // Store pending change
-                state.pendingChanges[change.file] = change.modified;
+        // Edits show each replaced block next to its replacement
+        if (change.edits) {
+            change.edits.forEach(edit => {
+                body.appendChild(renderCodePair(edit.search || '', edit.replace || ''));
             });
+        } else if (change.diff) {
+            const diffCode = document.createElement('pre');
+            diffCode.style.margin = '0';
+            diffCode.style.padding = '12px';
+            diffCode.style.overflowX = 'auto';
+            diffCode.innerHTML = `<code>${hljs.highlight(change.diff, { language: 'diff' }).value}</code>`;
+            body.appendChild(diffCode);
+        }
 
-            // Enable apply all button
-            applyAllChangesBtn.disabled = false;
+        // Add code diff to body
+        if (change.original && change.modified) {
+            // Create diff viewer
+            const diffContainer = document.createElement('div');
+            diffContainer.className = 'code-diff';
+
+            // Simple diff view: show both original and modified
+            const diffContent = document.createElement('div');
+            diffContent.style.display = 'flex';
+            diffContent.style.flexDirection = 'column';
+            diffContent.style.gap = '10px';
+
+            // Original code
+            const originalCode = document.createElement('div');
+            originalCode.innerHTML = `
+                <div style="padding: 8px; background-color: #303540; color: #e06c75; font-weight: 500; overflow-x:auto">Original</div>
+                <pre style="margin: 0; padding: 12px; overflow-x:auto"><code>${hljs.highlight(change.original, { language: 'python' }).value}</code></pre>
+            `;
+
+            // Modified code
+            const modifiedCode = document.createElement('div');
+            modifiedCode.innerHTML = `
+                <div style="padding: 8px; background-color: #303540; color: #98c379; font-weight: 500;overflow-x:auto">Modified</div>
+                <pre style="margin: 0; padding: 12px;overflow-x:auto"><code>${hljs.highlight(change.modified, { language: 'python' }).value}</code></pre>
+            `;
+
+            diffContent.appendChild(originalCode);
+            diffContent.appendChild(modifiedCode);
+            diffContainer.appendChild(diffContent);
+            body.appendChild(diffContainer);
         }
 
-        // Check if we have commands
-        if (results.commands && results.commands.length > 0) {
-            // Reset pending commands
-            state.pendingCommands = results.commands;
+        // Hide body by default
+        body.classList.add('hidden');
+
+        // Add header and body to change item
+        changeItem.appendChild(header);
+        changeItem.appendChild(body);
 
-            // Create commands section header
+        // Add change item to container
+        suggestedChanges.appendChild(changeItem);
+
+        // Store pending change
+        state.pendingChanges[change.file] = change;
+
+        // Enable apply all button
+        applyAllChangesBtn.disabled = false;
+    }
+
+    // Add one suggested command and remember it as pending
+    function renderCommand(command, index) {
+        state.pendingCommands.push(command);
+        if (!suggestedCommands) return;
+
+        // Create commands section header before the first command
+        if (!suggestedCommands.querySelector('.section-title')) {
             const commandsHeader = document.createElement('h3');
             commandsHeader.textContent = 'Suggested Commands';
             commandsHeader.className = 'section-title';
             suggestedCommands.appendChild(commandsHeader);
+        }
 
-            // Render each command
-            results.commands.forEach((command, index) => {
-                const commandItem = document.createElement('div');
-                commandItem.className = 'command-item';
-                commandItem.dataset.index = index;
-
-                const header = document.createElement('div');
-                header.className = 'command-item-header';
-
-                // Add command text to header
-                const commandText = document.createElement('div');
-                commandText.className = 'command-text';
-                commandText.textContent = command.command;
-                header.appendChild(commandText);
-
-                // Add actions to header
-                const actions = document.createElement('div');
-                actions.className = 'command-actions';
-
-                const runBtn = document.createElement('button');
-                runBtn.className = 'secondary-btn';
-                runBtn.innerHTML = '<i class="fas fa-play"></i> Run';
-                runBtn.addEventListener('click', () => runSuggestedCommand(command.command));
-                actions.appendChild(runBtn);
-
-                const requiredBadge = document.createElement('span');
-                requiredBadge.className = command.isRequired ? 'badge required' : 'badge optional';
-                requiredBadge.textContent = command.isRequired ? 'Required' : 'Optional';
-                actions.appendChild(requiredBadge);
-
-                header.appendChild(actions);
-
-                // Add explanation if available
-                if (command.explanation) {
-                    const explanation = document.createElement('div');
-                    explanation.className = 'command-explanation';
-                    explanation.innerHTML = marked.parse(command.explanation);
-                    commandItem.appendChild(explanation);
-                }
+        const commandItem = document.createElement('div');
+        commandItem.className = 'command-item';
+        commandItem.dataset.index = index;
+
+        const header = document.createElement('div');
+        header.className = 'command-item-header';
+
+        // Add command text to header
+        const commandText = document.createElement('div');
+        commandText.className = 'command-text';
+        commandText.textContent = command.command;
+        header.appendChild(commandText);
+
+        // Add actions to header
+        const actions = document.createElement('div');
+        actions.className = 'command-actions';
+
+        const runBtn = document.createElement('button');
+        runBtn.className = 'secondary-btn';
+        runBtn.innerHTML = '<i class="fas fa-play"></i> Run';
+        runBtn.addEventListener('click', () => runSuggestedCommand(command.command));
+        actions.appendChild(runBtn);
+
+        const requiredBadge = document.createElement('span');
+        requiredBadge.className = command.isRequired ? 'badge required' : 'badge optional';
+        requiredBadge.textContent = command.isRequired ? 'Required' : 'Optional';
+        actions.appendChild(requiredBadge);
+
+        header.appendChild(actions);
+
+        // Add explanation if available
+        if (command.explanation) {
+            const explanation = document.createElement('div');
+            explanation.className = 'command-explanation';
+            explanation.innerHTML = marked.parse(command.explanation);
+            commandItem.appendChild(explanation);
+        }
 
-                // Add header to command item
-                commandItem.appendChild(header);
+        // Add header to command item
+        commandItem.appendChild(header);
 
-                // Add command item to container
-                suggestedCommands.appendChild(commandItem);
-            });
-        } else if (suggestedCommands) {
-            suggestedCommands.innerHTML = '<p>No commands suggested.</p>';
+        // Add command item to container
+        suggestedCommands.appendChild(commandItem);
+    }
+
+    // Original and modified code blocks, one above the other
+    function renderCodePair(original, modified) {
+        const diffContainer = document.createElement('div');
+        diffContainer.className = 'code-diff';
+        diffContainer.innerHTML = `
+            <div style="padding: 8px; background-color: #303540; color: #e06c75; font-weight: 500; overflow-x:auto">Original</div>
+            <pre style="margin: 0; padding: 12px; overflow-x:auto"><code>${hljs.highlight(original, { language: 'python' }).value}</code></pre>
+            <div style="padding: 8px; background-color: #303540; color: #98c379; font-weight: 500;overflow-x:auto">Modified</div>
+            <pre style="margin: 0; padding: 12px;overflow-x:auto"><code>${hljs.highlight(modified, { language: 'python' }).value}</code></pre>
+        `;
+        return diffContainer;
+    }
+
+    // Write request body for a suggested change; edits are applied by the server
+    function changePayload(change) {
+        if (change.edits || change.diff) {
+            return { path: change.file, edits: change.edits, diff: change.diff };
         }
+        return { path: change.file, content: change.modified };
+    }
 
-        // Show analysis results section
-        analysisResults.classList.remove('hidden');
+    // Re-read an open file after the server changed it
+    async function reloadFile(filePath) {
+        const data = await apiRequest('read-file', 'POST', { path: filePath });
+        state.openFiles[filePath] = data.content || '';
+        state.fileVersions[filePath] = data.mtime;
+        if (data.truncated) {
+            state.partialFiles[filePath] = { nextOffset: data.next_offset, size: data.size, loading: false };
+        } else {
+            delete state.partialFiles[filePath];
+        }
+        if (state.activeFile === filePath) {
+            codeMirrorEditor.setValue(state.openFiles[filePath]);
+            codeMirrorEditor.setOption('readOnly', Boolean(state.partialFiles[filePath]));
+        }
     }
 
     // Apply a single change
-    async function applyChange(filePath, newContent) {
+    async function applyChange(change) {
+        const filePath = change.file;
+        const newContent = change.modified;
         try {
             showLoading(`Applying changes to ${filePath}...`);
 
             // Write changes to file
-            await apiRequest('write-file', 'POST', {
-                path: filePath,
-                content: newContent
-            });
+            const data = await apiRequest('write-file', 'POST', changePayload(change));
+            state.fileVersions[filePath] = data.mtime;
 
             // Update if file is open
-            if (state.openFiles[filePath]) {
+            if (state.openFiles[filePath] !== undefined && newContent === undefined) {
+                await reloadFile(filePath);
+            } else if (state.openFiles[filePath]) {
                 state.openFiles[filePath] = newContent;
 
                 // Update editor content if this is the active file
@@ -849,18 +1111,24 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             showLoading('Applying all changes...');
 
-            // Apply each change sequentially
-            for (const filePath of pendingFiles) {
-                const newContent = state.pendingChanges[filePath];
+            // Write every change in one request
+            const data = await apiRequest('write-files', 'POST', {
+                files: pendingFiles.map(filePath => ({
+                    ...changePayload(state.pendingChanges[filePath]),
+                    expected_mtime: state.fileVersions[filePath]
+                }))
+            });
+            for (const result of data.results) {
+                state.fileVersions[result.path] = result.mtime;
+            }
 
-                // Write changes to file
-                await apiRequest('write-file', 'POST', {
-                    path: filePath,
-                    content: newContent
-                });
+            for (const filePath of pendingFiles) {
+                const newContent = state.pendingChanges[filePath].modified;
 
                 // Update if file is open
-                if (state.openFiles[filePath]) {
+                if (state.openFiles[filePath] !== undefined && newContent === undefined) {
+                    await reloadFile(filePath);
+                } else if (state.openFiles[filePath]) {
                     state.openFiles[filePath] = newContent;
 
                     // Update editor content if this is the active file
@@ -10,7 +10,8 @@ const statusMessage = document.getElementById('statusMessage');
 
 // State variables
 let isStreaming = false;
-let responseInterval = null;
+let lastVisionSeq = 0;
+let visionAutoStop = false; // Stop the stream when the agent reports it is done
 
 // Functions
 function updateUIState(streaming) {
@@ -57,7 +58,7 @@ function startStream2() {
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ prompt }),
+        body: JSON.stringify({ prompt, socket_id: socket.id }),
     })
         .then(response => response.json())
         .then(data => {
@@ -66,8 +67,10 @@ function startStream2() {
                 // streamImage.src = '/stream';
                 updateUIState(true);
 
-                // Start polling for responses
-                responseInterval = setInterval(fetchResponse2, 1000);
+                // Results are pushed over Socket.IO; fetch once in case one arrived already
+                lastVisionSeq = 0;
+                visionAutoStop = false;
+                fetchResponse2();
                 statusMessage.textContent = data.message;
                 statusMessage.style.color='#10b981'
             } else {
@@ -91,18 +94,7 @@ function fetchResponse2() {
         .then(response => response.json())
         .then(data => {
             if (data.response) {
-                // console.log(data)
-                // console.log(data.response)
-                document.getElementById("analysis-results").classList.remove('hidden');
-                document.getElementById("analysis-summary-stream").innerHTML = marked.parse(data.response.summary)
-                // console.log(data.response.summary)
-                // window.vison_stop_agent=data.response.vison_stop_agent
-                window.summary_vision = data.response.summary
-                console.log(data.response.vison_stop_agent)
-                // if(data.response.vison_stop_agent=='True' || data.response.vison_stop_agent==true)
-                // {
-                //     stopStream()
-                // }
+                showVisionResponse(data.seq, data.response, false);
             }
         })
         .catch(error => {
@@ -110,6 +102,23 @@ function fetchResponse2() {
         });
 }
 
+function showVisionResponse(seq, response, autoStop) {
+    // Ignore results older than the one already shown
+    if (seq !== undefined && seq <= lastVisionSeq) return;
+    if (seq !== undefined) lastVisionSeq = seq;
+
+    document.getElementById("analysis-results").classList.remove('hidden');
+    document.getElementById("analysis-summary-stream").innerHTML = marked.parse(response.summary)
+    window.summary_vision = response.summary
+    console.log(response.vison_stop_agent)
+    if (autoStop) {
+        window.vison_stop_agent = response.vison_stop_agent
+        if (response.vison_stop_agent == 'True' || response.vison_stop_agent == true) {
+            stopStream()
+        }
+    }
+}
+
 
 
 
@@ -135,7 +144,7 @@ function startStream() {
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ prompt }),
+        body: JSON.stringify({ prompt, socket_id: socket.id }),
     })
         .then(response => response.json())
         .then(data => {
@@ -144,8 +153,10 @@ function startStream() {
                 // streamImage.src = '/stream';
                 updateUIState(true);
 
-                // Start polling for responses
-                responseInterval = setInterval(fetchResponse, 1000);
+                // Results are pushed over Socket.IO; fetch once in case one arrived already
+                lastVisionSeq = 0;
+                visionAutoStop = true;
+                fetchResponse();
                 statusMessage.textContent = data.message;
                 statusMessage.style.color='#10b981'
             } else {
@@ -172,11 +183,6 @@ function stopStream() {
     })
         .then(response => response.json())
         .then(data => {
-            // Clear response interval
-            if (responseInterval) {
-                clearInterval(responseInterval);
-                responseInterval = null;
-            }
             updateUIState(false);
             statusMessage.textContent = data.message;
             statusMessage.style.color='red'
@@ -197,18 +203,7 @@ function fetchResponse() {
         .then(response => response.json())
         .then(data => {
             if (data.response) {
-                // console.log(data)
-                // console.log(data.response)
-                document.getElementById("analysis-results").classList.remove('hidden');
-                document.getElementById("analysis-summary-stream").innerHTML = marked.parse(data.response.summary)
-                // console.log(data.response.summary)
-                window.vison_stop_agent=data.response.vison_stop_agent
-                window.summary_vision = data.response.summary
-                console.log(data.response.vison_stop_agent)
-                if(data.response.vison_stop_agent=='True' || data.response.vison_stop_agent==true)
-                {
-                    stopStream()
-                }
+                showVisionResponse(data.seq, data.response, true);
             }
         })
         .catch(error => {
@@ -266,5 +261,19 @@ stopBtn.addEventListener('click', stopStream);
 //     }
 // });
 
+// Vision results are pushed by the server as soon as each field is parsed
+document.addEventListener('DOMContentLoaded', function () {
+    socket.on('vision_response', function (data) {
+        if (!isStreaming) return;
+        showVisionResponse(data.seq, data.response, visionAutoStop);
+    });
+    socket.on('connect', function () {
+        // After a reconnect the socket has a new id; ask for pushes on it, then catch up on anything missed
+        if (!isStreaming) return;
+        socket.emit('vision_subscribe');
+        visionAutoStop ? fetchResponse() : fetchResponse2();
+    });
+});
+
 // Initialize UI
 updateUIState(false);
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""Concurrency slots of streamed calls come back however the caller gives up.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import functools
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_pool import ModelPool, cancel_response, cancel_when_done  # noqa: E402
+
+PURPOSES = {"vision": {"model_name": "fake", "max_concurrent": 1}}
+
+
+class SlowModel:
+    """generate_content blocks until ``opened`` is set, like the SDK waiting for its first chunk."""
+
+    def __init__(self, spec, api_key):
+        self.model_name = spec["model_name"]
+        self.called = threading.Event()
+        self.opened = threading.Event()
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        self.called.set()
+        self.opened.wait(5)
+        return iter(["chunk"])
+
+
+class StreamSlotTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = ModelPool(PURPOSES, model_factory=SlowModel, slot_timeout=0.5)
+        self.pool.set_default_key("test-key")
+        self.model = self.pool.get("vision")
+
+    def in_flight(self):
+        return self.pool.get_stats()["in_flight"]["vision"]
+
+    def test_stream_read_to_the_end_releases_slot(self):
+        self.model.model.opened.set()
+        self.assertEqual(list(self.model.generate_content("p", stream=True)), ["chunk"])
+        self.assertEqual(self.in_flight(), 0)
+
+    def test_closed_stream_releases_slot_once(self):
+        self.model.model.opened.set()
+        response = self.model.generate_content("p", stream=True)
+        cancel_response(response)
+        cancel_response(response)
+        self.assertEqual(self.in_flight(), 0)
+
+    def test_cancelled_while_generate_content_is_pending(self):
+        async def analyse():
+            loop = asyncio.get_running_loop()
+            call = loop.run_in_executor(None, functools.partial(self.model.generate_content, "p", stream=True))
+            try:
+                await asyncio.shield(call)
+            except asyncio.CancelledError:
+                call.add_done_callback(cancel_when_done)
+                raise
+
+        async def run():
+            task = asyncio.ensure_future(analyse())
+            await asyncio.get_running_loop().run_in_executor(None, self.model.model.called.wait, 5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(self.in_flight(), 1)  # The call is still waiting for its first chunk
+            self.model.model.opened.set()
+            # Raises ModelBusyError after slot_timeout if the abandoned stream kept the slot
+            again = await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self.model.generate_content, "p", stream=True))
+            again.close()
+
+        asyncio.run(run())
+        self.assertEqual(self.in_flight(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""The vision pipeline gives its model slot back when a request is cancelled.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import time
+import unittest
+
+os.environ.setdefault("CODIFY_TTS_BACKEND", "null")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_pool import ModelPool  # noqa: E402
+from screen_analyzer import ScreenAnalyzer  # noqa: E402
+from test_model_pool import PURPOSES, SlowModel  # noqa: E402
+
+
+class CancelledAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = ModelPool(PURPOSES, model_factory=SlowModel, slot_timeout=0.5)
+        self.pool.set_default_key("test-key")
+        self.analyzer = ScreenAnalyzer("test")
+        self.analyzer.model = self.pool.get("vision")
+        self.analyzer.engine.start()
+
+    def tearDown(self):
+        self.analyzer.engine.stop()
+
+    def wait_for_slot(self):
+        deadline = time.time() + 2
+        while self.pool.get_stats()["in_flight"]["vision"] and time.time() < deadline:
+            time.sleep(0.01)
+        return self.pool.get_stats()["in_flight"]["vision"]
+
+    def test_cancel_while_the_stream_is_opening(self):
+        fake = self.analyzer.model.model
+        self.analyzer.engine.submit(["p"])
+        self.assertTrue(fake.called.wait(2))
+        self.analyzer.engine.cancel_all()  # What stop_stream does
+        time.sleep(0.05)
+        fake.opened.set()
+        self.assertEqual(self.wait_for_slot(), 0)
+
+    def test_deadline_while_the_stream_is_opening(self):
+        fake = self.analyzer.model.model
+        self.analyzer.engine.deadline = 0.05
+        self.analyzer.engine.submit(["p"])
+        self.assertTrue(fake.called.wait(2))
+        time.sleep(0.1)
+        self.assertEqual(self.analyzer.engine.get_stats()["timed_out"], 1)
+        fake.opened.set()
+        self.assertEqual(self.wait_for_slot(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()